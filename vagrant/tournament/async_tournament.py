@@ -0,0 +1,550 @@
+"""An asyncio version of the functions in tournament.py, for serving many
+tournaments from one event loop.  Every function here is a coroutine that
+takes the same arguments and returns the same values as the function of the
+same name in tournament.py.  Queries go through an asyncpg connection pool
+instead of psycopg2, so waiting on the database doesn't block the loop.
+
+Checking results, scoring and pairing, and the SQL they run, are shared with
+tournament.py, so both modules always agree.  Writes made here mark the
+standings tournament.py has cached in the same process as out of date, so the
+two can be used side by side.
+
+This module needs Python 3.7 or later and asyncpg.  It imports tournament.py
+for the code and SQL they share, so psycopg2 has to be installed as well,
+although no psycopg2 connection is opened unless tournament.py's own
+functions are called:
+
+    import asyncio
+    import async_tournament
+
+    async def main():
+        await async_tournament.registerPlayer("Ann", 1)
+        print(await async_tournament.playerStandings(1))
+
+    asyncio.run(main())"""
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+
+import asyncpg
+import bleach
+
+from backends import replay_Keys_Helper
+from tournament import (CHECK_MATCHES_QUERY, DELETE_MATCHES, DELETE_PLAYERS,
+                        DELETE_TOURNAMENT, FIND_KEYS_QUERY, INSERT_MATCHES,
+                        INSERT_RECORDS, MATCH_HISTORY_QUERY, OPPONENTS_QUERY,
+                        REPORT_LOCK, ROUND_PAIRINGS_QUERY, STANDINGS_QUERY,
+                        advance_Version_Helper, calculate_Standings_Helper,
+                        collect_Opponents_Helper,
+                        insert_Matches_Parameters_Helper,
+                        insert_Records_Parameters_Helper, match_Ids_Helper,
+                        match_Players_Helper, needs_Results_Helper,
+                        pair_Standings_Helper, reject_Matches_Helper,
+                        reject_Unpaired_Helper, round_Pairings_Helper,
+                        tiebreak_Standings_Helper, validate_Match_Helper)
+
+
+# Connection settings used when the pool is first created.  Call
+# configureDatabase() to change them.  Anything asyncpg.create_pool accepts
+# can be added
+DATABASE_SETTINGS = {
+    "database": "tournament",
+    "min_size": 1,
+    "max_size": 10}
+
+_pool = None
+_pool_lock = None
+# Holds the connection of the transaction() block running in this task, if
+# there is one, and the tournaments written to in it
+_connection = contextvars.ContextVar("connection", default=None)
+_written = contextvars.ContextVar("written", default=None)
+
+
+async def configureDatabase(**settings):
+    """Changes the connection settings.  Any open pool is closed, and a new one
+    is created with the new settings the next time the database is used.
+
+    Args:
+      settings: keyword arguments for asyncpg.create_pool, for example
+                dsn="postgresql://db.example.com/tournament", min_size=1 or
+                max_size=50"""
+    DATABASE_SETTINGS.update(settings)
+    await closePool()
+
+
+async def closePool():
+    """Closes every pooled connection.  The pool is recreated the next time the
+    database is used."""
+    global _pool
+    if _pool is not None:
+        pool = _pool
+        _pool = None
+        await pool.close()
+
+
+async def get_pool():
+    """Returns the shared connection pool, creating it if needed."""
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(**DATABASE_SETTINGS)
+    return _pool
+
+
+@asynccontextmanager
+async def transaction():
+    """Runs every call made inside the async with block on a single
+    connection, and commits them all at once when the block finishes.  If an
+    exception is raised inside the block, nothing is committed.  Nested
+    transaction() blocks join the outermost one."""
+    if _connection.get() is not None:
+        yield
+        return
+    pool = await get_pool()
+    written = set()
+    try:
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                token = _connection.set(connection)
+                written_token = _written.set(written)
+                try:
+                    yield
+                finally:
+                    _written.reset(written_token)
+                    _connection.reset(token)
+    finally:
+        # Standings tournament.py read while the transaction was open may
+        # have been cached under the versions the writes advanced to
+        for tournament_id in written:
+            advance_Version_Helper(tournament_id)
+
+
+def written_Helper(tournament_id=None):
+    """This is a helper function to the functions that write to a tournament,
+    which marks the standings tournament.py has cached for it as out of date,
+    like tournament.advance_Version_Helper.  Inside a transaction() block
+    they are marked again once it ends.  It must be called after the write.
+
+    Args:
+      tournament_id: the tournament written to.  If not provided, every
+                     tournament is marked as out of date"""
+    advance_Version_Helper(tournament_id)
+    written = _written.get()
+    if written is not None:
+        written.add(tournament_id)
+
+
+def numbered_Query_Helper(query, parameters):
+    """This is a helper function that turns a query from tournament.py, which
+    has psycopg2's %(name)s parameters, into the arguments of an asyncpg
+    call, which numbers its parameters $1, $2 and so on instead.
+
+    Args:
+      query: the query
+      parameters: a dictionary of the query's parameters
+
+    Returns:
+      A list of the query followed by the values of its parameters"""
+    arguments = [query]
+    for (name, value) in sorted(parameters.items()):
+        placeholder = "%%(%s)s" % name
+        if placeholder in arguments[0]:
+            arguments.append(value)
+            arguments[0] = arguments[0].replace(
+                placeholder, "$%s" % (len(arguments) - 1))
+    return arguments
+
+
+@asynccontextmanager
+async def get_connection():
+    """Query helper function.  Hands out a pooled connection with a transaction
+    open on it, which is committed when the async with block finishes.  Inside
+    a transaction() block the transaction's connection is used instead."""
+    connection = _connection.get()
+    if connection is not None:
+        yield connection
+        return
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            yield connection
+
+
+async def deleteTournament(tournament_id):
+    """Removes the specified tournament.  All the tournament's players,
+    matches, and records are also removed
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    async with get_connection() as connection:
+        await lock_Tournament_Helper(connection, tournament_id)
+        await execute_Deletes_Helper(connection, DELETE_TOURNAMENT,
+                                     tournament_id)
+    written_Helper(tournament_id)
+
+
+async def deleteMatches(tournament_id=1):
+    """Removes all the match records from the database
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    async with get_connection() as connection:
+        await lock_Tournament_Helper(connection, tournament_id)
+        await execute_Deletes_Helper(connection, DELETE_MATCHES,
+                                     tournament_id)
+    written_Helper(tournament_id)
+
+
+async def deletePlayers(tournament_id=1):
+    """Remove all the player records from the database
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Raises:
+      ValueError: if the tournament still has matches recorded"""
+    async with get_connection() as connection:
+        await lock_Tournament_Helper(connection, tournament_id)
+        query = """
+            SELECT 1
+            FROM matchRegistry
+            WHERE tournament_id = $1
+            LIMIT 1;"""
+        if await connection.fetchval(query, tournament_id):
+            raise ValueError("players with matches recorded can't be "
+                             "deleted")
+        await execute_Deletes_Helper(connection, DELETE_PLAYERS,
+                                     tournament_id)
+    written_Helper(tournament_id)
+
+
+async def execute_Deletes_Helper(connection, deletes, tournament_id):
+    """This is a helper function to the delete functions that runs the same
+    statements as tournament.py does.  asyncpg can't pass
+    parameters to several statements at once, so they are run one at a time
+    inside a transaction, which keeps tournament.bulk_delete from outlasting
+    them."""
+    async with connection.transaction():
+        for statement in deletes.split(";"):
+            if statement.strip():
+                await connection.execute(*numbered_Query_Helper(
+                    statement, {"tournament_id": tournament_id}))
+
+
+async def countPlayers(tournament_id=1):
+    """Returns the number of players currently registered in a specific
+    tournament.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    async with get_connection() as connection:
+        query = """
+            SELECT count(*)
+            FROM players
+            WHERE tournament_id = $1;"""
+        return int(await connection.fetchval(query, tournament_id))
+
+
+async def registerTournament(tournament_name):
+    """Adds a tournament to the tournament database, and returns its new
+    id.
+
+    Args:
+      tournament_name: the tournament's name (need not be unique)."""
+    clean_tournament_name = bleach.clean(tournament_name)
+    async with get_connection() as connection:
+        insert = "SELECT register_tournament($1);"
+        return await connection.fetchval(insert, clean_tournament_name)
+
+
+async def registerPlayer(player_name, tournament_id=1):
+    """Adds a player to the player database.
+
+    Args:
+      player_name: the player's full name (need not be unique).
+      tournament_id: the tournament's id.  If not provided, player will be
+                     entered into tournament 1"""
+    await registerPlayers([player_name], tournament_id)
+
+
+async def registerPlayers(player_names, tournament_id=1):
+    """Adds a whole list of players to the player database in one
+    transaction.
+
+    Args:
+      player_names: a list of the players' full names (need not be unique).
+      tournament_id: the tournament's id.  If not provided, players will be
+                     entered into tournament 1
+
+    Returns:
+      A list of the new players' ids, in the same order as player_names
+
+    Raises:
+      ValueError: if the tournament doesn't exist"""
+    clean_player_names = [bleach.clean(player_name)
+                          for player_name in player_names]
+    async with get_connection() as connection:
+        # Check that the tournament exists, and add tournament 1 if it
+        # doesn't, rather than letting the foreign key fail
+        query = """
+            SELECT tournament_id
+            FROM tournaments
+            WHERE tournament_id = $1;"""
+        if await connection.fetchval(query, tournament_id) is None:
+            if tournament_id != 1:
+                raise ValueError("tournament %s does not exist" %
+                                 tournament_id)
+            insert = "SELECT register_tournament($1);"
+            await connection.execute(insert, "Test Tournament")
+        if not clean_player_names:
+            return []
+        insert = """
+            INSERT INTO players (tournament_id, player_name)
+            SELECT $1, player_name
+            FROM unnest($2::varchar[]) AS player_name
+            RETURNING player_id;"""
+        rows = await connection.fetch(insert, tournament_id,
+                                      clean_player_names)
+    written_Helper(tournament_id)
+    # The rows draw their serial ids in order, so the sorted ids line up with
+    # player_names
+    return sorted(row[0] for row in rows)
+
+
+async def playerStandings(tournament_id=1):
+    """Returns a list of tuples, each of which contains (player_id,
+    player_name, wins, matches), sorted from highest scoring to lowest
+    scoring.  Look at the docstring of tournament.playerStandings for the
+    scoring system.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    async with get_connection() as connection:
+        standings = await load_Standings_Helper(connection, tournament_id)
+    return [(player_id, player_name, wins, matches)
+            for (player_id, player_name, wins, matches, ties, bye, OMW,
+                 player_standing) in standings]
+
+
+async def load_Standings_Helper(connection, tournament_id):
+    """This is a helper function to playerStandings and swissPairings that
+    loads every player's record with one query and scores them.  The match
+    results are loaded too if the configured tiebreakers need them.
+
+    Returns:
+      A list of tuples from tournament.calculate_Standings_Helper, in the
+      order of tournament.tiebreak_Standings_Helper"""
+    standings = calculate_Standings_Helper(
+        [tuple(row) for row in await connection.fetch(*numbered_Query_Helper(
+            STANDINGS_QUERY, {"tournament_id": tournament_id}))])
+    results = []
+    if needs_Results_Helper():
+        # asyncpg numbers its parameters instead of using %s
+        results = [(row["winner"], row["loser"], row["tie"])
+                   for row in await connection.fetch(
+                       MATCH_HISTORY_QUERY.replace("%s", "$1"), tournament_id)
+                   if not row["bye"]]
+    return tiebreak_Standings_Helper(standings, results)[0]
+
+
+async def reportMatch(winner, loser, tie=None, bye=None, tournament_id=None,
+                      idempotency_key=None, round_number=None):
+    """Records the outcome of a single match between two players.  Look at the
+    docstring of tournament.reportMatch for the arguments."""
+    match = validate_Match_Helper(winner, loser, tie, bye)
+    async with get_connection() as connection:
+        # Look up which tournament the players are a part of, using the
+        # winner
+        if not tournament_id:
+            query = """
+                SELECT tournament_id
+                FROM players
+                WHERE player_id = $1;"""
+            tournament_id = await connection.fetchval(query, winner)
+            if not tournament_id:
+                raise ValueError("player must be a part of a tournament")
+        if round_number is not None:
+            rejected = await check_Round_Helper(connection, tournament_id,
+                                                round_number, [(0, match)])
+            if rejected:
+                raise ValueError(rejected[0][1])
+        await lock_Tournament_Helper(connection, tournament_id)
+        if idempotency_key is not None:
+            (replayed, rejected) = replay_Keys_Helper(
+                [(0, match)], [idempotency_key],
+                await find_Keys_Helper(connection, tournament_id,
+                                       [idempotency_key]))
+            if rejected:
+                raise ValueError(rejected[0][1])
+            if replayed:
+                return
+        for (index, error) in await check_Matches_Helper(
+                connection, tournament_id, [(0, match)]):
+            raise ValueError(error)
+        await insert_Matches_Helper(connection, tournament_id, [match],
+                                    [idempotency_key])
+    written_Helper(tournament_id)
+
+
+async def reportMatches(results, tournament_id, abort_on_error=False,
+                        idempotency_keys=None, round_number=None):
+    """Records the outcomes of a whole round of matches in one transaction.
+    Look at the docstring of tournament.reportMatches for the arguments and
+    the return value."""
+    if idempotency_keys is not None and \
+            len(idempotency_keys) != len(results):
+        raise ValueError("there must be one idempotency key for each result")
+    keys = idempotency_keys or [None] * len(results)
+    report = [(None, None)] * len(results)
+    matches = []
+    for (index, result) in enumerate(results):
+        try:
+            matches.append((index, validate_Match_Helper(*result)))
+        except (TypeError, ValueError) as e:
+            report[index] = (None, str(e))
+    async with get_connection() as connection:
+        if round_number is not None and matches:
+            for (index, error) in await check_Round_Helper(
+                    connection, tournament_id, round_number, matches):
+                report[index] = (None, error)
+            matches = [(index, match) for (index, match) in matches
+                       if not report[index][1]]
+        await lock_Tournament_Helper(connection, tournament_id)
+        if any(keys[index] is not None for (index, match) in matches):
+            (replayed, rejected) = replay_Keys_Helper(
+                matches, [keys[index] for (index, match) in matches],
+                await find_Keys_Helper(connection, tournament_id, keys))
+            for (index, match_id) in replayed:
+                report[index] = (match_id, None)
+            for (index, error) in rejected:
+                report[index] = (None, error)
+            matches = [(index, match) for (index, match) in matches
+                       if report[index] == (None, None)]
+        for (index, error) in await check_Matches_Helper(
+                connection, tournament_id, matches):
+            report[index] = (None, error)
+        rejected = [(index, error) for (index, (match_id, error))
+                    in enumerate(report) if error]
+        if rejected and abort_on_error:
+            raise ValueError("rejected results: %s" % ", ".join(
+                "%s (%s)" % (index, error) for (index, error) in rejected))
+        matches = [(index, match) for (index, match) in matches
+                   if not report[index][1]]
+        if not matches:
+            return report
+        # Insert the whole round at once.  The tournament's lock keeps other
+        # scorekeepers out, but something writing to the tables without it
+        # could still have got in first.  If the round no longer fits, fall
+        # back to one match at a time so that only the conflicting results
+        # are rejected
+        try:
+            async with connection.transaction():
+                match_ids = await insert_Matches_Helper(
+                    connection, tournament_id,
+                    [match for (index, match) in matches],
+                    [keys[index] for (index, match) in matches])
+        except asyncpg.IntegrityConstraintViolationError as e:
+            if abort_on_error:
+                raise ValueError("rejected results: %s" %
+                                 str(e).strip().splitlines()[0])
+            match_ids = []
+            for (index, match) in matches:
+                try:
+                    async with connection.transaction():
+                        match_ids.extend(await insert_Matches_Helper(
+                            connection, tournament_id, [match],
+                            [keys[index]]))
+                except asyncpg.IntegrityConstraintViolationError as e:
+                    match_ids.append(None)
+                    report[index] = (None, str(e).strip().splitlines()[0])
+        for ((index, match), match_id) in zip(matches, match_ids):
+            if match_id is not None:
+                report[index] = (match_id, None)
+    written_Helper(tournament_id)
+    return report
+
+
+async def lock_Tournament_Helper(connection, tournament_id):
+    """This is a helper function that holds the lock on writing a
+    tournament's matches until the end of the transaction.  Look at
+    tournament.lock_Tournament_Helper for why."""
+    await connection.execute("SELECT pg_advisory_xact_lock($1, $2);",
+                             REPORT_LOCK, tournament_id)
+
+
+async def check_Round_Helper(connection, tournament_id, round_number,
+                             matches):
+    """This is a helper function to reportMatch and reportMatches that finds
+    the results that don't match a pairing issued for a round.  Look at
+    tournament.check_Round_Helper for the arguments and the return value."""
+    pairings = round_Pairings_Helper(await connection.fetch(
+        *numbered_Query_Helper(ROUND_PAIRINGS_QUERY,
+                               {"tournament_id": tournament_id,
+                                "round_number": round_number})))
+    if pairings is None:
+        raise ValueError("round %s hasn't been started" % round_number)
+    return reject_Unpaired_Helper(round_number, pairings, matches)
+
+
+async def find_Keys_Helper(connection, tournament_id, idempotency_keys):
+    """This is a helper function to reportMatch and reportMatches that looks
+    up which idempotency keys have already been used in a tournament.  Look
+    at tournament.find_Keys_Helper for the return value."""
+    keys = list(set(key for key in idempotency_keys if key is not None))
+    if not keys:
+        return {}
+    return dict((row[0], tuple(row[1:])) for row in await connection.fetch(
+        *numbered_Query_Helper(FIND_KEYS_QUERY,
+                               {"tournament_id": tournament_id,
+                                "idempotency_keys": keys})))
+
+
+async def check_Matches_Helper(connection, tournament_id, matches):
+    """This is a helper function to reportMatch and reportMatches that finds
+    the results which would break the database's rules, using one query for
+    the whole round.  Look at tournament.check_Matches_Helper for the
+    arguments and the return value."""
+    if not matches:
+        return []
+    rows = await connection.fetch(*numbered_Query_Helper(
+        CHECK_MATCHES_QUERY, {"tournament_id": tournament_id,
+                              "player_ids": match_Players_Helper(matches)}))
+    return reject_Matches_Helper(tournament_id, matches, rows)
+
+
+async def insert_Matches_Helper(connection, tournament_id, matches,
+                                idempotency_keys=None):
+    """This is a helper function to reportMatch and reportMatches that writes
+    matches to the matchRegistry and records tables with one INSERT each.
+    idempotency_keys is a list with the key or None of each match.
+
+    Returns:
+      A list of the new match ids, in the same order as matches"""
+    if not matches:
+        return []
+    rows = await connection.fetch(*numbered_Query_Helper(
+        INSERT_MATCHES, insert_Matches_Parameters_Helper(
+            tournament_id, matches, idempotency_keys)))
+    match_ids = match_Ids_Helper(matches, rows)
+    await connection.execute(*numbered_Query_Helper(
+        INSERT_RECORDS, insert_Records_Parameters_Helper(
+            tournament_id, matches, match_ids)))
+    return match_ids
+
+
+async def swissPairings(tournament_id=1):
+    """Returns a list of pairs of players for the next round of a match.  Look
+    at the docstring of tournament.swissPairings for the return value and the
+    errors raised.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    async with get_connection() as connection:
+        standings = await load_Standings_Helper(connection, tournament_id)
+        opponents = collect_Opponents_Helper(await connection.fetch(
+            *numbered_Query_Helper(OPPONENTS_QUERY,
+                                   {"tournament_id": tournament_id})))
+    return pair_Standings_Helper(standings, opponents)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# Smoke tests for async_tournament.py, run against the tournament database
+#
+# Each test plays in a tournament of its own, so these can be run alongside
+# tournament_test.py
+
+import asyncio
+import async_tournament
+import tournament
+
+
+async def testRegister():
+    tournament_id = await async_tournament.registerTournament("Async Register")
+    ids = await async_tournament.registerPlayers(
+        ["Ann Perkins", "Ben Wyatt", "Chris Traeger"], tournament_id)
+    if len(ids) != 3 or len(set(ids)) != 3:
+        raise ValueError("registerPlayers() should return one id per player.")
+    if await async_tournament.countPlayers(tournament_id) != 3:
+        raise ValueError("After registering three players, countPlayers() "
+                         "should be 3.")
+    try:
+        await async_tournament.registerPlayers(["Donna Meagle"],
+                                               tournament_id + 1000)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("registerPlayers() should reject a tournament that "
+                         "doesn't exist.")
+    print("1. Players can be registered and counted.")
+
+
+async def testReportAndStandings():
+    tournament_id = await async_tournament.registerTournament("Async Report")
+    [id1, id2, id3, id4] = await async_tournament.registerPlayers(
+        ["Ann Perkins", "Ben Wyatt", "Chris Traeger", "Donna Meagle"],
+        tournament_id)
+    report = await async_tournament.reportMatches(
+        [(id1, id2), (id3, id4), (id1, id2)], tournament_id)
+    if report[0][1] or report[1][1] or not report[2][1]:
+        raise ValueError("reportMatches() should record the first two results "
+                         "and reject the rematch.")
+    standings = await async_tournament.playerStandings(tournament_id)
+    if len(standings) != 4 or any(len(row) != 4 for row in standings):
+        raise ValueError("playerStandings() should return four columns for "
+                         "each player.")
+    for (player_id, name, wins, matches) in standings:
+        if matches != 1:
+            raise ValueError("Each player should have one match recorded.")
+        if wins != (1 if player_id in (id1, id3) else 0):
+            raise ValueError("Each match winner should have one win "
+                             "recorded.")
+    print("2. reportMatches() results show up in playerStandings().")
+
+
+async def testPairings():
+    tournament_id = await async_tournament.registerTournament("Async Pairings")
+    [id1, id2, id3, id4] = await async_tournament.registerPlayers(
+        ["Ann Perkins", "Ben Wyatt", "Chris Traeger", "Donna Meagle"],
+        tournament_id)
+    await async_tournament.reportMatches([(id1, id2), (id3, id4)],
+                                         tournament_id)
+    pairings = await async_tournament.swissPairings(tournament_id)
+    pairs = set(frozenset((pairing[0], pairing[2])) for pairing in pairings)
+    if pairs != set([frozenset([id1, id3]), frozenset([id2, id4])]):
+        raise ValueError("After one round, swissPairings() should pair the "
+                         "winners with each other and the losers with each "
+                         "other.")
+    print("3. swissPairings() pairs players with the same record.")
+
+
+async def testRounds():
+    tournament_id = await async_tournament.registerTournament("Async Rounds")
+    [id1, id2, id3, id4] = await async_tournament.registerPlayers(
+        ["Ann Perkins", "Ben Wyatt", "Chris Traeger", "Donna Meagle"],
+        tournament_id)
+    try:
+        await async_tournament.reportMatch(id1, id2, round_number=1)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("reportMatch() should reject a round that hasn't "
+                         "been started.")
+    (round_number, pairings) = tournament.startRound(tournament_id)
+    paired = (pairings[0][0], pairings[0][2])
+    unpaired = (pairings[0][0], pairings[1][0])
+    report = await async_tournament.reportMatches(
+        [paired, unpaired], tournament_id, round_number=round_number)
+    if report[0][1] or not report[1][1]:
+        raise ValueError("reportMatches() should only accept results that "
+                         "match the round's pairings.")
+    print("4. Results are checked against the round's pairings.")
+
+
+async def testCacheCoherence():
+    tournament_id = await async_tournament.registerTournament("Async Cache")
+    [id1, id2] = await async_tournament.registerPlayers(
+        ["Ann Perkins", "Ben Wyatt"], tournament_id)
+    tournament.playerStandings(tournament_id)
+    await async_tournament.reportMatch(id1, id2)
+    standings = dict((row[0], row[2])
+                     for row in tournament.playerStandings(tournament_id))
+    if standings != {id1: 1, id2: 0}:
+        raise ValueError("tournament.playerStandings() should show a result "
+                         "reported through async_tournament.py.")
+    async with async_tournament.transaction():
+        await async_tournament.deleteMatches(tournament_id)
+        tournament.playerStandings(tournament_id)
+    if any(row[3] for row in tournament.playerStandings(tournament_id)):
+        raise ValueError("tournament.playerStandings() should not keep "
+                         "standings read while an async transaction was "
+                         "open.")
+    print("5. Writes made through async_tournament.py refresh the standings "
+          "tournament.py has cached.")
+
+
+async def main():
+    try:
+        await testRegister()
+        await testReportAndStandings()
+        await testPairings()
+        await testRounds()
+        await testCacheCoherence()
+    finally:
+        await async_tournament.closePool()
+    print("Success!  All tests pass!")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,598 @@
+"""Storage backends for tournament.py.  A backend stores tournaments, players,
+matches and records, and hands back the raw numbers that standings and
+pairings are calculated from.  tournament.py does the checking, scoring and
+pairing itself, so every backend gives the same results.
+
+tournament.py ships a PostgreSQL backend, which is used by default.  This
+module holds the backend interface and an in-memory backend for simulations,
+pairing dry runs and fast tests:
+
+    import tournament
+    from backends import MemoryBackend
+    tournament.setBackend(MemoryBackend())"""
+import copy
+import threading
+from contextlib import contextmanager
+
+
+class Backend(object):
+    """The operations tournament.py needs from a storage backend.  Player names
+    passed in have already been sanitized, and matches have already been
+    checked by tournament.validate_Match_Helper."""
+
+    # Set to True if loadStandings reads opponent totals that are kept up to
+    # date as matches are reported.  Otherwise, when NumPy is installed,
+    # tournament.py adds them up itself from loadRecords
+    keeps_opponent_totals = False
+
+    def transaction(self):
+        """Returns a context manager that makes every operation inside its with
+        block succeed or fail together."""
+        raise NotImplementedError
+
+    def registerTournament(self, tournament_name):
+        """Adds a tournament and returns its new id."""
+        raise NotImplementedError
+
+    def registerPlayers(self, player_names, tournament_id):
+        """Adds players to a tournament and returns their new ids, in the same
+        order as player_names.  If tournament_id is 1 and there is no
+        tournament 1 yet, a tournament named "Test Tournament" is added
+        first.  Raises a ValueError if the tournament doesn't exist."""
+        raise NotImplementedError
+
+    def countPlayers(self, tournament_id):
+        """Returns the number of players registered in a tournament."""
+        raise NotImplementedError
+
+    def deleteTournament(self, tournament_id):
+        """Removes a tournament along with its players, matches and
+        records."""
+        raise NotImplementedError
+
+    def deleteMatches(self, tournament_id):
+        """Removes a tournament's matches and records, along with its
+        rounds."""
+        raise NotImplementedError
+
+    def deletePlayers(self, tournament_id):
+        """Removes a tournament's players, along with its rounds.  Their
+        matches must have been removed first, or a ValueError is raised."""
+        raise NotImplementedError
+
+    def findTournament(self, player_id):
+        """Returns the id of the tournament a player is registered in, or None
+        if there is no such player."""
+        raise NotImplementedError
+
+    def reportMatch(self, tournament_id, match, idempotency_key=None):
+        """Records a single match and returns its new id.  Raises a
+        ValueError if the match is a rematch, a second bye, or involves a
+        player from another tournament.  If idempotency_key has
+        already been used for the same pairing in this tournament, nothing is
+        recorded and the id of the earlier match is returned instead."""
+        raise NotImplementedError
+
+    def reportMatches(self, tournament_id, matches, abort_on_error=False,
+                      idempotency_keys=None):
+        """Records a list of matches in one transaction.  Matches that are a
+        rematch, a second bye, or that involve a player from another
+        tournament are rejected.  Matches are checked and recorded one
+        reporter at a time in each tournament, so that scorekeepers reporting
+        at the same time can't both record the same pairing.
+
+        idempotency_keys is a list with a key or None for each match.  A
+        match whose key was already used for the same pairing isn't recorded
+        again; the id of the earlier match is returned for it.
+
+        Returns:
+          A list with one (match_id, error) tuple for each match, in the same
+          order.  If abort_on_error is True and any match is rejected, nothing
+          is recorded and a ValueError is raised instead."""
+        raise NotImplementedError
+
+    def loadStandings(self, tournament_id):
+        """Returns a list of tuples sorted by player id, each of which contains
+        (player_id, player_name, wins, matches, ties, byes, opponent_wins,
+        opponent_matches)."""
+        raise NotImplementedError
+
+    def loadRecords(self, tournament_id):
+        """Returns a tuple of (records, pairings).  records is a list of
+        tuples sorted by player id, each of which contains (player_id,
+        player_name, wins, matches, ties, byes).  pairings is a list of
+        (opponent_one, opponent_two) tuples, one for each match between two
+        players."""
+        raise NotImplementedError
+
+    def loadResults(self, tournament_id):
+        """Returns a list of (winner, loser, tie) tuples, one for each match
+        between two players.  tie is True or False, and for a tie winner and
+        loser are the two players in either order."""
+        raise NotImplementedError
+
+    def saveStandings(self, standings):
+        """Saves each player's score.  standings is a list of tuples from
+        tournament.calculate_Standings_Helper."""
+        raise NotImplementedError
+
+    def loadOpponents(self, tournament_id):
+        """Returns a dictionary mapping each player id that has played a match
+        to the set of player ids he or she has played against.  Byes are not
+        included."""
+        raise NotImplementedError
+
+    def saveRound(self, tournament_id, round_number, pairings):
+        """Stores the pairings of a new round.  pairings is a list of tuples
+        from tournament.swissPairings.  Raises a ValueError if the round has
+        already been stored."""
+        raise NotImplementedError
+
+    def loadRound(self, tournament_id, round_number=None):
+        """Returns a tuple of (round_number, pairings) for a round, or the
+        latest round if round_number is None, with the pairings in the form
+        tournament.swissPairings returns them.  Returns None if there is no
+        such round."""
+        raise NotImplementedError
+
+    def saveRoundStandings(self, tournament_id, round_number, standings):
+        """Stores the standings at the end of a round, unless they have been
+        stored already.  standings is a list of tuples from
+        tournament.calculate_Standings_Helper, in order of place."""
+        raise NotImplementedError
+
+    def loadRoundStandings(self, tournament_id, round_number):
+        """Returns the standings stored by saveRoundStandings, in the same
+        form, or an empty list if there are none."""
+        raise NotImplementedError
+
+    def archiveTournament(self, tournament_id, standings):
+        """Stores a tournament's final standings and every match in the
+        archive, and deletes the tournament like deleteTournament, all at
+        once.  standings is a list of tuples from
+        tournament.calculate_Standings_Helper, in order of place.  Raises a
+        ValueError if the tournament doesn't exist, or if its results no
+        longer match standings."""
+        raise NotImplementedError
+
+    def loadArchive(self, tournament_id):
+        """Returns a tuple of (tournament_name, standings, matches) for an
+        archived tournament, or None if it hasn't been archived.  standings
+        is in the form archiveTournament took it, and matches is a list of
+        tuples in the form tournament.matchHistory returns them."""
+        raise NotImplementedError
+
+    def resetDatabase(self):
+        """Deletes every tournament, player and match, archived tournaments
+        included, and starts handing out ids from 1 again."""
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    """Keeps everything in Python dictionaries instead of a database.  It
+    enforces the same rules as tournament.sql: no rematches, one bye per
+    player, and no deleting players who still have matches.  Ids are handed
+    out from counters that start at 1, like serial columns."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        # A copy of the state taken by the first write inside a transaction,
+        # restored if the transaction fails
+        self._snapshot = None
+        # The scores overwritten by saveStandings inside a transaction before
+        # any other write, as (player_id, player_standing) tuples.  Saving
+        # standings is common enough that copying the state for it is too
+        # slow
+        self._saved_standings = []
+        self._state = self._empty_state()
+
+    def _empty_state(self):
+        return {
+            # tournament_id: tournament_name
+            "tournaments": {},
+            # player_id: [tournament_id, player_name, player_standing]
+            "players": {},
+            # tournament_id: set of player_ids
+            "rosters": {},
+            # tournament_id: {match_id: (opponent_one, opponent_two)}
+            "matches": {},
+            # (opponent_one, opponent_two), like the reverseMatchRegistry
+            # index.  Byes are stored as (player_id, None)
+            "pairings": set(),
+            # player_id: [wins, losses, ties, byes]
+            "records": {},
+            # tournament_id: {match_id: (winner, loser, tie)}, for the
+            # matches between two players
+            "results": {},
+            # tournament_id: {idempotency_key: match_id}
+            "idempotency_keys": {},
+            # tournament_id: {round_number: (pairings, standings)}.  pairings
+            # is a list of (player_one, player_two) tuples, with player_two
+            # None for a bye, and standings is a list of tuples from
+            # tournament.calculate_Standings_Helper without the names
+            "rounds": {},
+            # tournament_id: (tournament_name, standings, matches), in the
+            # form loadArchive returns them
+            "archive": {},
+            "next_ids": {"tournament": 1, "player": 1, "match": 1}}
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_depth += 1
+                try:
+                    yield
+                finally:
+                    self._transaction_depth -= 1
+                return
+            self._transaction_depth = 1
+            try:
+                yield
+            except:
+                if self._snapshot is not None:
+                    self._state = self._snapshot
+                players = self._state["players"]
+                for (player_id, player_standing) in \
+                        reversed(self._saved_standings):
+                    if player_id in players:
+                        players[player_id][2] = player_standing
+                raise
+            finally:
+                self._transaction_depth = 0
+                self._snapshot = None
+                self._saved_standings = []
+
+    def registerTournament(self, tournament_name):
+        with self._lock:
+            self._before_write()
+            tournament_id = self._next_id("tournament")
+            self._state["tournaments"][tournament_id] = tournament_name
+            self._state["rosters"][tournament_id] = set()
+            self._state["matches"][tournament_id] = {}
+            self._state["results"][tournament_id] = {}
+            self._state["idempotency_keys"][tournament_id] = {}
+            return tournament_id
+
+    def registerPlayers(self, player_names, tournament_id):
+        with self._lock:
+            self._before_write()
+            if tournament_id == 1 and 1 not in self._state["tournaments"]:
+                self.registerTournament("Test Tournament")
+            if tournament_id not in self._state["tournaments"]:
+                raise ValueError("tournament %s does not exist" %
+                                 tournament_id)
+            player_ids = []
+            for player_name in player_names:
+                player_id = self._next_id("player")
+                self._state["players"][player_id] = [
+                    tournament_id, player_name, None]
+                self._state["records"][player_id] = [0, 0, 0, 0]
+                self._state["rosters"][tournament_id].add(player_id)
+                player_ids.append(player_id)
+            return player_ids
+
+    def countPlayers(self, tournament_id):
+        with self._lock:
+            return len(self._player_ids(tournament_id))
+
+    def deleteTournament(self, tournament_id):
+        with self._lock:
+            self._before_write()
+            self.deleteMatches(tournament_id)
+            self.deletePlayers(tournament_id)
+            self._state["tournaments"].pop(tournament_id, None)
+            self._state["rosters"].pop(tournament_id, None)
+            self._state["matches"].pop(tournament_id, None)
+            self._state["results"].pop(tournament_id, None)
+            self._state["idempotency_keys"].pop(tournament_id, None)
+            self._state["rounds"].pop(tournament_id, None)
+
+    def deleteMatches(self, tournament_id):
+        with self._lock:
+            self._before_write()
+            matches = self._state["matches"].get(tournament_id, {})
+            self._state["pairings"].difference_update(matches.values())
+            matches.clear()
+            self._state["results"].get(tournament_id, {}).clear()
+            self._state["idempotency_keys"].get(tournament_id, {}).clear()
+            self._state["rounds"].pop(tournament_id, None)
+            for player_id in self._player_ids(tournament_id):
+                self._state["records"][player_id] = [0, 0, 0, 0]
+
+    def deletePlayers(self, tournament_id):
+        with self._lock:
+            self._before_write()
+            if self._state["matches"].get(tournament_id):
+                raise ValueError("players with matches recorded can't be "
+                                 "deleted")
+            self._state["rounds"].pop(tournament_id, None)
+            for player_id in self._player_ids(tournament_id):
+                del self._state["players"][player_id]
+                del self._state["records"][player_id]
+            self._state["rosters"].get(tournament_id, set()).clear()
+
+    def findTournament(self, player_id):
+        with self._lock:
+            player = self._state["players"].get(player_id)
+            return player[0] if player else None
+
+    def reportMatch(self, tournament_id, match, idempotency_key=None):
+        with self._lock:
+            if idempotency_key is not None:
+                (replayed, rejected) = replay_Keys_Helper(
+                    [(0, match)], [idempotency_key],
+                    self._reported_keys(tournament_id))
+                if rejected:
+                    raise ValueError(rejected[0][1])
+                if replayed:
+                    return replayed[0][1]
+            error = self._check_match(tournament_id, match)
+            if error:
+                raise ValueError(error)
+            self._before_write()
+            return self._insert_match(tournament_id, match, idempotency_key)
+
+    def reportMatches(self, tournament_id, matches, abort_on_error=False,
+                      idempotency_keys=None):
+        with self._lock:
+            keys = idempotency_keys or [None] * len(matches)
+            report = [(None, None)] * len(matches)
+            (replayed, rejected) = replay_Keys_Helper(
+                list(enumerate(matches)), keys,
+                self._reported_keys(tournament_id))
+            for (index, match_id) in replayed:
+                report[index] = (match_id, None)
+            for (index, error) in rejected:
+                report[index] = (None, error)
+            # Check every match before inserting any, so that an aborted round
+            # records nothing.  Pairings from earlier in the round count as
+            # already played
+            round_pairings = set()
+            for (index, match) in enumerate(matches):
+                if report[index] != (None, None):
+                    continue
+                error = self._check_match(tournament_id, match,
+                                          round_pairings)
+                if error:
+                    report[index] = (None, error)
+                else:
+                    round_pairings.add(match[:2])
+            rejected = [(index, error) for (index, (match_id, error))
+                        in enumerate(report) if error]
+            if rejected and abort_on_error:
+                raise ValueError("rejected results: %s" % ", ".join(
+                    "%s (%s)" % (index, error) for (index, error) in rejected))
+            self._before_write()
+            return [(self._insert_match(tournament_id, match, key), None)
+                    if (match_id, error) == (None, None)
+                    else (match_id, error)
+                    for (match, key, (match_id, error))
+                    in zip(matches, keys, report)]
+
+    def loadStandings(self, tournament_id):
+        with self._lock:
+            players = self._state["players"]
+            records = self._state["records"]
+            opponents = self.loadOpponents(tournament_id)
+            standings = []
+            for player_id in sorted(self._player_ids(tournament_id)):
+                (wins, losses, ties, byes) = records[player_id]
+                opponent_wins = 0
+                opponent_matches = 0
+                for opponent_id in opponents.get(player_id, ()):
+                    (opponent_won, opponent_lost, opponent_tied,
+                     opponent_byes) = records[opponent_id]
+                    opponent_wins += opponent_won
+                    opponent_matches += opponent_won + opponent_lost + \
+                        opponent_tied
+                standings.append((player_id, players[player_id][1], wins,
+                                  wins + losses + ties, ties, byes,
+                                  opponent_wins, opponent_matches))
+            return standings
+
+    def loadRecords(self, tournament_id):
+        with self._lock:
+            players = self._state["players"]
+            records = []
+            for player_id in sorted(self._player_ids(tournament_id)):
+                (wins, losses, ties, byes) = self._state["records"][player_id]
+                records.append((player_id, players[player_id][1], wins,
+                                wins + losses + ties, ties, byes))
+            pairings = [pairing for pairing in self._state["matches"].get(
+                tournament_id, {}).values() if pairing[1] is not None]
+            return (records, pairings)
+
+    def loadResults(self, tournament_id):
+        with self._lock:
+            return list(
+                self._state["results"].get(tournament_id, {}).values())
+
+    def saveStandings(self, standings):
+        with self._lock:
+            players = self._state["players"]
+            if self._transaction_depth and self._snapshot is None:
+                self._saved_standings.extend(
+                    (row[0], players[row[0]][2]) for row in standings)
+            for row in standings:
+                players[row[0]][2] = row[7]
+
+    def loadOpponents(self, tournament_id):
+        with self._lock:
+            opponents = {}
+            for (opponent_one, opponent_two) in \
+                    self._state["matches"].get(tournament_id, {}).values():
+                if opponent_two is None:
+                    continue
+                opponents.setdefault(opponent_one, set()).add(opponent_two)
+                opponents.setdefault(opponent_two, set()).add(opponent_one)
+            return opponents
+
+    def saveRound(self, tournament_id, round_number, pairings):
+        with self._lock:
+            rounds = self._state["rounds"].setdefault(tournament_id, {})
+            if round_number in rounds:
+                raise ValueError("round %s has already been started" %
+                                 round_number)
+            self._before_write()
+            rounds[round_number] = (
+                [(pairing[0], pairing[2] if len(pairing) == 4 else None)
+                 for pairing in pairings], [])
+
+    def loadRound(self, tournament_id, round_number=None):
+        with self._lock:
+            rounds = self._state["rounds"].get(tournament_id, {})
+            if round_number is None and rounds:
+                round_number = max(rounds)
+            if round_number not in rounds:
+                return None
+            players = self._state["players"]
+            pairings = []
+            for (player_one, player_two) in rounds[round_number][0]:
+                if player_two is None:
+                    pairings.append((player_one, players[player_one][1]))
+                else:
+                    pairings.append((player_one, players[player_one][1],
+                                     player_two, players[player_two][1]))
+            return (round_number, pairings)
+
+    def saveRoundStandings(self, tournament_id, round_number, standings):
+        with self._lock:
+            stored = self._state["rounds"][tournament_id][round_number][1]
+            if stored:
+                return
+            self._before_write()
+            stored.extend((row[0], ) + tuple(row[2:]) for row in standings)
+
+    def loadRoundStandings(self, tournament_id, round_number):
+        with self._lock:
+            rounds = self._state["rounds"].get(tournament_id, {})
+            if round_number not in rounds:
+                return []
+            players = self._state["players"]
+            return [(row[0], players[row[0]][1]) + row[1:]
+                    for row in rounds[round_number][1]]
+
+    def archiveTournament(self, tournament_id, standings):
+        with self._lock:
+            if tournament_id not in self._state["tournaments"]:
+                raise ValueError("tournament %s does not exist" %
+                                 tournament_id)
+            results = self._state["results"][tournament_id]
+            matches = []
+            for (match_id, (opponent_one, opponent_two)) in sorted(
+                    self._state["matches"][tournament_id].items()):
+                if opponent_two is None:
+                    matches.append((match_id, opponent_one, None, False, True))
+                else:
+                    matches.append((match_id, ) + results[match_id] +
+                                   (False, ))
+            self._before_write()
+            self._state["archive"][tournament_id] = (
+                self._state["tournaments"][tournament_id], list(standings),
+                matches)
+            self.deleteTournament(tournament_id)
+
+    def loadArchive(self, tournament_id):
+        with self._lock:
+            return self._state["archive"].get(tournament_id)
+
+    def resetDatabase(self):
+        with self._lock:
+            self._before_write()
+            self._state = self._empty_state()
+
+    def _before_write(self):
+        if self._transaction_depth and self._snapshot is None:
+            self._snapshot = copy.deepcopy(self._state)
+
+    def _next_id(self, kind):
+        next_ids = self._state["next_ids"]
+        next_id = next_ids[kind]
+        next_ids[kind] = next_id + 1
+        return next_id
+
+    def _player_ids(self, tournament_id):
+        return set(self._state["rosters"].get(tournament_id, ()))
+
+    def _check_match(self, tournament_id, match, round_pairings=()):
+        (opponent_one, opponent_two, records) = match
+        for (player_id, outcome) in records:
+            if self.findTournament(player_id) != tournament_id:
+                return "player %s is not registered in tournament %s" % (
+                    player_id, tournament_id)
+        if (opponent_one, opponent_two) in self._state["pairings"] or \
+                (opponent_one, opponent_two) in round_pairings:
+            if opponent_two is None:
+                return "player %s has already received a bye" % opponent_one
+            return "players %s and %s have already played" % (
+                opponent_one, opponent_two)
+        return None
+
+    def _reported_keys(self, tournament_id):
+        matches = self._state["matches"].get(tournament_id, {})
+        return dict((key, (match_id, ) + matches[match_id])
+                    for (key, match_id) in self._state["idempotency_keys"].get(
+                        tournament_id, {}).items())
+
+    def _insert_match(self, tournament_id, match, idempotency_key=None):
+        (opponent_one, opponent_two, records) = match
+        match_id = self._next_id("match")
+        self._state["matches"][tournament_id][match_id] = (
+            opponent_one, opponent_two)
+        if idempotency_key is not None:
+            self._state["idempotency_keys"][tournament_id][idempotency_key] = \
+                match_id
+        self._state["pairings"].add((opponent_one, opponent_two))
+        if opponent_two is not None:
+            ((winner, outcome), (loser, other_outcome)) = records
+            self._state["results"][tournament_id][match_id] = (
+                winner, loser, outcome == "tie")
+        outcomes = ("win", "loss", "tie", "bye")
+        for (player_id, outcome) in records:
+            self._state["records"][player_id][outcomes.index(outcome)] += 1
+        return match_id
+
+
+def replay_Keys_Helper(matches, idempotency_keys, reported):
+    """This is a helper function to the backends' reportMatch and
+    reportMatches that picks out the matches whose idempotency key has already
+    been used.  A key that was used for the same pairing is a retry, and gets
+    back the match recorded the first time.  The result recorded the first
+    time stands.
+
+    Args:
+      matches: a list of (index, match) tuples, where match comes from
+               tournament.validate_Match_Helper
+      idempotency_keys: a list with the key of each match, or None for matches
+                        reported without one
+      reported: a dictionary mapping each key already used in the tournament
+                to a tuple of (match_id, opponent_one, opponent_two)
+
+    Returns:
+      A tuple of (replayed, rejected):
+        replayed: a list of (index, match_id) tuples for the retried matches
+        rejected: a list of (index, error) tuples for the matches whose key
+                  was used for another pairing, or appears twice in matches"""
+    replayed = []
+    rejected = []
+    seen = set()
+    for ((index, (opponent_one, opponent_two, records)), key) in zip(
+            matches, idempotency_keys):
+        if key is None:
+            continue
+        if key in seen:
+            rejected.append(
+                (index, "idempotency key %s is used more than once" % key))
+            continue
+        seen.add(key)
+        if key not in reported:
+            continue
+        (match_id, reported_one, reported_two) = reported[key]
+        if (reported_one, reported_two) == (opponent_one, opponent_two):
+            replayed.append((index, match_id))
+        else:
+            rejected.append((index, "idempotency key %s was already used for "
+                             "another match" % key))
+    return (replayed, rejected)
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+#
+# Benchmarks for tournament.py
+#
+# Plays complete synthetic Swiss tournaments through the public functions in
+# tournament.py and reports how long each function takes.  For example, to
+# play three 64 player and three 257 player events of 7 rounds against the
+# in-memory backend and save the results:
+#
+#   python benchmark.py --backend memory --players 64 257 --rounds 7 \
+#       --events 3 --output results.json
+#
+# Run with --backend postgres to benchmark the tournament database.  The
+# results are printed as JSON so that runs can be compared to catch
+# regressions.
+#
+# --writers measures how match reporting scales with the number of
+# scorekeepers reporting at the same time instead, for example:
+#
+#   python benchmark.py --backend postgres --writers 1 2 4 8 --players 64
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+
+import tournament
+from backends import MemoryBackend
+
+
+# time.perf_counter doesn't exist in Python 2
+clock = getattr(time, "perf_counter", time.time)
+
+OPERATIONS = ["registerPlayer", "registerPlayers", "reportMatch",
+              "reportMatches", "playerStandings", "swissPairings"]
+
+
+class CountingBackend(object):
+    """Wraps a backend and counts the calls made to it, so the results can show
+    how many backend round trips each public function makes."""
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+class Timings(object):
+    """Collects the latency and backend calls of every timed call."""
+    def __init__(self, backend):
+        self.backend = backend
+        self.samples = dict((operation, []) for operation in OPERATIONS)
+        self.calls = dict((operation, 0) for operation in OPERATIONS)
+
+    def time(self, operation, function, *args, **kwargs):
+        calls_before = self.backend.calls
+        start = clock()
+        result = function(*args, **kwargs)
+        self.samples[operation].append(clock() - start)
+        self.calls[operation] += self.backend.calls - calls_before
+        return result
+
+    def summary(self):
+        """Returns a dictionary of statistics for each operation that ran."""
+        summary = {}
+        for operation in OPERATIONS:
+            samples = sorted(self.samples[operation])
+            if not samples:
+                continue
+            total = sum(samples)
+            summary[operation] = {
+                "count": len(samples),
+                "total_seconds": total,
+                "mean_ms": 1000 * total / len(samples),
+                "p50_ms": 1000 * percentile(samples, 50),
+                "p90_ms": 1000 * percentile(samples, 90),
+                "p99_ms": 1000 * percentile(samples, 99),
+                "max_ms": 1000 * samples[-1],
+                "calls_per_second": len(samples) / total if total else None,
+                "backend_calls": self.calls[operation],
+                "backend_calls_per_call":
+                    float(self.calls[operation]) / len(samples)}
+        return summary
+
+
+def percentile(sorted_samples, percent):
+    """Returns the nearest-rank percentile of a sorted list of samples."""
+    rank = int(math.ceil(percent / 100.0 * len(sorted_samples))) - 1
+    return sorted_samples[min(max(rank, 0), len(sorted_samples) - 1)]
+
+
+def generateField(number_of_players, rng):
+    """Makes up a field of players for a synthetic tournament.
+
+    Args:
+      number_of_players: how many players to make.  An odd number makes a
+                         field where someone gets a bye every round
+      rng: a random.Random to draw from
+
+    Returns:
+      A list of (player_name, strength) tuples.  strength is a number from 0
+      to 1; stronger players are more likely to win"""
+    return [("Player %s" % number, rng.random())
+            for number in range(number_of_players)]
+
+
+def playMatch(strength_one, strength_two, tie_rate, rng):
+    """Decides the result of a synthetic match.
+
+    Returns:
+      1 if the first player wins, 2 if the second player wins, or 0 for a
+      tie"""
+    if rng.random() < tie_rate:
+        return 0
+    chance_one = 0.5 + (strength_one - strength_two) / 2
+    return 1 if rng.random() < chance_one else 2
+
+
+def playEvent(timings, number_of_players, rounds, tie_rate, batch, rng):
+    """Plays one synthetic Swiss tournament from registration to final
+    standings, timing every call to tournament.py, then deletes it."""
+    field = generateField(number_of_players, rng)
+    tournament_id = tournament.registerTournament("Benchmark")
+    if batch:
+        player_ids = timings.time(
+            "registerPlayers", tournament.registerPlayers,
+            [player_name for (player_name, strength) in field], tournament_id)
+    else:
+        for (player_name, strength) in field:
+            timings.time("registerPlayer", tournament.registerPlayer,
+                         player_name, tournament_id)
+        player_ids = [row[0] for row in
+                      sorted(tournament.playerStandings(tournament_id))]
+    strengths = dict(zip(player_ids,
+                         [strength for (player_name, strength) in field]))
+    for round_number in range(rounds):
+        try:
+            pairings = timings.time("swissPairings", tournament.swissPairings,
+                                    tournament_id)
+        except (ValueError, tournament.PairingSearchError):
+            # Every pairing would be a rematch, so the event is over
+            break
+        results = []
+        for pairing in pairings:
+            if len(pairing) == 2:
+                results.append((pairing[0], None, None, True))
+                continue
+            outcome = playMatch(strengths[pairing[0]], strengths[pairing[2]],
+                                tie_rate, rng)
+            if outcome == 2:
+                results.append((pairing[2], pairing[0]))
+            else:
+                results.append((pairing[0], pairing[2], outcome == 0))
+        if batch:
+            timings.time("reportMatches", tournament.reportMatches, results,
+                         tournament_id, True)
+        else:
+            for (winner, loser, tie, bye) in [result + (None, ) * (4 - len(
+                    result)) for result in results]:
+                timings.time("reportMatch", tournament.reportMatch, winner,
+                             loser, tie or None, bye, tournament_id)
+        timings.time("playerStandings", tournament.playerStandings,
+                     tournament_id)
+    tournament.deleteTournament(tournament_id)
+
+
+def runBenchmark(backend="memory", players=(64, ), rounds=6, tie_rate=0.1,
+                 events=3, batch=False, seed=1, dsn=None):
+    """Runs the benchmark and returns the results as a dictionary.
+
+    Args:
+      backend: "memory" or "postgres"
+      players: a list of field sizes to play.  Each size is played events
+               times
+      rounds: the number of Swiss rounds in each event
+      tie_rate: the chance that a match is a tie, from 0 to 1
+      events: how many events of each size to play
+      batch: pass in True to register players with registerPlayers and report
+             rounds with reportMatches, instead of one call per player and
+             match
+      seed: the random seed, so that runs can be repeated
+      dsn: the database to use with the postgres backend"""
+    previous_backend = tournament.getBackend()
+    if backend == "memory":
+        real_backend = MemoryBackend()
+    else:
+        if dsn:
+            tournament.configureDatabase(dsn=dsn)
+        real_backend = tournament.PostgresBackend()
+        tournament.enableInstrumentation()
+    counting_backend = CountingBackend(real_backend)
+    tournament.setBackend(counting_backend)
+    rng = random.Random(seed)
+    results = {
+        "config": {"backend": backend, "players": list(players),
+                   "rounds": rounds, "tie_rate": tie_rate, "events": events,
+                   "batch": batch, "seed": seed},
+        "fields": {}}
+    try:
+        for number_of_players in players:
+            timings = Timings(counting_backend)
+            start = clock()
+            for event in range(events):
+                playEvent(timings, number_of_players, rounds, tie_rate, batch,
+                          rng)
+            elapsed = clock() - start
+            results["fields"][str(number_of_players)] = {
+                "seconds": elapsed,
+                "events_per_second": events / elapsed if elapsed else None,
+                "operations": timings.summary(),
+                "database": tournament.instrumentationStats(reset=True)}
+    finally:
+        tournament.setBackend(previous_backend)
+        if backend != "memory":
+            tournament.disableInstrumentation()
+    return results
+
+
+def runWriterBenchmark(backend="postgres", writers=(1, 2, 4, 8), players=64,
+                       rounds=6, tie_rate=0.1, shared=False, seed=1,
+                       dsn=None):
+    """Measures how many matches a second can be reported as more
+    scorekeepers report at the same time.  Each scorekeeper is a thread that
+    reports one match at a time with reportMatch, keyed by round and table.
+    Only the reporting is timed.
+
+    Args:
+      backend: "memory" or "postgres"
+      writers: a list of how many scorekeepers to try
+      players: the number of players in each tournament
+      rounds: the number of Swiss rounds in each tournament
+      tie_rate: the chance that a match is a tie, from 0 to 1
+      shared: pass in True for every scorekeeper to report tables of the same
+              tournament, whose matches are written one at a time.  Otherwise
+              each scorekeeper runs a tournament of their own
+      seed: the random seed, so that runs can be repeated
+      dsn: the database to use with the postgres backend"""
+    previous_backend = tournament.getBackend()
+    if backend == "memory":
+        tournament.setBackend(MemoryBackend())
+    else:
+        # One connection for each scorekeeper, and one for pairing
+        tournament.configureDatabase(dsn=dsn, max_connections=max(writers) + 1)
+        tournament.setBackend(tournament.PostgresBackend())
+    results = {
+        "config": {"backend": backend, "writers": list(writers),
+                   "players": players, "rounds": rounds,
+                   "tie_rate": tie_rate, "shared": shared, "seed": seed},
+        "writers": {}}
+    try:
+        for number_of_writers in writers:
+            rng = random.Random(seed)
+            strengths = {}
+            tournament_ids = []
+            for number in range(1 if shared else number_of_writers):
+                field = generateField(players, rng)
+                tournament_id = tournament.registerTournament("Writers")
+                player_ids = tournament.registerPlayers(
+                    [player_name for (player_name, strength) in field],
+                    tournament_id)
+                strengths.update(zip(player_ids, [
+                    strength for (player_name, strength) in field]))
+                tournament_ids.append(tournament_id)
+            elapsed = 0
+            matches = 0
+            for round_number in range(rounds):
+                tables = []
+                for tournament_id in tournament_ids:
+                    try:
+                        pairings = tournament.swissPairings(tournament_id)
+                    except (ValueError, tournament.PairingSearchError):
+                        continue
+                    tables.append([
+                        (tournament_id, "round-%s-table-%s" % (
+                            round_number + 1, table + 1),
+                         decide_Result_Helper(pairing, strengths, tie_rate,
+                                              rng))
+                        for (table, pairing) in enumerate(pairings)])
+                if shared:
+                    tables = [tables[0][number::number_of_writers]
+                              for number in range(number_of_writers)] \
+                        if tables else []
+                start = clock()
+                report_Tables_Helper(tables)
+                elapsed += clock() - start
+                matches += sum(len(writer_tables) for writer_tables in tables)
+            for tournament_id in tournament_ids:
+                tournament.deleteTournament(tournament_id)
+            results["writers"][str(number_of_writers)] = {
+                "seconds": elapsed, "matches": matches,
+                "matches_per_second": matches / elapsed if elapsed else None}
+    finally:
+        tournament.setBackend(previous_backend)
+    base = results["writers"][str(writers[0])]["matches_per_second"]
+    for writer_results in results["writers"].values():
+        writer_results["speedup"] = \
+            writer_results["matches_per_second"] / base if base else None
+    return results
+
+
+def decide_Result_Helper(pairing, strengths, tie_rate, rng):
+    """This is a helper function to runWriterBenchmark that plays a pairing
+    from swissPairings and returns its result in the same order as the
+    reportMatch parameters."""
+    if len(pairing) == 2:
+        return (pairing[0], None, None, True)
+    outcome = playMatch(strengths[pairing[0]], strengths[pairing[2]],
+                        tie_rate, rng)
+    if outcome == 2:
+        return (pairing[2], pairing[0], None, None)
+    return (pairing[0], pairing[2], outcome == 0 or None, None)
+
+
+def report_Tables_Helper(tables):
+    """This is a helper function to runWriterBenchmark that starts a thread
+    for each scorekeeper's list of (tournament_id, idempotency_key, result)
+    tuples, and waits for them all to be reported."""
+    errors = []
+
+    def scorekeeper(writer_tables):
+        try:
+            for (tournament_id, idempotency_key, result) in writer_tables:
+                tournament.reportMatch(*result, tournament_id=tournament_id,
+                                       idempotency_key=idempotency_key)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=scorekeeper, args=(writer_tables, ))
+               for writer_tables in tables]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark tournament.py with synthetic Swiss events.")
+    parser.add_argument("--backend", choices=["memory", "postgres"],
+                        default="memory")
+    parser.add_argument("--dsn", help="database to use with --backend "
+                        "postgres, for example 'dbname=tournament'")
+    parser.add_argument("--players", type=int, nargs="+", default=[64],
+                        help="field sizes to play; odd sizes include byes")
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--tie-rate", type=float, default=0.1)
+    parser.add_argument("--events", type=int, default=3,
+                        help="events to play for each field size")
+    parser.add_argument("--batch", action="store_true",
+                        help="use registerPlayers and reportMatches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--writers", type=int, nargs="+",
+                        help="measure reporting throughput with this many "
+                        "scorekeepers reporting at once instead; only the "
+                        "first --players size is used")
+    parser.add_argument("--shared", action="store_true",
+                        help="with --writers, have every scorekeeper report "
+                        "in the same tournament")
+    parser.add_argument("--output", help="file to write the JSON results to "
+                        "instead of standard output")
+    arguments = parser.parse_args(argv)
+    if arguments.writers:
+        results = runWriterBenchmark(
+            backend=arguments.backend, writers=arguments.writers,
+            players=arguments.players[0], rounds=arguments.rounds,
+            tie_rate=arguments.tie_rate, shared=arguments.shared,
+            seed=arguments.seed, dsn=arguments.dsn)
+        write_Results_Helper(results, arguments.output)
+        for (number_of_writers, stats) in sorted(
+                results["writers"].items(), key=lambda item: int(item[0])):
+            sys.stderr.write("%3s writers  %8.1f matches/s  %5.2fx\n" % (
+                number_of_writers, stats["matches_per_second"],
+                stats["speedup"]))
+        return
+    results = runBenchmark(
+        backend=arguments.backend, players=arguments.players,
+        rounds=arguments.rounds, tie_rate=arguments.tie_rate,
+        events=arguments.events, batch=arguments.batch, seed=arguments.seed,
+        dsn=arguments.dsn)
+    write_Results_Helper(results, arguments.output)
+    for (number_of_players, field) in sorted(results["fields"].items()):
+        for (operation, stats) in sorted(field["operations"].items()):
+            sys.stderr.write(
+                "%6s players  %-16s p50 %8.3fms  p99 %8.3fms  %5.1f calls\n"
+                % (number_of_players, operation, stats["p50_ms"],
+                   stats["p99_ms"], stats["backend_calls_per_call"]))
+
+
+def write_Results_Helper(results, output_file_name):
+    """This is a helper function to main that writes the results as JSON to a
+    file, or to standard output if no file name is given."""
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if output_file_name:
+        with open(output_file_name, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+-- Migration 0: keep a running total of every player's record in the playerAggregates table.
+-- Databases created by the original tournament.sql count every record each time the standings are read.  This migration adds the running totals and the triggers that maintain them, fills them in from the records already there, and points the playerStandings view at them.  Every later migration expects it to have been applied.
+
+-- Databases created by the original tournament.sql don't have the schemaMigrations table yet
+CREATE TABLE IF NOT EXISTS schemaMigrations (
+    version integer PRIMARY KEY
+,   migration_name varchar(254)
+,   applied_at timestamp NOT NULL DEFAULT now()
+);
+
+-- The playerAggregates table keeps a running total of each player's record, and of the records of everyone the player has played against.  The triggers below keep it up to date as players, matches and records are added and removed, so reading standings only touches the players in one tournament instead of counting every record ever written.
+CREATE TABLE playerAggregates (
+    tournament_id integer REFERENCES tournaments(tournament_id)
+,   player_id integer PRIMARY KEY REFERENCES players(player_id) ON DELETE CASCADE
+,   wins integer NOT NULL DEFAULT 0
+,   losses integer NOT NULL DEFAULT 0
+,   ties integer NOT NULL DEFAULT 0
+,   byes integer NOT NULL DEFAULT 0
+,   matches integer NOT NULL DEFAULT 0
+,   opponent_wins integer NOT NULL DEFAULT 0
+,   opponent_matches integer NOT NULL DEFAULT 0
+);
+CREATE INDEX playerAggregatesByTournament
+ON playerAggregates(tournament_id);
+
+-- Every new player starts with an empty record
+CREATE FUNCTION add_player_aggregates() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO playerAggregates (tournament_id, player_id)
+    VALUES (NEW.tournament_id, NEW.player_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER addPlayerAggregates
+AFTER INSERT ON players
+FOR EACH ROW EXECUTE PROCEDURE add_player_aggregates();
+
+-- When two players are paired, each one's opponent totals take on the other's result.  Removing the match takes it away again.  Byes have no opponent, so they are skipped.
+CREATE FUNCTION update_match_aggregates() RETURNS trigger AS $$
+DECLARE
+    change integer := 1;
+    pairing matchRegistry%ROWTYPE := NEW;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        change := -1;
+        pairing := OLD;
+    END IF;
+    IF pairing.opponent_two IS NULL THEN
+        RETURN NULL;
+    END IF;
+    UPDATE playerAggregates
+    SET
+        opponent_wins = playerAggregates.opponent_wins + change * opponent.wins
+    ,   opponent_matches = playerAggregates.opponent_matches + change * opponent.matches
+    FROM playerAggregates AS opponent
+    WHERE (playerAggregates.player_id = pairing.opponent_one AND opponent.player_id = pairing.opponent_two)
+        OR (playerAggregates.player_id = pairing.opponent_two AND opponent.player_id = pairing.opponent_one);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER updateMatchAggregates
+AFTER INSERT OR DELETE ON matchRegistry
+FOR EACH ROW EXECUTE PROCEDURE update_match_aggregates();
+
+-- Each record changes the player's own totals, and the opponent totals of everyone the player has been paired with
+CREATE FUNCTION update_record_aggregates() RETURNS trigger AS $$
+DECLARE
+    change integer := 1;
+    result records%ROWTYPE := NEW;
+    won integer;
+    played integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        change := -1;
+        result := OLD;
+    END IF;
+    won := change * (result.win IS NOT NULL)::integer;
+    played := change * ((result.win IS NOT NULL)::integer
+                        + (result.loss IS NOT NULL)::integer
+                        + (result.tie IS NOT NULL)::integer);
+    UPDATE playerAggregates
+    SET
+        wins = wins + won
+    ,   losses = losses + change * (result.loss IS NOT NULL)::integer
+    ,   ties = ties + change * (result.tie IS NOT NULL)::integer
+    ,   byes = byes + change * (result.bye IS NOT NULL)::integer
+    ,   matches = matches + played
+    WHERE player_id = result.player_id;
+    IF played != 0 THEN
+        UPDATE playerAggregates
+        SET
+            opponent_wins = opponent_wins + won
+        ,   opponent_matches = opponent_matches + played
+        WHERE player_id IN (
+            SELECT opponent_two
+            FROM matchRegistry
+            WHERE opponent_one = result.player_id
+            UNION
+            SELECT opponent_one
+            FROM matchRegistry
+            WHERE opponent_two = result.player_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER updateRecordAggregates
+AFTER INSERT OR DELETE ON records
+FOR EACH ROW EXECUTE PROCEDURE update_record_aggregates();
+
+-- The computedAggregates view works out the same totals as playerAggregates the slow way, straight from the records and matchRegistry tables.  It is used to check and rebuild playerAggregates.
+CREATE VIEW computedAggregates AS
+WITH totals AS (
+    SELECT
+        players.tournament_id
+    ,   players.player_id
+    ,   count(records.win)::integer AS wins
+    ,   count(records.loss)::integer AS losses
+    ,   count(records.tie)::integer AS ties
+    ,   count(records.bye)::integer AS byes
+    ,   (count(records.win) + count(records.loss) + count(records.tie))::integer AS matches
+    FROM players LEFT JOIN records
+    ON players.player_id = records.player_id
+    GROUP BY players.player_id
+), opponents AS (
+    SELECT opponent_one AS player_id, opponent_two AS opponent_id
+    FROM matchRegistry
+    WHERE opponent_two IS NOT NULL
+    UNION
+    SELECT opponent_two, opponent_one
+    FROM matchRegistry
+    WHERE opponent_two IS NOT NULL
+)
+SELECT
+    totals.tournament_id
+,   totals.player_id
+,   totals.wins
+,   totals.losses
+,   totals.ties
+,   totals.byes
+,   totals.matches
+,   coalesce(sum(opponent.wins), 0)::integer AS opponent_wins
+,   coalesce(sum(opponent.matches), 0)::integer AS opponent_matches
+FROM totals
+LEFT JOIN opponents ON totals.player_id = opponents.player_id
+LEFT JOIN totals AS opponent ON opponents.opponent_id = opponent.player_id
+GROUP BY totals.tournament_id, totals.player_id, totals.wins, totals.losses, totals.ties, totals.byes, totals.matches;
+
+-- Existing players start with the totals of the records they already have
+INSERT INTO playerAggregates (tournament_id, player_id, wins, losses, ties, byes, matches, opponent_wins, opponent_matches)
+SELECT tournament_id, player_id, wins, losses, ties, byes, matches, opponent_wins, opponent_matches
+FROM computedAggregates;
+
+-- The playerStandings view pulls identifying information from the players table and combines it with the playerAggregates table.
+DROP VIEW playerStandings;
+CREATE VIEW playerStandings AS
+SELECT
+    players.player_id
+,   players.player_name
+,   playerAggregates.wins AS total_wins
+,   playerAggregates.matches AS total_matches
+,   playerAggregates.ties AS total_ties
+,   playerAggregates.byes AS bye
+,   players.tournament_id
+,   coalesce(players.player_standing, 0) AS player_standing
+FROM players JOIN playerAggregates
+ON players.player_id = playerAggregates.player_id
+ORDER BY player_standing DESC;
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (0, 'player_aggregates');
@@ -0,0 +1,219 @@
+-- Migration 1: index the tournament lookups, and partition the matchRegistry and records tables by tournament.
+-- Every tournament gets its own matchRegistry_<id> and records_<id> partitions, created when the tournament is added (ahead of time, 64 tournaments at once, since migration 6) and dropped when it is deleted, so the queries for one tournament only ever touch that tournament's rows, and a finished tournament can be scanned, detached or dropped on its own.
+-- This file is applied by tournament.sql to new databases, and by migrateDatabase() in tournament.py to existing ones.  It needs PostgreSQL 12 or later.
+
+-- The players table isn't partitioned, so it needs an index for looking players up by tournament.  Making it a unique constraint also lets the partitioned tables check that both players in a match belong to the match's tournament
+ALTER TABLE players
+ADD CONSTRAINT playersByTournament UNIQUE (tournament_id, player_id);
+
+-- Move the old tables out of the way.  The views read them, so they are dropped and recreated below.  Their rows are copied into the new tables before they are dropped
+DROP VIEW IF EXISTS counts;
+DROP VIEW IF EXISTS computedAggregates;
+ALTER TABLE records RENAME TO recordsUnpartitioned;
+ALTER TABLE matchRegistry RENAME TO matchRegistryUnpartitioned;
+ALTER TABLE matchRegistryUnpartitioned
+RENAME CONSTRAINT matchregistry_pkey TO matchRegistryUnpartitioned_pkey;
+ALTER INDEX reverseMatchRegistry RENAME TO reverseMatchRegistryUnpartitioned;
+ALTER INDEX noPlayerWithTwoByes RENAME TO noPlayerWithTwoByesUnpartitioned;
+-- Keep handing out match ids from the same sequence
+ALTER SEQUENCE matchregistry_match_id_seq OWNED BY NONE;
+
+-- Unique indexes on a partitioned table have to include the partition key, so each match is identified by (tournament_id, match_id).  match_id alone is still unique, since every match_id comes from the same sequence
+CREATE TABLE matchRegistry (
+    tournament_id integer NOT NULL REFERENCES tournaments(tournament_id)
+,   match_id integer NOT NULL DEFAULT nextval('matchregistry_match_id_seq')
+,   opponent_one integer
+,   opponent_two integer
+    CHECK (opponent_one != opponent_two)
+,   PRIMARY KEY (tournament_id, match_id)
+,   FOREIGN KEY (tournament_id, opponent_one) REFERENCES players(tournament_id, player_id)
+,   FOREIGN KEY (tournament_id, opponent_two) REFERENCES players(tournament_id, player_id)
+) PARTITION BY LIST (tournament_id);
+ALTER SEQUENCE matchregistry_match_id_seq OWNED BY matchRegistry.match_id;
+-- Prevents rematches, and finds the matches of a player in the opponent_one slot
+CREATE UNIQUE INDEX reverseMatchRegistry
+ON matchRegistry(tournament_id, opponent_one, opponent_two);
+-- Finds the matches of a player in the opponent_two slot
+CREATE INDEX matchRegistryByOpponentTwo
+ON matchRegistry(opponent_two);
+
+CREATE TABLE records (
+    tournament_id integer NOT NULL REFERENCES tournaments(tournament_id)
+,   match_id integer
+,   player_id integer
+,   win boolean
+,   loss boolean
+,   tie boolean
+,   bye boolean
+,   FOREIGN KEY (tournament_id, match_id) REFERENCES matchRegistry(tournament_id, match_id)
+,   FOREIGN KEY (tournament_id, player_id) REFERENCES players(tournament_id, player_id)
+) PARTITION BY LIST (tournament_id);
+-- Prevents the same player from receiving multiple byes, and finds a player's records
+CREATE UNIQUE INDEX noPlayerWithTwoByes
+ON records(tournament_id, player_id, bye);
+-- Finds the records of a match, for example when the match is deleted
+CREATE INDEX recordsByMatch
+ON records(match_id);
+
+-- Creates a tournament's partitions of the matchRegistry and records tables
+CREATE FUNCTION create_tournament_partitions(tournament integer) RETURNS void AS $$
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF matchRegistry FOR VALUES IN (%s)',
+                   'matchregistry_' || tournament, tournament);
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF records FOR VALUES IN (%s)',
+                   'records_' || tournament, tournament);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION add_tournament_partitions() RETURNS trigger AS $$
+BEGIN
+    PERFORM create_tournament_partitions(NEW.tournament_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER addTournamentPartitions
+AFTER INSERT ON tournaments
+FOR EACH ROW EXECUTE PROCEDURE add_tournament_partitions();
+
+-- A deleted tournament's matches and records have already been deleted, since they reference the tournament, so its empty partitions can be dropped.  The records partition references the matchRegistry partition, so it goes first, and the matchRegistry partition has to be detached before it can be dropped
+CREATE FUNCTION drop_tournament_partitions() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', 'records_' || OLD.tournament_id);
+    IF to_regclass('matchregistry_' || OLD.tournament_id) IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE matchRegistry DETACH PARTITION %I',
+                       'matchregistry_' || OLD.tournament_id);
+        EXECUTE format('DROP TABLE %I', 'matchregistry_' || OLD.tournament_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dropTournamentPartitions
+AFTER DELETE ON tournaments
+FOR EACH ROW EXECUTE PROCEDURE drop_tournament_partitions();
+
+DO $$
+BEGIN
+    PERFORM create_tournament_partitions(tournament_id)
+    FROM tournaments;
+END;
+$$;
+
+-- The running totals in playerAggregates already count these rows, so they are copied before the triggers that update the totals are created.  Rows written before tournament ids were recorded take the tournament of their player
+INSERT INTO matchRegistry (tournament_id, match_id, opponent_one, opponent_two)
+SELECT coalesce(old.tournament_id, players.tournament_id), old.match_id, old.opponent_one, old.opponent_two
+FROM matchRegistryUnpartitioned AS old LEFT JOIN players
+ON old.opponent_one = players.player_id;
+
+INSERT INTO records (tournament_id, match_id, player_id, win, loss, tie, bye)
+SELECT coalesce(old.tournament_id, players.tournament_id), old.match_id, old.player_id, old.win, old.loss, old.tie, old.bye
+FROM recordsUnpartitioned AS old LEFT JOIN players
+ON old.player_id = players.player_id;
+
+DROP TABLE recordsUnpartitioned;
+DROP TABLE matchRegistryUnpartitioned;
+
+-- Same as before, except that the opponents are looked up in the player's own tournament, so only that tournament's partition is read
+CREATE OR REPLACE FUNCTION update_record_aggregates() RETURNS trigger AS $$
+DECLARE
+    change integer := 1;
+    result records%ROWTYPE := NEW;
+    won integer;
+    played integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        change := -1;
+        result := OLD;
+    END IF;
+    won := change * (result.win IS NOT NULL)::integer;
+    played := change * ((result.win IS NOT NULL)::integer
+                        + (result.loss IS NOT NULL)::integer
+                        + (result.tie IS NOT NULL)::integer);
+    UPDATE playerAggregates
+    SET
+        wins = wins + won
+    ,   losses = losses + change * (result.loss IS NOT NULL)::integer
+    ,   ties = ties + change * (result.tie IS NOT NULL)::integer
+    ,   byes = byes + change * (result.bye IS NOT NULL)::integer
+    ,   matches = matches + played
+    WHERE player_id = result.player_id;
+    IF played != 0 THEN
+        UPDATE playerAggregates
+        SET
+            opponent_wins = opponent_wins + won
+        ,   opponent_matches = opponent_matches + played
+        WHERE player_id IN (
+            SELECT opponent_two
+            FROM matchRegistry
+            WHERE tournament_id = result.tournament_id AND opponent_one = result.player_id
+            UNION
+            SELECT opponent_one
+            FROM matchRegistry
+            WHERE tournament_id = result.tournament_id AND opponent_two = result.player_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER updateMatchAggregates
+AFTER INSERT OR DELETE ON matchRegistry
+FOR EACH ROW EXECUTE PROCEDURE update_match_aggregates();
+
+CREATE TRIGGER updateRecordAggregates
+AFTER INSERT OR DELETE ON records
+FOR EACH ROW EXECUTE PROCEDURE update_record_aggregates();
+
+-- The views are unchanged
+CREATE VIEW counts AS
+SELECT
+    player_id
+,   count(win) AS total_wins
+,   (count(win) + count(loss) + count(tie)) AS total_matches
+,   count(tie) AS total_ties
+,   count(bye) AS bye
+FROM records
+GROUP BY player_id;
+
+CREATE VIEW computedAggregates AS
+WITH totals AS (
+    SELECT
+        players.tournament_id
+    ,   players.player_id
+    ,   count(records.win)::integer AS wins
+    ,   count(records.loss)::integer AS losses
+    ,   count(records.tie)::integer AS ties
+    ,   count(records.bye)::integer AS byes
+    ,   (count(records.win) + count(records.loss) + count(records.tie))::integer AS matches
+    FROM players LEFT JOIN records
+    ON players.player_id = records.player_id
+    GROUP BY players.player_id
+), opponents AS (
+    SELECT opponent_one AS player_id, opponent_two AS opponent_id
+    FROM matchRegistry
+    WHERE opponent_two IS NOT NULL
+    UNION
+    SELECT opponent_two, opponent_one
+    FROM matchRegistry
+    WHERE opponent_two IS NOT NULL
+)
+SELECT
+    totals.tournament_id
+,   totals.player_id
+,   totals.wins
+,   totals.losses
+,   totals.ties
+,   totals.byes
+,   totals.matches
+,   coalesce(sum(opponent.wins), 0)::integer AS opponent_wins
+,   coalesce(sum(opponent.matches), 0)::integer AS opponent_matches
+FROM totals
+LEFT JOIN opponents ON totals.player_id = opponents.player_id
+LEFT JOIN totals AS opponent ON opponents.opponent_id = opponent.player_id
+GROUP BY totals.tournament_id, totals.player_id, totals.wins, totals.losses, totals.ties, totals.byes, totals.matches;
+
+ANALYZE matchRegistry;
+ANALYZE records;
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (1, 'partition_by_tournament');
@@ -0,0 +1,11 @@
+-- Migration 2: let scorekeepers attach an idempotency key to each match they report.
+-- A key names one result in one tournament, for example 'round-3-table-7'.  Reporting the same result again with the same key hands back the match that was already recorded instead of failing as a rematch, so a scorekeeper whose connection dropped can safely retry.
+
+ALTER TABLE matchRegistry
+ADD COLUMN idempotency_key varchar(254);
+-- Each key can only be used once per tournament.  Matches reported without a key leave it null, and nulls never clash
+CREATE UNIQUE INDEX matchRegistryByIdempotencyKey
+ON matchRegistry(tournament_id, idempotency_key);
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (2, 'idempotency_keys');
@@ -0,0 +1,42 @@
+-- Migration 3: store each round's pairings when the round is started, and a snapshot of the standings when it is finished.
+-- startRound() in tournament.py pairs the players once and saves the pairings here, so reading a round back is a primary key lookup, results can be checked against the pairings that were actually issued, and the standings after any earlier round can be read without replaying the matches.
+
+CREATE TABLE rounds (
+    tournament_id integer REFERENCES tournaments(tournament_id)
+,   round_number integer CHECK (round_number > 0)
+,   started_at timestamp NOT NULL DEFAULT now()
+,   PRIMARY KEY (tournament_id, round_number)
+);
+
+-- One row for each table of a round, in the order swissPairings returned them.  In the case of a bye, player_two is null
+CREATE TABLE roundPairings (
+    tournament_id integer
+,   round_number integer
+,   table_number integer
+,   player_one integer NOT NULL
+,   player_two integer
+,   PRIMARY KEY (tournament_id, round_number, table_number)
+,   FOREIGN KEY (tournament_id, round_number) REFERENCES rounds(tournament_id, round_number)
+,   FOREIGN KEY (tournament_id, player_one) REFERENCES players(tournament_id, player_id)
+,   FOREIGN KEY (tournament_id, player_two) REFERENCES players(tournament_id, player_id)
+);
+
+-- The standings once every result of a round was in, one row for each place
+CREATE TABLE roundStandings (
+    tournament_id integer
+,   round_number integer
+,   place integer
+,   player_id integer NOT NULL
+,   wins integer NOT NULL
+,   matches integer NOT NULL
+,   ties integer NOT NULL
+,   byes integer NOT NULL
+,   opponent_match_wins double precision NOT NULL
+,   player_standing decimal NOT NULL
+,   PRIMARY KEY (tournament_id, round_number, place)
+,   FOREIGN KEY (tournament_id, round_number) REFERENCES rounds(tournament_id, round_number)
+,   FOREIGN KEY (tournament_id, player_id) REFERENCES players(tournament_id, player_id)
+);
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (3, 'rounds');
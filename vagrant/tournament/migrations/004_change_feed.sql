@@ -0,0 +1,60 @@
+-- Migration 4: publish a notification whenever a tournament's players or results change.
+-- Every statement that adds or removes players or records bumps the tournament's version and sends a NOTIFY on the channel tournament_<id>, with a JSON payload like {"tournament_id": 3, "version": 12, "players": [17, 21]}.  players lists the players whose own records changed; it is null when there are too many to fit in a notification.  Notifications are only delivered when the transaction commits, in order.  watchStandings() in tournament.py listens for them.
+
+ALTER TABLE tournaments
+ADD COLUMN version bigint NOT NULL DEFAULT 0;
+
+-- Runs once per statement, with the statement's rows in the changed_rows transition table, so reporting a whole round sends one notification rather than one for every record
+CREATE FUNCTION notify_tournament_changes() RETURNS trigger AS $$
+DECLARE
+    changed record;
+    new_version bigint;
+BEGIN
+    FOR changed IN
+        SELECT tournament_id, array_agg(DISTINCT player_id) AS player_ids
+        FROM changed_rows
+        WHERE tournament_id IS NOT NULL
+        GROUP BY tournament_id
+    LOOP
+        UPDATE tournaments
+        SET version = version + 1
+        WHERE tournament_id = changed.tournament_id
+        RETURNING version INTO new_version;
+        -- A deleted tournament has no row left to count versions in
+        CONTINUE WHEN new_version IS NULL;
+        -- NOTIFY payloads must stay under 8000 bytes
+        PERFORM pg_notify('tournament_' || changed.tournament_id,
+                          json_build_object(
+                              'tournament_id', changed.tournament_id
+                          ,   'version', new_version
+                          ,   'players', CASE
+                                  WHEN cardinality(changed.player_ids) <= 500
+                                  THEN changed.player_ids
+                              END)::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notifyRecordsInserted
+AFTER INSERT ON records
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_tournament_changes();
+
+CREATE TRIGGER notifyRecordsDeleted
+AFTER DELETE ON records
+REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_tournament_changes();
+
+CREATE TRIGGER notifyPlayersInserted
+AFTER INSERT ON players
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_tournament_changes();
+
+CREATE TRIGGER notifyPlayersDeleted
+AFTER DELETE ON players
+REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE notify_tournament_changes();
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (4, 'change_feed');
@@ -0,0 +1,86 @@
+-- Migration 5: make clearing out tournaments quick, and archive finished tournaments.
+-- Deleting a tournament's matches used to run the aggregate triggers once for every row, each of which updated the running totals of the player and everyone they had played.  Now a bulk delete turns the triggers off for its own transaction and resets the totals afterwards with one UPDATE, deleting a tournament drops its partitions instead of emptying them, and the foreign key checks on deleted matches use an index.  Deleting a tournament's players is still one row at a time, with a foreign key check on each, so deleteTournament() still takes longer the more players there are: between 0.2 and 0.4 seconds for 2000 players, of which dropping the partitions is a few milliseconds.  archiveTournament() in tournament.py moves a finished tournament into archivedTournaments, one compact row per tournament, so the active tables only hold the tournaments still being played.
+
+-- The aggregate triggers are skipped while tournament.bulk_delete is on.  Only the statements that delete a tournament's matches turn it on, with set_config(..., true) so that it never outlasts their transaction, and they fix the totals themselves
+DROP TRIGGER updateMatchAggregates ON matchRegistry;
+CREATE TRIGGER updateMatchAggregates
+AFTER INSERT OR DELETE ON matchRegistry
+FOR EACH ROW
+WHEN (current_setting('tournament.bulk_delete', true) IS DISTINCT FROM 'on')
+EXECUTE PROCEDURE update_match_aggregates();
+
+DROP TRIGGER updateRecordAggregates ON records;
+CREATE TRIGGER updateRecordAggregates
+AFTER INSERT OR DELETE ON records
+FOR EACH ROW
+WHEN (current_setting('tournament.bulk_delete', true) IS DISTINCT FROM 'on')
+EXECUTE PROCEDURE update_record_aggregates();
+
+-- Deleting a match checks that no records still refer to it by (tournament_id, match_id).  The old index on match_id alone lost out to the noPlayerWithTwoByes index, which made each check scan every record of the tournament
+DROP INDEX recordsByMatch;
+CREATE INDEX recordsByMatch
+ON records(tournament_id, match_id);
+
+-- Drops a tournament's partitions of the matchRegistry and records tables along with the rows in them, which takes the same time however many matches were played.  No row triggers fire, so the running totals of the tournament's players are left as they were; it is only used when the players are removed too
+CREATE FUNCTION remove_tournament_partitions(tournament integer) RETURNS void AS $$
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS %I', 'records_' || tournament);
+    IF to_regclass('matchregistry_' || tournament) IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE matchRegistry DETACH PARTITION %I',
+                       'matchregistry_' || tournament);
+        EXECUTE format('DROP TABLE %I', 'matchregistry_' || tournament);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION drop_tournament_partitions() RETURNS trigger AS $$
+BEGIN
+    PERFORM remove_tournament_partitions(OLD.tournament_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One row for each archived tournament.  The final standings and every match are kept as arrays, which PostgreSQL compresses and stores out of line, instead of as one row per player and per record
+CREATE TABLE archivedTournaments (
+    tournament_id integer PRIMARY KEY
+,   tournament_name varchar(254)
+,   archived_at timestamp NOT NULL DEFAULT now()
+    -- The final standings, with one element for each player in order of place
+,   player_ids integer[] NOT NULL
+,   player_names varchar(254)[] NOT NULL
+,   wins integer[] NOT NULL
+,   matches integer[] NOT NULL
+,   ties integer[] NOT NULL
+,   byes integer[] NOT NULL
+,   opponent_match_wins double precision[] NOT NULL
+,   player_standings decimal[] NOT NULL
+    -- Every match in the order it was reported, in the form matchHistory() returns them.  losers is null for a bye
+,   match_ids integer[] NOT NULL
+,   winners integer[] NOT NULL
+,   losers integer[] NOT NULL
+,   match_ties boolean[] NOT NULL
+,   match_byes boolean[] NOT NULL
+);
+
+-- The archived standings with one row for each place, for querying them with SQL
+CREATE VIEW archivedStandings AS
+SELECT
+    archivedTournaments.tournament_id
+,   standings.place
+,   standings.player_id
+,   standings.player_name
+,   standings.wins
+,   standings.matches
+,   standings.ties
+,   standings.byes
+,   standings.opponent_match_wins
+,   standings.player_standing
+FROM archivedTournaments,
+    unnest(player_ids, player_names, wins, matches, ties, byes,
+           opponent_match_wins, player_standings)
+    WITH ORDINALITY AS standings (player_id, player_name, wins, matches, ties,
+                                  byes, opponent_match_wins, player_standing,
+                                  place);
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (5, 'bulk_lifecycle');
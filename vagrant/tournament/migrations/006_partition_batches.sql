@@ -0,0 +1,45 @@
+-- Migration 6: create tournaments' partitions ahead of time, in batches.
+-- Creating a partition takes an ACCESS EXCLUSIVE lock on matchRegistry and records, and used to happen every time a tournament was registered, holding up every other tournament's queries until the registration committed.  Now registering a tournament that has no partitions yet, with register_tournament(), creates them for it and the next 63 tournament ids in one go, so the lock is only taken once for every 64 tournaments, at the cost of up to 63 empty partitions waiting to be used.  A tournament's partitions are still dropped on their own when it is deleted or archived, by deleteTournament() and archiveTournament() while they hold the tournament's advisory lock.
+
+-- Creates the partitions of tournaments first to last that don't exist yet.  Concurrent registrations take turns, under the advisory lock (3, 0), so that they don't both try to create the same partitions.  tournament.py uses the lock keys 1 and 2.  Creating a partition also locks the tables it references, and those locks are taken up front in the order reportMatch() and registerPlayers() take theirs, matchRegistry and records before players and tournaments, so that a batch waits for them to finish rather than deadlocking with them
+CREATE FUNCTION create_tournament_partition_batch(first integer, last integer) RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(3, 0);
+    LOCK TABLE matchRegistry, records IN ACCESS EXCLUSIVE MODE;
+    LOCK TABLE players, tournaments IN SHARE ROW EXCLUSIVE MODE;
+    PERFORM create_tournament_partitions(tournament)
+    FROM generate_series(first, last) AS tournament
+    WHERE to_regclass('matchregistry_' || tournament) IS NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Registers a tournament and returns its id, creating the next batch of partitions first if its own don't exist yet.  The partitions have to be created before the tournament is inserted: creating them locks the tournaments table against inserts, so two registrations that had each inserted their tournament and then both needed a batch would wait on each other
+CREATE FUNCTION register_tournament(tournament_name text) RETURNS integer AS $$
+DECLARE
+    new_id integer := nextval('tournaments_tournament_id_seq');
+BEGIN
+    IF to_regclass('matchregistry_' || new_id) IS NULL THEN
+        PERFORM create_tournament_partition_batch(new_id, new_id + 63);
+    END IF;
+    INSERT INTO tournaments VALUES (new_id, tournament_name);
+    RETURN new_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tournaments inserted directly, rather than with register_tournament(), still get their partitions, a batch at a time
+CREATE OR REPLACE FUNCTION add_tournament_partitions() RETURNS trigger AS $$
+BEGIN
+    IF to_regclass('matchregistry_' || NEW.tournament_id) IS NULL THEN
+        PERFORM create_tournament_partition_batch(NEW.tournament_id, NEW.tournament_id + 63);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Start the next batch now, so that the next tournament registered doesn't have to
+SELECT create_tournament_partition_batch(next_id, next_id + 63)
+FROM (SELECT (last_value + is_called::integer)::integer AS next_id
+      FROM tournaments_tournament_id_seq) AS sequence;
+
+INSERT INTO schemaMigrations (version, migration_name)
+VALUES (6, 'partition_batches');
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+#
+# Monte Carlo simulations of Swiss tournaments
+#
+# Plays thousands of complete Swiss events in memory with the pairing and
+# scoring rules in tournament.py, and reports how often each player finishes
+# in each place, how likely each player is to win a prize, and how often the
+# event has a clear winner after each round.  No database is used.  For
+# example, to play 2000 events of 7 rounds with a field of 100 players whose
+# Elo ratings are read from a CSV file of name,rating lines:
+#
+#   python simulation.py --field players.csv --rounds 7 --events 2000 \
+#       --prizes 8 --output results.json
+#
+# The events are spread across a pool of worker processes; --processes 1 plays
+# them all in this process.
+
+import argparse
+import csv
+import json
+import math
+import multiprocessing
+import random
+import sys
+
+import tournament
+from backends import MemoryBackend
+from benchmark import generateField, playMatch
+
+
+# The number of events each worker process plays at a time
+CHUNK_SIZE = 25
+
+
+class EloModel(object):
+    """Decides matches from each player's Elo rating.  A player rated 400
+    points higher than their opponent wins ten times as often as they lose.
+
+    Args:
+      ratings: a list of ratings, one for each player in the field
+      tie_rate: the chance that a match is a tie, from 0 to 1"""
+    def __init__(self, ratings, tie_rate=0.0):
+        self.ratings = list(ratings)
+        self.tie_rate = tie_rate
+
+    def __call__(self, player_one, player_two, rng):
+        if rng.random() < self.tie_rate:
+            return 0
+        chance_one = 1.0 / (1 + 10 ** (
+            (self.ratings[player_two] - self.ratings[player_one]) / 400.0))
+        return 1 if rng.random() < chance_one else 2
+
+
+class StrengthModel(object):
+    """Decides matches the same way benchmark.py does, from strengths between
+    0 and 1.  The stronger player's chance of winning grows with the
+    difference in strength.
+
+    Args:
+      strengths: a list of strengths, one for each player in the field
+      tie_rate: the chance that a match is a tie, from 0 to 1"""
+    def __init__(self, strengths, tie_rate=0.0):
+        self.strengths = list(strengths)
+        self.tie_rate = tie_rate
+
+    def __call__(self, player_one, player_two, rng):
+        return playMatch(self.strengths[player_one],
+                         self.strengths[player_two], self.tie_rate, rng)
+
+
+def simulateTournament(player_names, model, rounds=None, events=1000,
+                       prizes=1, processes=None, seed=1):
+    """Plays complete Swiss events in memory and counts how they turn out.
+
+    Args:
+      player_names: a list of the players' names.  Players are referred to by
+                    their place in this list everywhere else
+      model: decides the result of each match.  Called as
+             model(player_one, player_two, rng), where player_one and
+             player_two are places in player_names and rng is a random.Random,
+             it returns 1 if player_one wins, 2 if player_two wins or 0 for a
+             tie.  EloModel and StrengthModel are ready made models; other
+             models must be picklable so that they can be sent to the worker
+             processes
+      rounds: the number of rounds in each event.  If not provided, enough
+              rounds are played for a field of this size to have one
+              undefeated player, the base 2 logarithm of the number of
+              players rounded up
+      events: how many events to play
+      prizes: how many places at the top of the standings win a prize
+      processes: how many worker processes to play the events in.  If not
+                 provided, one is started for each CPU.  1 plays every event
+                 in this process
+      seed: the random seed, so that simulations can be repeated
+
+    Returns:
+      A dictionary of:
+        events: the number of events played
+        rounds: the number of rounds in each event
+        stopped_early: the number of events that ended before the last round
+                       because every pairing would have been a rematch
+        clear_winner_chance: a list with, for each round, the fraction of
+                             events in which exactly one player had the most
+                             match points after that round
+        players: a list with a dictionary for each player, in the same order
+                 as player_names, of name, places (a dictionary mapping each
+                 final place, starting from 1, to the number of events the
+                 player finished there), mean_place, mean_points,
+                 win_chance and prize_chance"""
+    if rounds is None:
+        rounds = max(1, int(math.ceil(math.log(max(len(player_names), 2), 2))))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # Each chunk of events gets its own seed.  The chunks are the same however
+    # many processes there are, so the results are too
+    chunks = [(list(player_names), model, rounds, seed * 1000003 + number,
+               min(CHUNK_SIZE, events - start))
+              for (number, start) in enumerate(range(0, events, CHUNK_SIZE))]
+    if processes == 1:
+        counts = [simulateChunk(chunk) for chunk in chunks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            counts = pool.map(simulateChunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    return summarize_Counts_Helper(player_names, rounds, prizes,
+                                   merge_Counts_Helper(counts))
+
+
+def simulateChunk(chunk):
+    """Plays a chunk of the events of simulateTournament, in a worker process
+    or in this one, and returns the counts from them.
+
+    Args:
+      chunk: a tuple of (player_names, model, rounds, seed, events)"""
+    (player_names, model, rounds, seed, events) = chunk
+    rng = random.Random(seed)
+    counts = {"events": 0, "stopped_early": 0,
+              "clear_winners": [0] * rounds,
+              "places": [{} for player_name in player_names],
+              "points": [0] * len(player_names)}
+    previous_backend = tournament.getBackend()
+    tournament.setBackend(MemoryBackend())
+    try:
+        # The players are registered once.  Deleting the matches after each
+        # event resets everyone's record for the next one
+        tournament_id = tournament.registerTournament("Simulation")
+        player_ids = tournament.registerPlayers(player_names, tournament_id)
+        places = dict((player_id, place)
+                      for (place, player_id) in enumerate(player_ids))
+        for event in range(events):
+            play_Event_Helper(tournament_id, places, model, rounds, rng,
+                              counts)
+            tournament.deleteMatches(tournament_id)
+    finally:
+        tournament.setBackend(previous_backend)
+    return counts
+
+
+def play_Event_Helper(tournament_id, places, model, rounds, rng, counts):
+    """This is a helper function to simulateChunk that plays one event with
+    the public functions in tournament.py, and adds how it turned out to
+    counts.
+
+    Args:
+      tournament_id: the tournament to play the event in.  It must not have
+                     any matches yet
+      places: a dictionary mapping each player id to the player's place in
+              the field"""
+    for round_number in range(rounds):
+        try:
+            pairings = tournament.swissPairings(tournament_id)
+        except (ValueError, tournament.PairingSearchError):
+            counts["stopped_early"] += 1
+            break
+        results = []
+        for pairing in pairings:
+            if len(pairing) == 2:
+                results.append((pairing[0], None, None, True))
+                continue
+            outcome = model(places[pairing[0]], places[pairing[2]], rng)
+            if outcome == 2:
+                results.append((pairing[2], pairing[0]))
+            else:
+                results.append((pairing[0], pairing[2], outcome == 0))
+        tournament.reportMatches(results, tournament_id, True)
+        points = sorted([match_points for (
+            player_id, player_name, match_points, tiebreakers)
+            in tournament.playerTiebreakers(tournament_id)], reverse=True)
+        if len(points) == 1 or points[0] > points[1]:
+            counts["clear_winners"][round_number] += 1
+    standings = tournament.playerTiebreakers(tournament_id)
+    for (final_place, row) in enumerate(standings):
+        (player_id, player_name, match_points, tiebreakers) = row
+        place_counts = counts["places"][places[player_id]]
+        place_counts[final_place + 1] = \
+            place_counts.get(final_place + 1, 0) + 1
+        counts["points"][places[player_id]] += match_points
+    counts["events"] += 1
+
+
+def merge_Counts_Helper(counts):
+    """This is a helper function to simulateTournament that adds up the counts
+    from every chunk."""
+    total = counts[0]
+    for chunk_counts in counts[1:]:
+        for name in ("events", "stopped_early"):
+            total[name] += chunk_counts[name]
+        for name in ("clear_winners", "points"):
+            total[name] = [a + b for (a, b) in
+                           zip(total[name], chunk_counts[name])]
+        for (place_counts, chunk_place_counts) in zip(
+                total["places"], chunk_counts["places"]):
+            for (place, count) in chunk_place_counts.items():
+                place_counts[place] = place_counts.get(place, 0) + count
+    return total
+
+
+def summarize_Counts_Helper(player_names, rounds, prizes, counts):
+    """This is a helper function to simulateTournament that turns the counts
+    into the fractions and means it returns."""
+    events = counts["events"]
+    players = []
+    for (player_name, place_counts, points) in zip(
+            player_names, counts["places"], counts["points"]):
+        players.append({
+            "name": player_name,
+            "places": dict(sorted(place_counts.items())),
+            "mean_place": float(sum(place * count for (place, count)
+                                    in place_counts.items())) / events,
+            "mean_points": float(points) / events,
+            "win_chance": float(place_counts.get(1, 0)) / events,
+            "prize_chance": float(sum(
+                count for (place, count) in place_counts.items()
+                if place <= prizes)) / events})
+    return {"events": events, "rounds": rounds,
+            "stopped_early": counts["stopped_early"],
+            "clear_winner_chance": [float(count) / events
+                                    for count in counts["clear_winners"]],
+            "players": players}
+
+
+def readField(field_file):
+    """Reads a field of players from a CSV file of name,rating lines.
+
+    Returns:
+      A list of (player_name, rating) tuples"""
+    with open(field_file) as csv_file:
+        return [(row[0], float(row[1])) for row in csv.reader(csv_file)
+                if row]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate Swiss tournaments to predict how they end.")
+    parser.add_argument("--field", help="CSV file of name,rating lines.  If "
+                        "not given, a field is made up")
+    parser.add_argument("--players", type=int, default=64,
+                        help="size of the made up field")
+    parser.add_argument("--model", choices=["elo", "strength"],
+                        default="elo", help="how match results are decided "
+                        "from the ratings; strength expects ratings from 0 "
+                        "to 1")
+    parser.add_argument("--rounds", type=int)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--tie-rate", type=float, default=0.0)
+    parser.add_argument("--prizes", type=int, default=1,
+                        help="places at the top that win a prize")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="file to write the JSON results to "
+                        "instead of standard output")
+    arguments = parser.parse_args(argv)
+    if arguments.field:
+        field = readField(arguments.field)
+    else:
+        field = generateField(arguments.players,
+                              random.Random(arguments.seed))
+        if arguments.model == "elo":
+            field = [(player_name, 1000 + 1000 * strength)
+                     for (player_name, strength) in field]
+    ratings = [rating for (player_name, rating) in field]
+    if arguments.model == "elo":
+        model = EloModel(ratings, arguments.tie_rate)
+    else:
+        model = StrengthModel(ratings, arguments.tie_rate)
+    results = simulateTournament(
+        [player_name for (player_name, rating) in field], model,
+        rounds=arguments.rounds, events=arguments.events,
+        prizes=arguments.prizes, processes=arguments.processes,
+        seed=arguments.seed)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    for (rating, player) in sorted(zip(ratings, results["players"]),
+                                   key=lambda pair: -pair[0])[:10]:
+        sys.stderr.write("%-20s %8.1f  mean place %6.1f  win %5.1f%%  "
+                         "prize %5.1f%%\n" % (
+                             player["name"][:20], rating,
+                             player["mean_place"], 100 * player["win_chance"],
+                             100 * player["prize_chance"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,226 +1,2263 @@
+import functools
+import gzip
+import itertools
+import json
+import logging
+import os
+import select
+import threading
+import time
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 # Importing and using bleach just in case this tournament database is ever
 # migrated to a web framework
 import bleach
-from operator import itemgetter
+# NumPy is optional.  Without it, standings are calculated in pure Python
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from collections import OrderedDict
 from contextlib import contextmanager
+from backends import Backend, MemoryBackend, replay_Keys_Helper
+
+
+# Connection settings used when the pool is first created.  Call
+# configureDatabase() to change them.
+DATABASE_SETTINGS = {
+    "dsn": "dbname=tournament",
+    "min_connections": 1,
+    "max_connections": 10,
+    "health_check": True,
+    "timeout": None,
+    "replica_dsns": [],
+    "read_your_writes": True}
+
+# The SQL files that bring an existing database up to date, applied in order
+# by migrateDatabase()
+MIGRATIONS_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "migrations")
+# The first key of the advisory lock held while migrating the database
+MIGRATION_LOCK = 1
+# The first key of the advisory locks held while a tournament's matches are
+# written.  The second key is the tournament id
+REPORT_LOCK = 2
+
+# Deletes a tournament's rounds.  Rounds refer to the tournament's players,
+# so they are deleted along with its matches or players
+DELETE_ROUNDS = """
+    DELETE FROM roundStandings WHERE tournament_id = %(tournament_id)s;
+    DELETE FROM roundPairings WHERE tournament_id = %(tournament_id)s;
+    DELETE FROM rounds WHERE tournament_id = %(tournament_id)s;"""
+# Deletes a tournament's players.  Their matches have to be deleted first
+DELETE_PLAYERS = DELETE_ROUNDS + """
+    DELETE FROM players WHERE tournament_id = %(tournament_id)s;"""
+# Deletes a tournament's matches.  The aggregate triggers are turned off while
+# the rows are deleted, since every player's totals go back to 0 anyway, and
+# the totals are reset with one UPDATE instead
+DELETE_MATCHES = DELETE_ROUNDS + """
+    SELECT set_config('tournament.bulk_delete', 'on', true);
+    DELETE FROM records WHERE tournament_id = %(tournament_id)s;
+    DELETE FROM matchRegistry WHERE tournament_id = %(tournament_id)s;
+    SELECT set_config('tournament.bulk_delete', 'off', true);
+    UPDATE playerAggregates
+    SET
+        wins = 0
+    ,   losses = 0
+    ,   ties = 0
+    ,   byes = 0
+    ,   matches = 0
+    ,   opponent_wins = 0
+    ,   opponent_matches = 0
+    WHERE tournament_id = %(tournament_id)s;"""
+# Deletes a tournament and everything in it.  Its partitions of the
+# matchRegistry and records tables are dropped instead of being emptied row by
+# row
+DELETE_TOURNAMENT = DELETE_ROUNDS + """
+    SELECT remove_tournament_partitions(%(tournament_id)s);
+    DELETE FROM players WHERE tournament_id = %(tournament_id)s;
+    DELETE FROM tournaments WHERE tournament_id = %(tournament_id)s;"""
+# Every table resetDatabase empties.  The partitions of matchRegistry and
+# records are emptied along with them, and are used again as the tournament
+# ids start over
+RESET_TABLES = ("roundStandings", "roundPairings", "rounds", "records",
+                "matchRegistry", "playerAggregates", "players", "tournaments",
+                "archivedTournaments")
+
+# The channel the database sends NOTIFYs on when a tournament's players or
+# results change, which watchStandings listens to
+CHANGE_CHANNEL = "tournament_%s"
+
+# The formats exportPlayers and exportMatches write, and the COPY options for
+# each.  The .gz formats are the same files compressed with gzip
+COPY_FORMATS = {"csv": "FORMAT csv, HEADER", "binary": "FORMAT binary",
+                "csv.gz": "FORMAT csv, HEADER", "binary.gz": "FORMAT binary"}
+# The number of rows read at a time from a server-side cursor, or by
+# matchHistory
+BATCH_SIZE = 1000
+# The tiebreakers configureTiebreakers accepts.  Look at its docstring for
+# what each one is
+TIEBREAKERS = ("OMW", "OOW", "buchholz", "sonneborn_berger", "head_to_head")
+# The number of candidate opponents swissPairings may try for each player,
+# plus 100 players' worth so that small tournaments are always searched
+# through, before giving up.  Nearly every pairing is found in one pass down
+# the standings, but when almost every pair of players has already met,
+# showing that no pairing without rematches exists can take exponentially long
+PAIRING_STEPS = 1000
+
+# Player ids may come back from the database as long in Python 2
+try:
+    INTEGER_TYPES = (int, long)
+except NameError:
+    INTEGER_TYPES = (int, )
+
+# time.monotonic doesn't exist in Python 2
+_clock = getattr(time, "monotonic", time.time)
+
+_pool = None
+_pool_lock = threading.Lock()
+# One pool for each replica in DATABASE_SETTINGS["replica_dsns"], created the
+# first time a replica is read from, and the turn of the next one to read from
+_replica_pools = None
+_replica_turns = itertools.count()
+# The WAL position, as an integer, that the primary had reached after the
+# latest write made through this module.  With read_your_writes, a replica is
+# only read from once it has replayed this far.  It covers every thread, not
+# just the one that wrote, so that standings read from a replica that is
+# behind are never cached as the tournament's latest
+_last_write_lsn = 0
+_lsn_lock = threading.Lock()
+# Holds the connection of the transaction() block running in this thread, and
+# the public function being instrumented, if there are any
+_session = threading.local()
+
+# Statistics collected per public function while instrumentation is enabled.
+# None means instrumentation is disabled
+_stats = None
+_stats_lock = threading.Lock()
+_slow_query_seconds = None
+logger = logging.getLogger(__name__)
+
+# Numbers the server-side cursors, which need unique names
+_cursor_numbers = itertools.count(1)
+
+# Every write to a tournament through this module advances its version, so
+# cached standings from an older version are never handed out.  The
+# generation advances when every tournament changes at once
+_versions = {}
+_generation = 0
+_versions_lock = threading.Lock()
+# The tiebreakers applied to players with the same number of match points, in
+# order.  Call configureTiebreakers() to change them
+_tiebreakers = ("OMW", )
+
+
+class PairingSearchError(RuntimeError):
+    """Raised by swissPairings and startRound when the search for pairings
+    without rematches runs out of steps before it either finds one or shows
+    that there is none.  Look at PAIRING_STEPS."""
+
+
+class ConnectionPool(object):
+    """A bounded pool of database connections that is safe to share between
+    threads.  When every connection is checked out, getconn() waits for one to
+    be returned instead of raising an error.
+
+    Args:
+      dsn: the libpq connection string, for example "dbname=tournament"
+      min_connections: the number of connections opened up front
+      max_connections: the most connections the pool will ever have open
+      health_check: pass in True to run a cheap query on every connection
+                    before handing it out.  Broken connections are replaced.
+      timeout: the number of seconds getconn() waits for a free connection
+               before raising psycopg2.pool.PoolError.  None waits forever."""
+    def __init__(self, dsn, min_connections=1, max_connections=10,
+                 health_check=True, timeout=None):
+        if max_connections < 1 or min_connections > max_connections:
+            raise ValueError("max_connections must be at least 1 and no "
+                             "smaller than min_connections")
+        self.dsn = dsn
+        self.health_check = health_check
+        self.timeout = timeout
+        self._available = threading.BoundedSemaphore(max_connections)
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections, max_connections, dsn)
+
+    def getconn(self):
+        """Checks a healthy connection out of the pool."""
+        if not self._acquire():
+            raise psycopg2.pool.PoolError(
+                "no connection became free within %s seconds" % self.timeout)
+        try:
+            connection = self._pool.getconn()
+            if not self._is_healthy(connection):
+                self._pool.putconn(connection, close=True)
+                connection = self._pool.getconn()
+        except:
+            self._available.release()
+            raise
+        return connection
+
+    def putconn(self, connection):
+        """Returns a connection to the pool.  Connections that are broken are
+        closed rather than reused."""
+        try:
+            if not connection.closed:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    pass
+            self._pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            self._available.release()
+
+    def closeall(self):
+        """Closes every connection in the pool."""
+        self._pool.closeall()
+
+    def _acquire(self):
+        if self.timeout is None:
+            return self._available.acquire()
+        # Python 2 semaphores have no timeout, so poll until the deadline
+        deadline = _clock() + self.timeout
+        while not self._available.acquire(False):
+            if _clock() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+
+def configureDatabase(dsn=None, min_connections=None, max_connections=None,
+                      health_check=None, timeout=None, replica_dsns=None,
+                      read_your_writes=None):
+    """Changes the connection settings.  Any open pool is closed, and a new one
+    is created with the new settings the next time the database is used.
+
+    Args:
+      dsn: the libpq connection string, for example
+           "dbname=tournament host=db.example.com"
+      min_connections: the number of connections opened up front
+      max_connections: the most connections that will ever be open at once
+      health_check: pass in False to skip checking connections before use
+      timeout: the number of seconds to wait for a free connection
+      replica_dsns: a list of connection strings of read-only replicas of the
+                    database at dsn.  Functions that only read, such as
+                    countPlayers, playerStandings and swissPairings, query
+                    the replicas in turn, and everything else goes to dsn.
+                    Each replica gets a pool with the same settings.  Pass
+                    in [] to stop using replicas.
+      read_your_writes: pass in False to read from replicas even when they
+                        haven't caught up with the writes already made
+                        through this module.  By default a replica that is
+                        behind is skipped for the primary, so reads always
+                        see the writes made before them"""
+    settings = {"dsn": dsn, "min_connections": min_connections,
+                "max_connections": max_connections,
+                "health_check": health_check, "timeout": timeout,
+                "replica_dsns": replica_dsns,
+                "read_your_writes": read_your_writes}
+    with _pool_lock:
+        for (setting, value) in settings.items():
+            if value is not None:
+                DATABASE_SETTINGS[setting] = value
+        close_Pools_Helper()
+
+
+def closePool():
+    """Closes every pooled connection, to the primary and to the replicas.  The
+    pools are recreated the next time the database is used."""
+    with _pool_lock:
+        close_Pools_Helper()
+
+
+def close_Pools_Helper():
+    """This is a helper function to configureDatabase and closePool that
+    closes every pool.  _pool_lock must be held."""
+    global _pool, _replica_pools
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+    for pool in _replica_pools or []:
+        pool.closeall()
+    _replica_pools = None
+
+
+def get_pool():
+    """Returns the shared connection pool, creating it if needed."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    **pool_Settings_Helper(DATABASE_SETTINGS["dsn"]))
+    return _pool
+
+
+def get_replica_pool():
+    """Returns the pool of the replica whose turn it is to be read from,
+    creating the replicas' pools if needed, or None if there are no
+    replicas."""
+    global _replica_pools
+    pools = _replica_pools
+    if pools is None:
+        with _pool_lock:
+            if _replica_pools is None:
+                _replica_pools = [
+                    ConnectionPool(**pool_Settings_Helper(dsn))
+                    for dsn in DATABASE_SETTINGS["replica_dsns"]]
+            pools = _replica_pools
+    if not pools:
+        return None
+    return pools[next(_replica_turns) % len(pools)]
+
+
+def pool_Settings_Helper(dsn):
+    """Returns the ConnectionPool arguments for a pool of connections to
+    dsn."""
+    settings = dict((setting, DATABASE_SETTINGS[setting]) for setting in
+                    ("min_connections", "max_connections", "health_check",
+                     "timeout"))
+    settings["dsn"] = dsn
+    return settings
+
+
+def enableInstrumentation(slow_query_seconds=None):
+    """Starts counting, for each public function in this module, how many
+    times it is called, the connections it checks out of the pool, the
+    statements it executes, the rows it fetches, and the time it spends in
+    total and waiting on the database.  Calls made by a public function to
+    another public function are counted against the outer one.  While
+    instrumentation is disabled, which is the default, none of this is
+    measured.
+
+    Args:
+      slow_query_seconds: if provided, every statement that takes at least
+                          this many seconds is logged as a warning to the
+                          "tournament" logger"""
+    global _stats, _slow_query_seconds
+    with _stats_lock:
+        if _stats is None:
+            _stats = {}
+        _slow_query_seconds = slow_query_seconds
+
+
+def disableInstrumentation():
+    """Stops collecting statistics and throws away the ones collected."""
+    global _stats, _slow_query_seconds
+    with _stats_lock:
+        _stats = None
+        _slow_query_seconds = None
+
+
+def instrumentationStats(reset=False):
+    """Returns the statistics collected since instrumentation was enabled.
+
+    Args:
+      reset: pass in True to start counting from zero again afterwards
+
+    Returns:
+      A dictionary mapping each public function name to a dictionary of
+      calls, connections, statements, rows, slow_statements, wall_seconds and
+      db_seconds.  Work done outside a public function is listed under
+      "(other)".  If instrumentation is disabled, the dictionary is empty."""
+    with _stats_lock:
+        if _stats is None:
+            return {}
+        snapshot = dict((function_name, dict(function_stats))
+                        for (function_name, function_stats) in _stats.items())
+        if reset:
+            _stats.clear()
+    return snapshot
+
+
+def instrumented(function):
+    """Decorator for the public functions of this module, which records their
+    calls and wall time while instrumentation is enabled."""
+    function_name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _stats is None or getattr(_session, "function", None) is not None:
+            return function(*args, **kwargs)
+        _session.function = function_name
+        start = _clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record_Stats_Helper(calls=1, wall_seconds=_clock() - start)
+            _session.function = None
+    return wrapper
+
+
+def record_Stats_Helper(**counts):
+    """Adds counts to the statistics of the public function running in this
+    thread."""
+    function_name = getattr(_session, "function", None) or "(other)"
+    with _stats_lock:
+        if _stats is None:
+            return
+        function_stats = _stats.setdefault(function_name, {
+            "calls": 0, "connections": 0, "statements": 0, "rows": 0,
+            "slow_statements": 0, "wall_seconds": 0.0, "db_seconds": 0.0})
+        for (name, count) in counts.items():
+            function_stats[name] += count
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """A cursor that records the statements it runs and the rows it fetches.
+    get_cursor() hands these out while instrumentation is enabled."""
+    def execute(self, query, vars=None):
+        start = _clock()
+        try:
+            return super(InstrumentedCursor, self).execute(query, vars)
+        finally:
+            seconds = _clock() - start
+            slow = _slow_query_seconds is not None and \
+                seconds >= _slow_query_seconds
+            record_Stats_Helper(statements=1, db_seconds=seconds,
+                                slow_statements=int(slow))
+            if slow:
+                logger.warning(
+                    "slow query in %s took %.3f seconds: %s",
+                    getattr(_session, "function", None) or "(other)",
+                    seconds, " ".join(str(query).split())[:500])
+
+    def fetchone(self):
+        row = super(InstrumentedCursor, self).fetchone()
+        record_Stats_Helper(rows=int(row is not None))
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super(InstrumentedCursor, self).fetchmany(*args, **kwargs)
+        record_Stats_Helper(rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super(InstrumentedCursor, self).fetchall()
+        record_Stats_Helper(rows=len(rows))
+        return rows
+
+
+def open_Connection_Helper(pool):
+    """Checks a connection out of the pool, counting it if instrumentation is
+    enabled."""
+    connection = pool.getconn()
+    if _stats is not None:
+        record_Stats_Helper(connections=1)
+    return connection
+
+
+def open_Cursor_Helper(connection, name=None):
+    """Opens a cursor, which records its statements if instrumentation is
+    enabled.  Pass in a name to open a server-side cursor, which fetches its
+    rows from the database as they are needed instead of all at once."""
+    if _stats is None:
+        return connection.cursor(name)
+    return connection.cursor(name, cursor_factory=InstrumentedCursor)
 
 
 @contextmanager
-def get_cursor():
-    """Query helper function using context lib. Creates a cursor from a database
-    connection object, and performs queries using that cursor."""
-    DB = psycopg2.connect("dbname=tournament")
-    cursor = DB.cursor()
+def get_cursor(read_only=False):
+    """Query helper function using context lib. Creates a cursor from a pooled
+    database connection, and performs queries using that cursor.  Inside a
+    transaction() block the transaction's connection is used, and committing is
+    left to the transaction.  Pass in read_only=True if the queries only read,
+    so that they can be sent to a replica."""
+    connection = getattr(_session, "connection", None)
+    if connection is not None:
+        cursor = open_Cursor_Helper(connection)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+        return
+    if read_only:
+        (pool, connection) = open_Read_Connection_Helper()
+    else:
+        pool = get_pool()
+        connection = open_Connection_Helper(pool)
+    cursor = open_Cursor_Helper(connection)
     try:
         yield cursor
     except:
         raise
     else:
-        DB.commit()
+        connection.commit()
+        if not read_only:
+            record_Write_Helper(connection)
     finally:
         cursor.close()
-        DB.close()
+        pool.putconn(connection)
+
+
+def open_Read_Connection_Helper():
+    """This is a helper function to get_cursor that checks out a connection
+    for queries that only read.  The connection is to the replica whose turn
+    it is, unless there are no replicas, the replica can't be reached, or
+    read_your_writes is on and the replica hasn't caught up yet.  Then it is
+    to the primary.
+
+    Returns:
+      A tuple of (pool, connection)"""
+    try:
+        pool = get_replica_pool()
+        if pool is not None:
+            connection = open_Connection_Helper(pool)
+            if replica_Caught_Up_Helper(connection):
+                return (pool, connection)
+            pool.putconn(connection)
+    except psycopg2.OperationalError as e:
+        logger.warning("reading from the primary, since a replica couldn't "
+                       "be reached: %s", str(e).strip())
+    pool = get_pool()
+    return (pool, open_Connection_Helper(pool))
+
+
+def replica_Caught_Up_Helper(connection):
+    """This is a helper function to open_Read_Connection_Helper that checks
+    whether a replica has replayed the latest write made through this module.
+    It always has if read_your_writes is off."""
+    lsn = _last_write_lsn
+    if not lsn or not DATABASE_SETTINGS["read_your_writes"]:
+        return True
+    cursor = open_Cursor_Helper(connection)
+    try:
+        cursor.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn;",
+                       ("%X/%X" % (lsn >> 32, lsn & 0xFFFFFFFF), ))
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+
+def record_Write_Helper(connection):
+    """This is a helper function to get_cursor and PostgresBackend that
+    remembers how far the primary's WAL had got once a write committed, so
+    that replicas which haven't replayed it yet are skipped.  Nothing is done
+    unless there are replicas and read_your_writes is on."""
+    global _last_write_lsn
+    if not (DATABASE_SETTINGS["replica_dsns"] and
+            DATABASE_SETTINGS["read_your_writes"]):
+        return
+    cursor = open_Cursor_Helper(connection)
+    try:
+        cursor.execute("SELECT pg_current_wal_lsn()::text;")
+        (high, low) = cursor.fetchone()[0].split("/")
+    finally:
+        cursor.close()
+    with _lsn_lock:
+        _last_write_lsn = max(_last_write_lsn,
+                              (int(high, 16) << 32) + int(low, 16))
+
+
+# The pairings of one round of a tournament, in the order of their tables.  A
+# round with no pairings comes back as one row of nulls, and a round that
+# hasn't been started as no rows at all
+ROUND_PAIRINGS_QUERY = """
+    SELECT
+        roundPairings.player_one
+    ,   player_one.player_name
+    ,   roundPairings.player_two
+    ,   player_two.player_name
+    FROM rounds
+    LEFT JOIN roundPairings
+    ON rounds.tournament_id = roundPairings.tournament_id
+        AND rounds.round_number = roundPairings.round_number
+    LEFT JOIN players AS player_one
+    ON roundPairings.player_one = player_one.player_id
+    LEFT JOIN players AS player_two
+    ON roundPairings.player_two = player_two.player_id
+    WHERE rounds.tournament_id = %(tournament_id)s
+        AND rounds.round_number = %(round_number)s
+    ORDER BY roundPairings.table_number;"""
+
+
+def round_Pairings_Helper(rows):
+    """This is a helper function to PostgresBackend that turns the rows of
+    ROUND_PAIRINGS_QUERY into pairings in the form swissPairings returns
+    them, or None if the round hasn't been started."""
+    if not rows:
+        return None
+    return [tuple(row) if row[2] is not None else tuple(row[:2])
+            for row in rows if row[0] is not None]
+
+
+class PostgresBackend(Backend):
+    """Stores tournaments in the PostgreSQL database set up by tournament.sql.
+    This is the backend used unless setBackend() is called."""
+
+    # The playerAggregates table keeps every player's opponent totals up to
+    # date as matches are reported
+    keeps_opponent_totals = True
+
+    @contextmanager
+    def transaction(self):
+        if getattr(_session, "connection", None) is not None:
+            yield
+            return
+        pool = get_pool()
+        connection = open_Connection_Helper(pool)
+        _session.connection = connection
+        try:
+            yield
+        except:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+            record_Write_Helper(connection)
+        finally:
+            _session.connection = None
+            pool.putconn(connection)
+
+    def registerTournament(self, tournament_name):
+        with get_cursor() as cursor:
+            insert = "SELECT register_tournament(%s);"
+            cursor.execute(insert, (tournament_name, ))
+            return cursor.fetchone()[0]
+
+    def registerPlayers(self, player_names, tournament_id):
+        with get_cursor() as cursor:
+            # Check that the tournament exists, and add tournament 1 if it
+            # doesn't, rather than letting the foreign key fail
+            query = """
+                SELECT tournament_id
+                FROM tournaments
+                WHERE tournament_id = %s;"""
+            cursor.execute(query, (tournament_id, ))
+            if cursor.fetchone() is None:
+                if tournament_id != 1:
+                    raise ValueError("tournament %s does not exist" %
+                                     tournament_id)
+                insert = "SELECT register_tournament(%s);"
+                cursor.execute(insert, ("Test Tournament", ))
+            if not player_names:
+                return []
+            values = ",".join(
+                cursor.mogrify("(%s, DEFAULT, %s)",
+                               (tournament_id, player_name, )
+                               ).decode("utf-8")
+                for player_name in player_names)
+            insert = """
+                INSERT INTO players (tournament_id, player_id, player_name)
+                VALUES %s
+                RETURNING player_id;""" % values
+            cursor.execute(insert)
+            # The rows of a multi-row INSERT draw their serial ids in order, so
+            # the sorted ids line up with player_names
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def countPlayers(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            query = """
+                SELECT count(*)
+                FROM players
+                WHERE tournament_id = %s;"""
+            cursor.execute(query, (tournament_id, ))
+            return int(cursor.fetchone()[0])
+
+    def deleteTournament(self, tournament_id):
+        with get_cursor() as cursor:
+            lock_Tournament_Helper(cursor, tournament_id)
+            cursor.execute(DELETE_TOURNAMENT,
+                           {"tournament_id": tournament_id})
+
+    def deleteMatches(self, tournament_id):
+        with get_cursor() as cursor:
+            lock_Tournament_Helper(cursor, tournament_id)
+            cursor.execute(DELETE_MATCHES, {"tournament_id": tournament_id})
+
+    def deletePlayers(self, tournament_id):
+        with get_cursor() as cursor:
+            # Check for matches under the tournament's lock, so that none can
+            # be reported between the check and the delete
+            lock_Tournament_Helper(cursor, tournament_id)
+            query = """
+                SELECT 1
+                FROM matchRegistry
+                WHERE tournament_id = %s
+                LIMIT 1;"""
+            cursor.execute(query, (tournament_id, ))
+            if cursor.fetchone():
+                raise ValueError("players with matches recorded can't be "
+                                 "deleted")
+            cursor.execute(DELETE_PLAYERS, {"tournament_id": tournament_id})
+
+    def findTournament(self, player_id):
+        with get_cursor(read_only=True) as cursor:
+            query = """
+                SELECT tournament_id
+                FROM players
+                WHERE player_id = %s;"""
+            cursor.execute(query, (player_id, ))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def reportMatch(self, tournament_id, match, idempotency_key=None):
+        with get_cursor() as cursor:
+            lock_Tournament_Helper(cursor, tournament_id)
+            if idempotency_key is not None:
+                (replayed, rejected) = replay_Keys_Helper(
+                    [(0, match)], [idempotency_key],
+                    find_Keys_Helper(cursor, tournament_id,
+                                     [idempotency_key]))
+                if rejected:
+                    raise ValueError(rejected[0][1])
+                if replayed:
+                    return replayed[0][1]
+            # Reject the match the same way reportMatches does, rather than
+            # letting the database's constraints fail
+            for (index, error) in check_Matches_Helper(
+                    cursor, tournament_id, [(0, match)]):
+                raise ValueError(error)
+            return insert_Matches_Helper(cursor, tournament_id, [match],
+                                         [idempotency_key])[0]
+
+    def reportMatches(self, tournament_id, matches, abort_on_error=False,
+                      idempotency_keys=None):
+        keys = idempotency_keys or [None] * len(matches)
+        report = [(None, None)] * len(matches)
+        with get_cursor() as cursor:
+            lock_Tournament_Helper(cursor, tournament_id)
+            pending = list(enumerate(matches))
+            if any(key is not None for key in keys):
+                (replayed, rejected) = replay_Keys_Helper(
+                    pending, keys, find_Keys_Helper(cursor, tournament_id,
+                                                    keys))
+                for (index, match_id) in replayed:
+                    report[index] = (match_id, None)
+                for (index, error) in rejected:
+                    report[index] = (None, error)
+                pending = [(index, match) for (index, match) in pending
+                           if report[index] == (None, None)]
+            for (index, error) in check_Matches_Helper(
+                    cursor, tournament_id, pending):
+                report[index] = (None, error)
+            rejected = [(index, error) for (index, (match_id, error))
+                        in enumerate(report) if error]
+            if rejected and abort_on_error:
+                raise ValueError("rejected results: %s" % ", ".join(
+                    "%s (%s)" % (index, error) for (index, error) in rejected))
+            accepted = [(index, match) for (index, match) in pending
+                        if not report[index][1]]
+            if not accepted:
+                return report
+            # Insert the whole round at once.  The tournament's lock keeps
+            # other scorekeepers out, but something writing to the tables
+            # without it, such as psql, could still have got in first.  If the
+            # round no longer fits, fall back to one match at a time so that
+            # only the conflicting results are rejected
+            cursor.execute("SAVEPOINT report_matches;")
+            try:
+                match_ids = insert_Matches_Helper(
+                    cursor, tournament_id,
+                    [match for (index, match) in accepted],
+                    [keys[index] for (index, match) in accepted])
+            except psycopg2.IntegrityError as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT report_matches;")
+                if abort_on_error:
+                    raise ValueError("rejected results: %s" %
+                                     str(e).strip().splitlines()[0])
+                match_ids = []
+                for (index, match) in accepted:
+                    try:
+                        cursor.execute("SAVEPOINT report_match;")
+                        match_ids.extend(insert_Matches_Helper(
+                            cursor, tournament_id, [match], [keys[index]]))
+                    except psycopg2.IntegrityError as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT report_match;")
+                        match_ids.append(None)
+                        report[index] = (
+                            None, str(e).strip().splitlines()[0])
+            cursor.execute("RELEASE SAVEPOINT report_matches;")
+            for ((index, match), match_id) in zip(accepted, match_ids):
+                if match_id is not None:
+                    report[index] = (match_id, None)
+        return report
+
+    def loadStandings(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            return load_Standings_Helper(cursor, tournament_id)
+
+    def loadRecords(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            query = """
+                SELECT
+                    players.player_id
+                ,   players.player_name
+                ,   playerAggregates.wins
+                ,   playerAggregates.matches
+                ,   playerAggregates.ties
+                ,   playerAggregates.byes
+                FROM playerAggregates JOIN players
+                ON playerAggregates.player_id = players.player_id
+                WHERE playerAggregates.tournament_id = %(tournament_id)s
+                ORDER BY players.player_id;
+                """
+            cursor.execute(query, {"tournament_id": tournament_id})
+            records = cursor.fetchall()
+            query = """
+                SELECT opponent_one, opponent_two
+                FROM matchRegistry
+                WHERE tournament_id = %(tournament_id)s
+                    AND opponent_two IS NOT NULL;"""
+            cursor.execute(query, {"tournament_id": tournament_id})
+            return (records, cursor.fetchall())
+
+    def loadResults(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            cursor.execute(MATCH_HISTORY_QUERY, (tournament_id, ))
+            return [(winner, loser, tie)
+                    for (match_id, winner, loser, tie, bye)
+                    in cursor.fetchall() if not bye]
+
+    def saveStandings(self, standings):
+        with get_cursor() as cursor:
+            store_Standings_Helper(cursor, standings)
+
+    def loadOpponents(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            return load_Opponents_Helper(cursor, tournament_id)
+
+    def saveRound(self, tournament_id, round_number, pairings):
+        with get_cursor() as cursor:
+            insert = """
+                INSERT INTO rounds (tournament_id, round_number)
+                VALUES (%s, %s)
+                ON CONFLICT DO NOTHING;"""
+            cursor.execute(insert, (tournament_id, round_number, ))
+            if cursor.rowcount == 0:
+                raise ValueError("round %s has already been started" %
+                                 round_number)
+            if not pairings:
+                return
+            values = ",".join(
+                cursor.mogrify("(%s, %s, %s, %s, %s)", (
+                    tournament_id, round_number, table_number, pairing[0],
+                    pairing[2] if len(pairing) == 4 else None, )
+                ).decode("utf-8")
+                for (table_number, pairing) in enumerate(pairings, 1))
+            insert = """
+                INSERT INTO roundPairings (tournament_id, round_number,
+                table_number, player_one, player_two)
+                VALUES %s;""" % values
+            cursor.execute(insert)
+
+    def loadRound(self, tournament_id, round_number=None):
+        with get_cursor(read_only=True) as cursor:
+            if round_number is None:
+                query = """
+                    SELECT max(round_number)
+                    FROM rounds
+                    WHERE tournament_id = %s;"""
+                cursor.execute(query, (tournament_id, ))
+                round_number = cursor.fetchone()[0]
+                if round_number is None:
+                    return None
+            cursor.execute(ROUND_PAIRINGS_QUERY,
+                           {"tournament_id": tournament_id,
+                            "round_number": round_number})
+            pairings = round_Pairings_Helper(cursor.fetchall())
+            if pairings is None:
+                return None
+            return (round_number, pairings)
+
+    def saveRoundStandings(self, tournament_id, round_number, standings):
+        with get_cursor() as cursor:
+            if not standings:
+                return
+            values = ",".join(
+                cursor.mogrify("(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", (
+                    tournament_id, round_number, place, player_id, wins,
+                    matches, ties, byes, OMW, player_standing, )
+                ).decode("utf-8")
+                for (place, (player_id, player_name, wins, matches, ties,
+                             byes, OMW, player_standing))
+                in enumerate(standings, 1))
+            insert = """
+                INSERT INTO roundStandings (tournament_id, round_number,
+                place, player_id, wins, matches, ties, byes,
+                opponent_match_wins, player_standing)
+                VALUES %s
+                ON CONFLICT DO NOTHING;""" % values
+            cursor.execute(insert)
+
+    def loadRoundStandings(self, tournament_id, round_number):
+        with get_cursor(read_only=True) as cursor:
+            query = """
+                SELECT
+                    roundStandings.player_id
+                ,   players.player_name
+                ,   roundStandings.wins
+                ,   roundStandings.matches
+                ,   roundStandings.ties
+                ,   roundStandings.byes
+                ,   roundStandings.opponent_match_wins
+                ,   roundStandings.player_standing
+                FROM roundStandings JOIN players
+                ON roundStandings.player_id = players.player_id
+                WHERE roundStandings.tournament_id = %s
+                    AND roundStandings.round_number = %s
+                ORDER BY roundStandings.place;"""
+            cursor.execute(query, (tournament_id, round_number, ))
+            return cursor.fetchall()
+
+    def archiveTournament(self, tournament_id, standings):
+        with get_cursor() as cursor:
+            lock_Tournament_Helper(cursor, tournament_id)
+            query = """
+                SELECT tournament_name
+                FROM tournaments
+                WHERE tournament_id = %s;"""
+            cursor.execute(query, (tournament_id, ))
+            tournament = cursor.fetchone()
+            if tournament is None:
+                raise ValueError("tournament %s does not exist" %
+                                 tournament_id)
+            # The standings were calculated before the lock was taken, so
+            # check that no results have come in since
+            query = """
+                SELECT player_id, wins, matches, ties, byes
+                FROM playerAggregates
+                WHERE tournament_id = %s;"""
+            cursor.execute(query, (tournament_id, ))
+            if set(cursor.fetchall()) != set(
+                    row[:1] + row[2:6] for row in standings):
+                raise ValueError("tournament %s changed while it was being "
+                                 "archived" % tournament_id)
+            columns = [list(column) for column in zip(*standings)] or \
+                [[] for column in range(8)]
+            insert = """
+                INSERT INTO archivedTournaments (tournament_id,
+                tournament_name, player_ids, player_names, wins, matches,
+                ties, byes, opponent_match_wins, player_standings, match_ids,
+                winners, losers, match_ties, match_byes)
+                SELECT %s, %s, %s::integer[], %s::varchar[], %s::integer[],
+                    %s::integer[], %s::integer[], %s::integer[],
+                    %s::double precision[], %s::decimal[],
+                    coalesce(array_agg(match_id ORDER BY match_id), '{}'),
+                    coalesce(array_agg(winner ORDER BY match_id), '{}'),
+                    coalesce(array_agg(loser ORDER BY match_id), '{}'),
+                    coalesce(array_agg(tie ORDER BY match_id), '{}'),
+                    coalesce(array_agg(bye ORDER BY match_id), '{}')
+                FROM (""" + MATCH_HISTORY_QUERY + """) AS history;"""
+            cursor.execute(insert, [tournament_id, tournament[0]] + columns +
+                           [tournament_id])
+            cursor.execute(DELETE_TOURNAMENT,
+                           {"tournament_id": tournament_id})
+
+    def loadArchive(self, tournament_id):
+        with get_cursor(read_only=True) as cursor:
+            query = """
+                SELECT tournament_name, player_ids, player_names, wins,
+                    matches, ties, byes, opponent_match_wins, player_standings,
+                    match_ids, winners, losers, match_ties, match_byes
+                FROM archivedTournaments
+                WHERE tournament_id = %s;"""
+            cursor.execute(query, (tournament_id, ))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return (row[0], list(zip(*row[1:9])), list(zip(*row[9:])))
+
+    def resetDatabase(self):
+        with get_cursor() as cursor:
+            cursor.execute("TRUNCATE %s RESTART IDENTITY;" %
+                           ", ".join(RESET_TABLES))
+
+
+_backend = PostgresBackend()
+
+
+def setBackend(backend):
+    """Changes where tournaments are stored.  Every function in this module
+    uses the new backend from then on.
+
+    Args:
+      backend: a backends.Backend, for example backends.MemoryBackend() to
+               keep everything in memory, or PostgresBackend() to go back to
+               the database"""
+    global _backend
+    _backend = backend
+    advance_Version_Helper()
+
+
+def getBackend():
+    """Returns the backend tournaments are currently stored in."""
+    return _backend
+
+
+@contextmanager
+def transaction():
+    """Runs every call made inside the with block on a single connection, and
+    commits them all at once when the block finishes.  If an exception is
+    raised inside the block, nothing is committed.  Nested transaction() blocks
+    join the outermost one.
+
+    Example:
+      with transaction():
+          for name in names:
+              registerPlayer(name, tournament_id)
+          pairings = swissPairings(tournament_id)"""
+    if getattr(_session, "written", None) is not None:
+        with _backend.transaction():
+            yield
+        return
+    # Remember the tournaments written to inside the block, so that standings
+    # calculated by other threads before the block commits are thrown away
+    _session.written = set()
+    try:
+        with _backend.transaction():
+            yield
+    finally:
+        written = _session.written
+        _session.written = None
+        for tournament_id in written:
+            advance_Version_Helper(tournament_id)
+
+
+class StandingsCache(object):
+    """Remembers the standings of the most recently used tournaments.  Each
+    entry is tagged with the version of the tournament it was calculated from,
+    and is only handed out while the tournament is still at that version.
+    When more than max_tournaments tournaments are cached, the least recently
+    used one is dropped.
+
+    Args:
+      max_tournaments: the most tournaments to keep standings for.  0 turns
+                       the cache off"""
+    def __init__(self, max_tournaments=128):
+        self.max_tournaments = max_tournaments
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, tournament_id, version):
+        """Returns the cached entry for a tournament, or None if there isn't
+        one for this version."""
+        with self._lock:
+            cached = self._entries.pop(tournament_id, None)
+            if cached is None or cached[0] != version:
+                self.misses += 1
+                return None
+            # Move the tournament to the most recently used end
+            self._entries[tournament_id] = cached
+            self.hits += 1
+            return cached[1]
+
+    def put(self, tournament_id, version, entry):
+        """Caches an entry for a tournament, evicting the least recently used
+        tournaments if there are too many."""
+        with self._lock:
+            self._entries.pop(tournament_id, None)
+            if self.max_tournaments <= 0:
+                return
+            self._entries[tournament_id] = (version, entry)
+            while len(self._entries) > self.max_tournaments:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, max_tournaments):
+        """Changes how many tournaments are kept, evicting any extra ones."""
+        with self._lock:
+            self.max_tournaments = max_tournaments
+            while self._entries and \
+                    len(self._entries) > max(max_tournaments, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self, reset=False):
+        """Returns the cache's hits, misses, evictions and size."""
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses,
+                     "evictions": self.evictions,
+                     "tournaments": len(self._entries),
+                     "max_tournaments": self.max_tournaments}
+            if reset:
+                self.hits = self.misses = self.evictions = 0
+        return stats
+
+
+_standings_cache = StandingsCache()
+
+
+def configureStandingsCache(max_tournaments):
+    """Changes how many tournaments playerStandings and swissPairings keep
+    standings in memory for.  The least recently used tournaments are dropped
+    first.
+
+    Only writes made through this module are noticed, so if other programs
+    write to the same database, pass in 0 to turn the cache off.
+
+    Args:
+      max_tournaments: the most tournaments to cache.  The default is 128"""
+    _standings_cache.resize(max_tournaments)
+
+
+def configureTiebreakers(tiebreakers):
+    """Changes how players with the same number of match points are ordered
+    by playerStandings, and so who swissPairings pairs together.  The
+    tiebreakers are applied in the order given, and players who are still
+    tied after all of them are ordered by player id, so the same results
+    always give the same standings.  The default is ["OMW"].
+
+    These are the tiebreakers:
+        OMW: the total wins of the players played against divided by their
+            total matches, rounded to 2 decimals, as in playerStandings
+        OOW: the average OMW of the players played against, rounded to 2
+            decimals
+        buchholz: the total match points of the players played against
+        sonneborn_berger: the match points of the players beaten, plus half
+            the match points of the players tied with
+        head_to_head: the match points scored against the other players who
+            are still tied when it is applied
+
+    Every tiebreaker is worked out for the whole field at once from the
+    tournament's results, so no queries are made per player.
+
+    Args:
+      tiebreakers: a list of names from TIEBREAKERS
+
+    Raises:
+      ValueError: if a name isn't a tiebreaker, or is given more than once"""
+    global _tiebreakers
+    tiebreakers = tuple(tiebreakers)
+    for name in tiebreakers:
+        if name not in TIEBREAKERS:
+            raise ValueError("%s is not a tiebreaker" % name)
+    if len(set(tiebreakers)) != len(tiebreakers):
+        raise ValueError("a tiebreaker can only be used once")
+    _tiebreakers = tiebreakers
+    # The cached standings are in the order of the old tiebreakers
+    advance_Version_Helper()
+
+
+def standingsCacheStats(reset=False):
+    """Returns the standings cache statistics.
+
+    Args:
+      reset: pass in True to start counting from zero again afterwards
+
+    Returns:
+      A dictionary of hits, misses, evictions, tournaments (the number of
+      tournaments cached now) and max_tournaments"""
+    return _standings_cache.stats(reset)
+
+
+def tournament_Version_Helper(tournament_id):
+    """Returns the current version of a tournament's standings."""
+    with _versions_lock:
+        return (_generation, _versions.get(tournament_id, 0))
+
+
+def advance_Version_Helper(tournament_id=None):
+    """This is a helper function to the functions that write to a tournament,
+    which marks its cached standings as out of date.  It must be called after
+    the write, so that standings read before the write can't be cached under
+    the new version.
+
+    Args:
+      tournament_id: the tournament written to.  If not provided, every
+                     tournament is marked as out of date"""
+    global _generation
+    with _versions_lock:
+        if tournament_id is None:
+            _generation += 1
+            _versions.clear()
+        else:
+            _versions[tournament_id] = _versions.get(tournament_id, 0) + 1
+    written = getattr(_session, "written", None)
+    if written is not None:
+        written.add(tournament_id)
+
+
+def cached_Standings_Helper(tournament_id, with_opponents=False):
+    """This is a helper function to playerStandings and swissPairings that
+    returns a tournament's standings from the cache, calculating them first
+    if they have changed since they were cached.  Nothing is written, so
+    outside a transaction() block every query goes to a replica if there is
+    one.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      with_opponents: pass in True to load everyone each player has played
+                      against too
+
+    Returns:
+      A dictionary holding "standings", a list of tuples from
+      calculate_Standings_Helper in the order of the tiebreakers, "rows",
+      the same standings in the form playerStandings returns them,
+      "tiebreakers", a tuple of (names, values) from
+      tiebreak_Standings_Helper, and, if with_opponents is True,
+      "opponents", a dictionary from the backend's loadOpponents.  The
+      dictionary is shared with the cache, so it must not be changed"""
+    version = tournament_Version_Helper(tournament_id)
+    entry = _standings_cache.get(tournament_id, version)
+    if entry is not None and (not with_opponents or "opponents" in entry):
+        return entry
+    if entry is None:
+        if numpy is not None and not _backend.keeps_opponent_totals:
+            standings = calculate_Standings_Array_Helper(
+                *_backend.loadRecords(tournament_id))
+        else:
+            standings = calculate_Standings_Helper(
+                _backend.loadStandings(tournament_id))
+        tiebreakers = _tiebreakers
+        results = []
+        if needs_Results_Helper(tiebreakers):
+            results = _backend.loadResults(tournament_id)
+        (standings, values) = tiebreak_Standings_Helper(
+            standings, results, tiebreakers)
+        entry = {"standings": standings,
+                 "rows": [row[:4] for row in standings],
+                 "tiebreakers": (tiebreakers, values)}
+    else:
+        entry = dict(entry)
+    if with_opponents:
+        entry["opponents"] = _backend.loadOpponents(tournament_id)
+    # Standings read inside a transaction() block may never be committed
+    if getattr(_session, "written", None) is None:
+        _standings_cache.put(tournament_id, version, entry)
+    return entry
+
+
+@instrumented
+def deleteTournament(tournament_id):
+    """Removes the specified tournament.  All the tournament's players, matches,
+    and records are also removed
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    _backend.deleteTournament(tournament_id)
+    advance_Version_Helper(tournament_id)
+
+
+@instrumented
+def deleteMatches(tournament_id=1):
+    """Removes all the match records from the database
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    _backend.deleteMatches(tournament_id)
+    advance_Version_Helper(tournament_id)
+
+
+@instrumented
+def deletePlayers(tournament_id=1):
+    """Remove all the player records from the database
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Raises:
+      ValueError: if the tournament still has matches recorded"""
+    _backend.deletePlayers(tournament_id)
+    advance_Version_Helper(tournament_id)
+
+
+@instrumented
+def resetDatabase():
+    """Removes every tournament, player and match, archived tournaments
+    included, and starts the ids from 1 again.  The tables are emptied with
+    TRUNCATE rather than deleted from row by row, which makes this the quick
+    way to reset a test database.  watchStandings isn't told about it."""
+    _backend.resetDatabase()
+    advance_Version_Helper()
+
+
+@instrumented
+def archiveTournament(tournament_id):
+    """Moves a finished tournament out of the tables that active tournaments
+    are played in.  The final standings and every match are stored in one
+    compact archive row, and the tournament's players, matches and rounds are
+    deleted, all in one transaction.  The tournament can still be looked up
+    with archivedStandings and archivedMatches.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Raises:
+      ValueError: if the tournament doesn't exist, if the latest round
+                  started with startRound still has results to report, or if
+                  a result is reported while the tournament is being
+                  archived"""
+    with transaction():
+        entry = cached_Standings_Helper(tournament_id, with_opponents=True)
+        current = _backend.loadRound(tournament_id)
+        if current is not None:
+            finished_Standings_Helper(entry, current)
+        _backend.archiveTournament(tournament_id, entry["standings"])
+    advance_Version_Helper(tournament_id)
+
+
+@instrumented
+def archivedStandings(tournament_id):
+    """Returns the final standings of an archived tournament, in the same form
+    as playerStandings.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Raises:
+      ValueError: if the tournament hasn't been archived"""
+    return [row[:4] for row in load_Archive_Helper(tournament_id)[1]]
+
+
+@instrumented
+def archivedMatches(tournament_id):
+    """Returns every match of an archived tournament, in the same form as
+    matchHistory.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Raises:
+      ValueError: if the tournament hasn't been archived"""
+    return list(load_Archive_Helper(tournament_id)[2])
+
+
+def load_Archive_Helper(tournament_id):
+    """This is a helper function to archivedStandings and archivedMatches that
+    loads an archived tournament from the backend.
+
+    Returns:
+      A tuple from the backend's loadArchive
+
+    Raises:
+      ValueError: if the tournament hasn't been archived"""
+    archive = _backend.loadArchive(tournament_id)
+    if archive is None:
+        raise ValueError("tournament %s hasn't been archived" %
+                         tournament_id)
+    return archive
+
+
+@instrumented
+def countPlayers(tournament_id=1):
+    """Returns the number of players currently registered in a specific tournament.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)"""
+    number_of_players = _backend.countPlayers(tournament_id)
+    return number_of_players
+
+
+@instrumented
+def registerTournament(tournament_name):
+    """Adds a tournament to the tournament database. The database assigns a
+    unique serial id number for the tournament.
+
+    Args:
+      tournament_name: the tournament's name (need not be unique).
+
+    Returns:
+      The new tournament's id"""
+    clean_tournament_name = bleach.clean(tournament_name)
+    return _backend.registerTournament(clean_tournament_name)
+
+
+@instrumented
+def registerPlayer(player_name, tournament_id=1):
+    """Adds a player to the player database. The database assigns a unique
+    serial id number for the player.
+
+    Args:
+      player_name: the player's full name (need not be unique).
+      tournament_id: the tournament's id.  If not provided, player will be
+                     entered into tournament 1"""
+    registerPlayers([player_name], tournament_id)
+
+
+@instrumented
+def registerPlayers(player_names, tournament_id=1):
+    """Adds a whole list of players to the player database in one
+    transaction, with a single multi-row INSERT.  The database assigns each
+    player a unique serial id number.
+
+    Args:
+      player_names: a list of the players' full names (need not be unique).
+      tournament_id: the tournament's id.  If not provided, players will be
+                     entered into tournament 1
+
+    Returns:
+      A list of the new players' ids, in the same order as player_names
+
+    Raises:
+      ValueError: if the tournament doesn't exist"""
+    clean_player_names = [bleach.clean(player_name)
+                          for player_name in player_names]
+    player_ids = _backend.registerPlayers(clean_player_names, tournament_id)
+    advance_Version_Helper(tournament_id)
+    return player_ids
+
+
+@instrumented
+def playerStandings(tournament_id=1):
+    """Player standing is calculated by a score assigned to each player.
+    Players are sorted from highest scoring to lowest scoring.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Here is the scoring system:
+        Win/Bye: +3
+        Tie: +1
+        OMW: + A fraction from 0-1, rounded to 2 decimal.  OMW stands for
+            Opponent Matched Wins.  It is calculated as total number of wins by
+            players played against divided by the total number of matches by
+            players played against
+
+    OMW only separates players with the same match points (wins, byes and
+    ties).  configureTiebreakers changes it to other tiebreakers, or adds
+    more, and players who are still tied are ordered by player id.
+
+    Returns:
+      A list of tuples, each of which contains (player_id, player_name, wins,
+      matches):
+        player_id: the player's unique id (assigned by the database)
+        player_name: the player's full name (as registered)
+        wins: the number of matches the player has won.  Byes are not included
+              here
+        matches: the number of matches the player has played. Byes are not
+                 included here
+
+    The standings are cached until the tournament next changes, so calling
+    this again between rounds doesn't touch the database.  Look at the
+    docstring of configureStandingsCache for details."""
+    return list(cached_Standings_Helper(tournament_id)["rows"])
+
+
+@instrumented
+def playerTiebreakers(tournament_id=1):
+    """Returns the standings with the numbers that ordered them.  Look at the
+    docstring of configureTiebreakers for the tiebreakers.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Returns:
+      A list of tuples in the same order as playerStandings, each of which
+      contains (player_id, player_name, match_points, tiebreakers):
+        match_points: 3 for each win or bye and 1 for each tie
+        tiebreakers: a dictionary mapping the name of each configured
+                     tiebreaker to the player's value"""
+    entry = cached_Standings_Helper(tournament_id)
+    (names, values) = entry["tiebreakers"]
+    return [(player_id, player_name, (wins + bye)*3 + ties,
+             dict(zip(names, values[player_id])))
+            for (player_id, player_name, wins, matches, ties, bye, OMW,
+                 player_standing) in entry["standings"]]
+
+
+def watchStandings(tournament_ids, deltas=False, timeout=None):
+    """Follows the standings of live tournaments without polling.  A
+    connection of its own listens for the notifications the database sends
+    whenever a tournament's players or results change, and standings are only
+    read again for the tournaments that changed.  Changes that arrive
+    together, such as every notification from a round reported in one
+    transaction, are delivered as one update.  Stop watching by closing the
+    generator or breaking out of the loop over it.
+
+    Example:
+      for update in watchStandings([tournament_id], deltas=True):
+          if update is not None:
+              (tournament_id, version, rows) = update
+              redraw(rows)
+
+    Args:
+      tournament_ids: a list of the tournaments to watch
+      deltas: pass in True to get only the rows of the standings that changed
+              since the last update, instead of all of them
+      timeout: the number of seconds to wait for a change.  If nothing
+               changes in time, None is yielded, so that the caller can do
+               something else or stop.  If not provided, waits forever
+
+    Returns:
+      A generator of tuples of (tournament_id, version, standings), starting
+      with the current standings of every tournament:
+        version: the tournament's version, which goes up with every change
+        standings: a list in the same form playerStandings returns.  With
+                   deltas, a list of tuples of (place, player_id,
+                   player_name, wins, matches) for the players whose place or
+                   record changed, with places counted from 1.  Players who
+                   have been removed from the tournament come back as
+                   (None, player_id, None, None, None)"""
+    connection = psycopg2.connect(DATABASE_SETTINGS["dsn"])
+    try:
+        connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = connection.cursor()
+        # Listen before reading the versions, so that no change can slip in
+        # between
+        for tournament_id in tournament_ids:
+            cursor.execute("LISTEN %s;" % CHANGE_CHANNEL % int(tournament_id))
+        query = """
+            SELECT tournament_id, version
+            FROM tournaments
+            WHERE tournament_id IN %s;"""
+        cursor.execute(query, (tuple(tournament_ids), ))
+        changes = dict(cursor.fetchall())
+        versions = {}
+        previous = {}
+        while True:
+            for tournament_id in sorted(changes):
+                if changes[tournament_id] <= versions.get(tournament_id, -1):
+                    continue
+                versions[tournament_id] = changes[tournament_id]
+                # The change may have been made by another program, which
+                # this process's standings cache knows nothing about
+                advance_Version_Helper(tournament_id)
+                standings = playerStandings(tournament_id)
+                if deltas:
+                    rows = standings_Delta_Helper(
+                        previous.get(tournament_id, []), standings)
+                else:
+                    rows = standings
+                previous[tournament_id] = standings
+                yield (tournament_id, versions[tournament_id], rows)
+            changes = wait_Changes_Helper(connection, timeout)
+            if changes is None:
+                yield None
+                changes = {}
+    finally:
+        connection.close()
+
+
+def wait_Changes_Helper(connection, timeout):
+    """This is a helper function to watchStandings that waits for
+    notifications on a listening connection.
+
+    Returns:
+      A dictionary mapping each tournament id that changed to the highest
+      version notified, or None if timeout seconds passed without any"""
+    if not connection.notifies and not select.select(
+            [connection], [], [], timeout)[0]:
+        return None
+    connection.poll()
+    changes = {}
+    while connection.notifies:
+        payload = json.loads(connection.notifies.pop(0).payload)
+        tournament_id = payload["tournament_id"]
+        changes[tournament_id] = max(changes.get(tournament_id, -1),
+                                     payload["version"])
+    return changes
+
+
+def standings_Delta_Helper(previous, standings):
+    """This is a helper function to watchStandings that finds the rows of
+    the standings that changed.  Look at the docstring of watchStandings for
+    the return value."""
+    before = dict((row[0], (place, tuple(row))) for (place, row)
+                  in enumerate(previous, 1))
+    delta = []
+    for (place, row) in enumerate(standings, 1):
+        if before.pop(row[0], None) != (place, tuple(row)):
+            delta.append((place, ) + tuple(row))
+    for player_id in sorted(before):
+        delta.append((None, player_id, None, None, None))
+    return delta
+
+
+def calculate_Standings_Helper(standings_inputs):
+    """This is a helper function to playerStandings that calculates every
+    player's score in a tournament.
+
+    Args:
+      standings_inputs: a list of tuples from a backend's loadStandings, each
+                        of which contains (player_id, player_name, wins,
+                        matches, ties, byes, opponent_wins, opponent_matches)
+
+    Returns:
+      A list of tuples sorted by match points and then OMW, highest first,
+      each of which contains (player_id, player_name, wins, matches, ties,
+      bye, OMW, player_standing)"""
+    standings = []
+    for (player_id, player_name, wins, matches, ties, bye, opponent_wins,
+         opponent_matches) in standings_inputs:
+        OMW = calculate_OMW_Helper(opponent_wins, opponent_matches)
+        player_standing = (wins + bye)*3 + ties + OMW
+        standings.append((player_id, player_name, int(wins), int(matches),
+                          int(ties), int(bye), OMW, player_standing))
+    # Sorting on player_standing alone would let OMW make up a whole match
+    # point, since it can be 1
+    standings.sort(key=lambda row: ((row[2] + row[5])*3 + row[4], row[6]),
+                   reverse=True)
+    return standings
+
+
+def needs_Results_Helper(tiebreakers=None):
+    """This is a helper function to cached_Standings_Helper that says whether
+    the tiebreakers need the result of every match, from a backend's
+    loadResults, or can be worked out from the standings alone.
+
+    Args:
+      tiebreakers: names from TIEBREAKERS.  If not provided, the configured
+                   tiebreakers are used"""
+    if tiebreakers is None:
+        tiebreakers = _tiebreakers
+    return any(name != "OMW" for name in tiebreakers)
+
+
+def tiebreak_Standings_Helper(standings, results, tiebreakers=None):
+    """This is a helper function to playerStandings and swissPairings that
+    orders the standings by match points and then by each tiebreaker.  One
+    pass over the results collects everyone's opponents, Buchholz and
+    Sonneborn-Berger at once, OOW is added up from the opponents found, and
+    head_to_head takes a second pass once the groups it breaks are known.
+    Players still tied after every tiebreaker are ordered by player id.
+
+    Args:
+      standings: a list of tuples from calculate_Standings_Helper
+      results: a list of (winner, loser, tie) tuples from a backend's
+               loadResults.  It can be empty if needs_Results_Helper says the
+               tiebreakers don't need it
+      tiebreakers: names from TIEBREAKERS.  If not provided, the configured
+                   tiebreakers are used
+
+    Returns:
+      A tuple of (standings, values):
+        standings: the same tuples, sorted from first place to last
+        values: a dictionary mapping each player id to a tuple of the
+                player's value for each tiebreaker, in the same order as
+                tiebreakers"""
+    if tiebreakers is None:
+        tiebreakers = _tiebreakers
+    points = dict((row[0], (row[2] + row[5])*3 + row[4]) for row in standings)
+    columns = {"OMW": dict((row[0], row[6]) for row in standings),
+               "buchholz": dict.fromkeys(points, 0),
+               "sonneborn_berger": dict.fromkeys(points, 0)}
+    opponents = dict((player_id, []) for player_id in points)
+    buchholz = columns["buchholz"]
+    sonneborn_berger = columns["sonneborn_berger"]
+    for (winner, loser, tie) in results:
+        opponents[winner].append(loser)
+        opponents[loser].append(winner)
+        buchholz[winner] += points[loser]
+        buchholz[loser] += points[winner]
+        if tie:
+            sonneborn_berger[winner] += points[loser] / 2.0
+            sonneborn_berger[loser] += points[winner] / 2.0
+        else:
+            sonneborn_berger[winner] += points[loser]
+    if "OOW" in tiebreakers:
+        OMWs = columns["OMW"]
+        columns["OOW"] = dict(
+            (player_id, round(float(sum(OMWs[opponent_id]
+                                        for opponent_id in played)) /
+                              len(played), 2) if played else 0)
+            for (player_id, played) in opponents.items())
+    values = dict((player_id, [columns[name][player_id]
+                               if name != "head_to_head" else 0
+                               for name in tiebreakers])
+                  for player_id in points)
+    if "head_to_head" in tiebreakers:
+        # Only matches between players who are tied on everything before
+        # head_to_head count
+        place = tiebreakers.index("head_to_head")
+        groups = dict((player_id, (points[player_id],
+                                   tuple(values[player_id][:place])))
+                      for player_id in points)
+        for (winner, loser, tie) in results:
+            if groups[winner] == groups[loser]:
+                values[winner][place] += 1 if tie else 3
+                values[loser][place] += 1 if tie else 0
+    values = dict((player_id, tuple(player_values))
+                  for (player_id, player_values) in values.items())
+    standings = sorted(standings, key=lambda row: (
+        (-points[row[0]], ) + tuple(-value for value in values[row[0]]) +
+        (row[0], )))
+    return (standings, values)
+
+
+def calculate_Standings_Array_Helper(records, pairings):
+    """This is a helper function to playerStandings that calculates every
+    player's score with NumPy array operations instead of a loop per player
+    and opponent.  The opponent graph is held as a sparse adjacency matrix in
+    coordinate form, one row per match, so adding up the records of everyone
+    each player has played against takes a couple of numpy.bincount calls.
+    The results are exactly the same as calculate_Standings_Helper's,
+    including the rounding of OMW.
+
+    Args:
+      records: a list of tuples sorted by player id, from a backend's
+               loadRecords, each of which contains (player_id, player_name,
+               wins, matches, ties, byes)
+      pairings: a list of (opponent_one, opponent_two) tuples, one for each
+                match between two players in the tournament
+
+    Returns:
+      A list of tuples sorted from highest scoring to lowest scoring, each of
+      which contains (player_id, player_name, wins, matches, ties, bye, OMW,
+      player_standing)"""
+    if not records:
+        return []
+    (player_ids, player_names, wins, matches, ties, byes) = [
+        list(column) for column in zip(*records)]
+    number_of_players = len(player_ids)
+    win_counts = numpy.array(wins, dtype=numpy.float64)
+    match_counts = numpy.array(matches, dtype=numpy.float64)
+    opponent_wins = numpy.zeros(number_of_players)
+    opponent_matches = numpy.zeros(number_of_players)
+    if pairings:
+        # Turn the player ids at each end of every match into places in the
+        # records, which are sorted by player id
+        ends = numpy.searchsorted(
+            numpy.array(player_ids, dtype=numpy.int64),
+            numpy.fromiter(itertools.chain.from_iterable(pairings),
+                           dtype=numpy.int64, count=2 * len(pairings)
+                           ).reshape(-1, 2))
+        for (this_end, other_end) in ((ends[:, 0], ends[:, 1]),
+                                      (ends[:, 1], ends[:, 0])):
+            opponent_wins += numpy.bincount(
+                this_end, weights=win_counts[other_end],
+                minlength=number_of_players)
+            opponent_matches += numpy.bincount(
+                this_end, weights=match_counts[other_end],
+                minlength=number_of_players)
+    played = opponent_matches > 0
+    ratios = numpy.zeros(number_of_players)
+    numpy.divide(opponent_wins, opponent_matches, out=ratios, where=played)
+    OMWs = numpy.round(ratios, 2)
+    # numpy.round rounds ratio * 100, which can fall on the other side of a
+    # half than round() does, so work out values close to a half like
+    # calculate_OMW_Helper
+    scaled = ratios * 100
+    for place in numpy.flatnonzero(
+            numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6).tolist():
+        OMWs[place] = round(float(ratios[place]), 2)
+    points = (numpy.array(wins, dtype=numpy.int64) +
+              numpy.array(byes, dtype=numpy.int64)) * 3 + \
+        numpy.array(ties, dtype=numpy.int64)
+    player_standings = points + OMWs
+    # lexsort is stable, so players with the same points and OMW stay in
+    # player id order, like calculate_Standings_Helper
+    order = numpy.lexsort((-OMWs, -points)).tolist()
+    OMWs = OMWs.tolist()
+    player_standings = player_standings.tolist()
+    # calculate_OMW_Helper returns the integer 0 for players without
+    # opponents, which leaves their score an integer too
+    points = points.tolist()
+    for place in numpy.flatnonzero(~played).tolist():
+        OMWs[place] = 0
+        player_standings[place] = points[place]
+    columns = [player_ids, player_names, wins, matches, ties, byes, OMWs,
+               player_standings]
+    return list(zip(*[list(map(column.__getitem__, order))
+                      for column in columns]))
 
 
-def deleteTournament(tournament_id):
-    """Removes the specified tournament.  All the tournament's players, matches,
-    and records are also removed
+# Every player's record in a tournament, and the records of everyone they have
+# played against, which the playerAggregates table already holds
+STANDINGS_QUERY = """
+    SELECT
+        players.player_id
+    ,   players.player_name
+    ,   playerAggregates.wins
+    ,   playerAggregates.matches
+    ,   playerAggregates.ties
+    ,   playerAggregates.byes
+    ,   playerAggregates.opponent_wins
+    ,   playerAggregates.opponent_matches
+    FROM playerAggregates JOIN players
+    ON playerAggregates.player_id = players.player_id
+    WHERE playerAggregates.tournament_id = %(tournament_id)s
+    ORDER BY players.player_id;"""
+
+
+def load_Standings_Helper(cursor, tournament_id):
+    """This is a helper function to PostgresBackend that loads every player's
+    record, and the records of everyone they have played against, with a
+    single query.
 
     Args:
-      tournament_id: the tournament's unique id (assigned by the database)"""
-    with get_cursor() as cursor:
-        delete = """
-            DELETE FROM records WHERE tournament_id = %s;
-            DELETE FROM matchRegistry WHERE tournament_id = %s;
-            DELETE FROM players WHERE tournament_id = %s;
-            DELETE FROM tournaments WHERE tournament_id = %s;"""
-        cursor.execute(
-            delete,
-            (tournament_id, tournament_id, tournament_id, tournament_id, ))
+      cursor: the cursor to run the query with
+      tournament_id: the tournament's unique id (assigned by the database)
 
+    Returns:
+      A list of tuples sorted by player id, each of which contains (player_id,
+      player_name, wins, matches, ties, byes, opponent_wins,
+      opponent_matches)"""
+    cursor.execute(STANDINGS_QUERY, {"tournament_id": tournament_id})
+    return cursor.fetchall()
 
-def deleteMatches(tournament_id=1):
-    """Removes all the match records from the database
+
+def calculate_OMW_Helper(opponent_wins, opponent_matches):
+    """This is a helper function to player_Standings that calculates the OMW
+    (Opponent Match Wins).
 
     Args:
-      tournament_id: the tournament's unique id (assigned by the database)"""
-    with get_cursor() as cursor:
-        delete = """
-            DELETE FROM records WHERE tournament_id = %s;
-            DELETE FROM matchRegistry WHERE tournament_id = %s;"""
-        cursor.execute(delete, (tournament_id, tournament_id, ))
+      opponent_wins: the total number of wins by players played against
+      opponent_matches: the total number of matches by players played
+                        against"""
+    # If a player hasn't had any opponents, just return 0
+    if not opponent_matches:
+        return 0
+    OMW = round((float(opponent_wins)/int(opponent_matches)), 2)
+    return OMW
 
 
-def deletePlayers(tournament_id=1):
-    """Remove all the player records from the database
+def store_Standings_Helper(cursor, standings):
+    """This is a helper function to PostgresBackend that saves every player's
+    score to the players table with one UPDATE.
 
     Args:
-      tournament_id: the tournament's unique id (assigned by the database)"""
-    with get_cursor() as cursor:
-        delete = """
-            DELETE FROM players WHERE tournament_id = %s;"""
-        cursor.execute(delete, (tournament_id, ))
+      cursor: the cursor to run the update with
+      standings: a list of tuples from calculate_Standings_Helper"""
+    if not standings:
+        return
+    values = ",".join(
+        cursor.mogrify("(%s, %s::decimal)", (row[0], row[7])).decode("utf-8")
+        for row in standings)
+    update = """
+        UPDATE players
+        SET player_standing = standings.player_standing
+        FROM (VALUES %s) AS standings (player_id, player_standing)
+        WHERE players.player_id = standings.player_id;""" % values
+    cursor.execute(update)
 
 
-def countPlayers(tournament_id=1):
-    """Returns the number of players currently registered in a specific tournament.
+@instrumented
+def checkAggregates(tournament_id=None):
+    """Compares the running totals in the playerAggregates table against totals
+    counted from scratch from the records and matchRegistry tables.
 
     Args:
-      tournament_id: the tournament's unique id (assigned by the database)"""
-    with get_cursor() as cursor:
+      tournament_id: the tournament's unique id (assigned by the database).
+                     If not provided, every tournament is checked.
+
+    Returns:
+      A list of the ids of players whose running totals are wrong"""
+    with get_cursor(read_only=True) as cursor:
         query = """
-            SELECT count(*)
-            FROM players
-            WHERE tournament_id = %s;"""
-        cursor.execute(query, (tournament_id, ))
-        number_of_players = int(cursor.fetchone()[0])
-        return number_of_players
+            SELECT computedAggregates.player_id
+            FROM computedAggregates LEFT JOIN playerAggregates
+            ON computedAggregates.player_id = playerAggregates.player_id
+            WHERE (%(tournament_id)s IS NULL
+                   OR computedAggregates.tournament_id = %(tournament_id)s)
+                AND (computedAggregates.wins, computedAggregates.losses,
+                     computedAggregates.ties, computedAggregates.byes,
+                     computedAggregates.matches,
+                     computedAggregates.opponent_wins,
+                     computedAggregates.opponent_matches)
+                IS DISTINCT FROM
+                    (playerAggregates.wins, playerAggregates.losses,
+                     playerAggregates.ties, playerAggregates.byes,
+                     playerAggregates.matches, playerAggregates.opponent_wins,
+                     playerAggregates.opponent_matches)
+            ORDER BY computedAggregates.player_id;"""
+        cursor.execute(query, {"tournament_id": tournament_id})
+        return [row[0] for row in cursor.fetchall()]
 
 
-def registerTournament(tournament_name):
-    """Adds a tournament to the tournament database. The database assigns a
-    unique serial id number for the tournament.
+@instrumented
+def rebuildAggregates(tournament_id=None):
+    """Recounts the running totals in the playerAggregates table from the
+    records and matchRegistry tables, fixing any that are wrong.
 
     Args:
-      tournament_name: the tournament's name (need not be unique)."""
-    clean_tournament_name = bleach.clean(tournament_name)
+      tournament_id: the tournament's unique id (assigned by the database).
+                     If not provided, every tournament is rebuilt.
+
+    Returns:
+      The number of players whose running totals were fixed"""
     with get_cursor() as cursor:
+        # Players missing from playerAggregates are added with empty totals,
+        # which the UPDATE then fills in, and each counts as fixed once
         insert = """
-            INSERT INTO tournaments
-            VALUES (DEFAULT, %s);"""
-        cursor.execute(insert, (clean_tournament_name, ))
+            INSERT INTO playerAggregates (tournament_id, player_id)
+            SELECT players.tournament_id, players.player_id
+            FROM players LEFT JOIN playerAggregates
+            ON players.player_id = playerAggregates.player_id
+            WHERE playerAggregates.player_id IS NULL
+                AND (%(tournament_id)s IS NULL
+                     OR players.tournament_id = %(tournament_id)s)
+            RETURNING player_id;"""
+        cursor.execute(insert, {"tournament_id": tournament_id})
+        fixed = set(row[0] for row in cursor.fetchall())
+        update = """
+            UPDATE playerAggregates
+            SET
+                tournament_id = computed.tournament_id
+            ,   wins = computed.wins
+            ,   losses = computed.losses
+            ,   ties = computed.ties
+            ,   byes = computed.byes
+            ,   matches = computed.matches
+            ,   opponent_wins = computed.opponent_wins
+            ,   opponent_matches = computed.opponent_matches
+            FROM computedAggregates AS computed
+            WHERE playerAggregates.player_id = computed.player_id
+                AND (%(tournament_id)s IS NULL
+                     OR computed.tournament_id = %(tournament_id)s)
+                AND (computed.tournament_id, computed.wins, computed.losses,
+                     computed.ties, computed.byes, computed.matches,
+                     computed.opponent_wins, computed.opponent_matches)
+                IS DISTINCT FROM
+                    (playerAggregates.tournament_id, playerAggregates.wins,
+                     playerAggregates.losses, playerAggregates.ties,
+                     playerAggregates.byes, playerAggregates.matches,
+                     playerAggregates.opponent_wins,
+                     playerAggregates.opponent_matches)
+            RETURNING playerAggregates.player_id;"""
+        cursor.execute(update, {"tournament_id": tournament_id})
+        fixed.update(row[0] for row in cursor.fetchall())
+    advance_Version_Helper(tournament_id)
+    return len(fixed)
 
 
-def registerPlayer(player_name, tournament_id=1):
-    """Adds a player to the player database. The database assigns a unique
-    serial id number for the player.
+@instrumented
+def migrateDatabase():
+    """Applies the migrations in the migrations directory that the database
+    hasn't had yet, in order, so that a database created by an older
+    tournament.sql can be brought up to date without losing its tournaments.
+    Each migration runs in its own transaction, and records itself in the
+    schemaMigrations table.  Running this while another program is migrating
+    the same database waits for it to finish.
 
-    Args:
-      player_name: the player's full name (need not be unique).
-      tournament_id: the tournament's id.  If not provided, player will be
-                     entered into tournament 1"""
-    # Quick check to see if tournament 1 exists
-    if tournament_id == 1:
+    Returns:
+      A list of the file names of the migrations that were applied"""
+    migrations = sorted(
+        (int(file_name.split("_", 1)[0]), file_name)
+        for file_name in os.listdir(MIGRATIONS_DIRECTORY)
+        if file_name.endswith(".sql"))
+    applied = []
+    for (version, file_name) in migrations:
         with get_cursor() as cursor:
-            query = """
-                SELECT tournament_id
-                FROM tournaments
-                WHERE tournament_id = 1;"""
-            cursor.execute(query)
-            if cursor.fetchone() is None:
-                registerTournament("Test Tournament")
+            # Only one program migrates at a time.  The lock is released when
+            # the transaction ends
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, 0);",
+                           (MIGRATION_LOCK, ))
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schemaMigrations (
+                    version integer PRIMARY KEY
+                ,   migration_name varchar(254)
+                ,   applied_at timestamp NOT NULL DEFAULT now()
+                );""")
+            cursor.execute(
+                "SELECT 1 FROM schemaMigrations WHERE version = %s;",
+                (version, ))
+            if cursor.fetchone():
+                continue
+            if version == 0:
+                # Databases created while the running totals were still part
+                # of tournament.sql already have them
+                cursor.execute("SELECT to_regclass('playeraggregates');")
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute("""
+                        INSERT INTO schemaMigrations (version, migration_name)
+                        VALUES (0, 'player_aggregates');""")
+                    continue
+            with open(os.path.join(MIGRATIONS_DIRECTORY, file_name)) as sql:
+                cursor.execute(sql.read())
+            applied.append(file_name)
+    if applied:
+        advance_Version_Helper()
+    return applied
 
-    clean_player_name = bleach.clean(player_name)
-    with get_cursor() as cursor:
-        insert = """
-            INSERT INTO players (tournament_id, player_id, player_name)
-            VALUES (%s, DEFAULT, %s);"""
-        cursor.execute(insert, (tournament_id, clean_player_name, ))
 
+# Every match of a tournament in the form reportMatch takes it, in the order
+# the matches were reported
+MATCH_HISTORY_QUERY = """
+    SELECT
+        matchRegistry.match_id
+    ,   coalesce(max(records.player_id) FILTER (WHERE records.win),
+                 matchRegistry.opponent_one) AS winner
+    ,   coalesce(max(records.player_id) FILTER (WHERE records.loss),
+                 matchRegistry.opponent_two) AS loser
+    ,   coalesce(bool_or(records.tie), false) AS tie
+    ,   coalesce(bool_or(records.bye), false) AS bye
+    FROM matchRegistry LEFT JOIN records
+    ON matchRegistry.tournament_id = records.tournament_id
+        AND matchRegistry.match_id = records.match_id
+    WHERE matchRegistry.tournament_id = %s
+    GROUP BY matchRegistry.match_id, matchRegistry.opponent_one,
+        matchRegistry.opponent_two
+    ORDER BY matchRegistry.match_id"""
+# The same as MATCH_HISTORY_QUERY, for up to %(batch_size)s matches reported
+# after the match %(after)s.  Only the matches in the batch are read
+MATCH_HISTORY_BATCH_QUERY = """
+    SELECT
+        matches.match_id
+    ,   coalesce(max(records.player_id) FILTER (WHERE records.win),
+                 matches.opponent_one) AS winner
+    ,   coalesce(max(records.player_id) FILTER (WHERE records.loss),
+                 matches.opponent_two) AS loser
+    ,   coalesce(bool_or(records.tie), false) AS tie
+    ,   coalesce(bool_or(records.bye), false) AS bye
+    FROM (
+        SELECT tournament_id, match_id, opponent_one, opponent_two
+        FROM matchRegistry
+        WHERE tournament_id = %(tournament_id)s AND match_id > %(after)s
+        ORDER BY match_id
+        LIMIT %(batch_size)s
+    ) AS matches LEFT JOIN records
+    ON matches.tournament_id = records.tournament_id
+        AND matches.match_id = records.match_id
+    GROUP BY matches.match_id, matches.opponent_one, matches.opponent_two
+    ORDER BY matches.match_id"""
 
-def playerStandings(tournament_id=1):
-    """Player standing is calculated by a score assigned to each player.
-    Players are sorted from highest scoring to lowest scoring.
+
+def matchHistory(tournament_id):
+    """Returns every match of a tournament, in the order they were reported.
+    The matches are read from the database BATCH_SIZE at a time, each batch
+    starting after the last match of the one before, so a tournament of any
+    size can be walked through without holding all of it in memory.  No
+    connection is held between batches, so a generator that is left
+    unfinished doesn't keep one from the pool.  Each batch sees the matches
+    reported before it was read, so matches reported while the generator is
+    running are included at the end.
 
     Args:
       tournament_id: the tournament's unique id (assigned by the database)
 
-    Here is the scoring system:
-        Win/Bye: +3
-        Tie: +1
-        OMW: + A fraction from 0-1, rounded to 2 decimal.  OMW stands for
-            Opponent Matched Wins.  It is calculated as total number of wins by
-            players played against divided by the total number of matches by
-            players played against
+    Returns:
+      A generator of tuples in the same order as the reportMatch parameters,
+      (match_id, winner, loser, tie, bye).  tie and bye are True or False,
+      and loser is None for a bye"""
+    after = 0
+    while True:
+        with get_cursor(read_only=True) as cursor:
+            cursor.execute(MATCH_HISTORY_BATCH_QUERY,
+                           {"tournament_id": tournament_id, "after": after,
+                            "batch_size": BATCH_SIZE})
+            batch = cursor.fetchall()
+        for match in batch:
+            yield match
+        if len(batch) < BATCH_SIZE:
+            return
+        after = batch[-1][0]
+
+
+@instrumented
+def exportPlayers(tournament_id, output, format="csv"):
+    """Writes a tournament's players to a file with PostgreSQL's COPY, which
+    streams the rows straight from the database into the file.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      output: a file opened for writing in binary mode
+      format: "csv" for comma separated values with a header line of
+              player_id, player_name and player_standing, "binary" for
+              PostgreSQL's binary COPY format, which is quicker for the
+              database to read back in, or "csv.gz" or "binary.gz" for
+              either one compressed with gzip.  player_standing is the
+              player's current score"""
+    # The player_standing column is only saved by startRound, so the scores
+    # are worked out from the running totals, the same way as
+    # calculate_Standings_Helper works them out.  OMW is rounded as a double,
+    # which like Python rounds halves to even
+    query = """
+        SELECT
+            players.player_id
+        ,   players.player_name
+        ,   (playerAggregates.wins + playerAggregates.byes)*3
+            + playerAggregates.ties
+            + coalesce(round(playerAggregates.opponent_wins::double precision
+                             / nullif(playerAggregates.opponent_matches, 0)
+                             * 100) / 100, 0)::decimal AS player_standing
+        FROM players JOIN playerAggregates
+        ON players.player_id = playerAggregates.player_id
+        WHERE players.tournament_id = %s
+        ORDER BY players.player_id"""
+    copy_Out_Helper(query, (tournament_id, ), output, format)
+
+
+@instrumented
+def exportMatches(tournament_id, output, format="csv"):
+    """Writes every match of a tournament to a file with PostgreSQL's COPY,
+    one line per match in the order they were reported.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      output: a file opened for writing in binary mode
+      format: "csv" for comma separated values with a header line of
+              match_id, winner, loser, tie and bye, in the same order as the
+              reportMatch parameters, "binary" for PostgreSQL's binary COPY
+              format, or "csv.gz" or "binary.gz" for either one compressed
+              with gzip.  A match takes about 16 bytes as CSV and 36 in the
+              binary format, and about 6 compressed"""
+    copy_Out_Helper(MATCH_HISTORY_QUERY, (tournament_id, ), output, format)
+
+
+@instrumented
+def importTournament(players_input, matches_input, tournament_name,
+                     format="csv"):
+    """Loads a tournament written by exportPlayers and exportMatches into a
+    new tournament, in one transaction.  The files are streamed into
+    temporary tables with PostgreSQL's COPY, and read back in batches, so
+    memory use doesn't grow with the size of the tournament.  The players are
+    registered with registerPlayers and given new ids, and the matches are
+    reported with reportMatches, so they are checked the same way as matches
+    reported by hand.
+
+    Args:
+      players_input: a file written by exportPlayers, opened for reading in
+                     binary mode
+      matches_input: a file written by exportMatches, opened for reading in
+                     binary mode
+      tournament_name: the new tournament's name
+      format: the format the files were exported in, "csv", "binary",
+              "csv.gz" or "binary.gz"
 
     Returns:
-      A list of tuples, each of which contains (player_id, player_name, wins,
-      matches):
-        player_id: the player's unique id (assigned by the database)
-        player_name: the player's full name (as registered)
-        wins: the number of matches the player has won.  Byes are not included
-              here
-        matches: the number of matches the player has played. Byes are not
-                 included here"""
-    with get_cursor() as cursor:
-        # Get the total record, filtered by the tournament in question
-        query = """
-            SELECT player_id, total_wins, total_matches, total_ties, bye
-            FROM playerStandings
-            WHERE tournament_id = %s;"""
-        cursor.execute(query, (tournament_id, ))
-        total_record = cursor.fetchall()
-    # Loop through each player record tuple in total record, calculate the
-    # player standing, and add it to the players databse
-    for player_record in total_record:
-        player_id = player_record[0]
-        wins = player_record[1]
-        ties = player_record[3]
-        bye = player_record[4]
-        OMW = calculate_OMW_Helper(player_id, total_record)
-        player_standing = (wins + bye)*3 + ties + OMW
+      The new tournament's id
+
+    Raises:
+      ValueError: if any match is rejected, for example because it is a
+                  rematch or involves a player who isn't in players_input.
+                  Nothing is imported."""
+    options = copy_Options_Helper(format)
+    with transaction():
+        tournament_id = registerTournament(tournament_name)
         with get_cursor() as cursor:
-            update = """
-                UPDATE players
-                SET player_standing = %s
-                WHERE player_id = %s;"""
-            cursor.execute(update, (player_standing, player_id, ))
-    with get_cursor() as cursor:
-        query = """
-            SELECT player_id, player_name, total_wins, total_matches
-            FROM playerStandings
-            WHERE tournament_id = %s;"""
-        cursor.execute(query, (tournament_id, ))
-        player_standings = cursor.fetchall()
-        return player_standings
+            cursor.execute("""
+                DROP TABLE IF EXISTS pg_temp.importedPlayers,
+                    pg_temp.importedMatches;
+                CREATE TEMPORARY TABLE importedPlayers (
+                    player_id integer PRIMARY KEY
+                ,   player_name varchar(254)
+                ,   player_standing decimal
+                ,   new_player_id integer
+                ) ON COMMIT DROP;
+                CREATE TEMPORARY TABLE importedMatches (
+                    match_id integer
+                ,   winner integer
+                ,   loser integer
+                ,   tie boolean
+                ,   bye boolean
+                ) ON COMMIT DROP;""")
+            with compressed_File_Helper(players_input, format,
+                                        "rb") as players_file:
+                cursor.copy_expert(
+                    "COPY importedPlayers (player_id, player_name, "
+                    "player_standing) FROM STDIN WITH (%s);" % options,
+                    players_file)
+            with compressed_File_Helper(matches_input, format,
+                                        "rb") as matches_file:
+                cursor.copy_expert(
+                    "COPY importedMatches FROM STDIN WITH (%s);" % options,
+                    matches_file)
+            query = """
+                SELECT player_id, player_name
+                FROM importedPlayers
+                ORDER BY player_id"""
+            for batch in read_Batches_Helper(cursor.connection, query):
+                player_ids = registerPlayers(
+                    [player_name for (player_id, player_name) in batch],
+                    tournament_id)
+                values = ",".join(
+                    cursor.mogrify("(%s, %s)", (old_player_id, player_id)
+                                   ).decode("utf-8")
+                    for ((old_player_id, player_name), player_id)
+                    in zip(batch, player_ids))
+                update = """
+                    UPDATE importedPlayers
+                    SET new_player_id = ids.player_id
+                    FROM (VALUES %s) AS ids (old_player_id, player_id)
+                    WHERE importedPlayers.player_id = ids.old_player_id;
+                    """ % values
+                cursor.execute(update)
+            query = """
+                SELECT
+                    winner.new_player_id
+                ,   loser.new_player_id
+                ,   importedMatches.tie
+                ,   importedMatches.bye
+                FROM importedMatches
+                LEFT JOIN importedPlayers AS winner
+                ON importedMatches.winner = winner.player_id
+                LEFT JOIN importedPlayers AS loser
+                ON importedMatches.loser = loser.player_id
+                ORDER BY importedMatches.match_id"""
+            for batch in read_Batches_Helper(cursor.connection, query):
+                reportMatches(batch, tournament_id, abort_on_error=True)
+    return tournament_id
 
 
-def calculate_OMW_Helper(player_id, total_record):
-    """This is a helper function to player_Standings that calculates the OMW
-    (Opponent Match Wins).
+def copy_Options_Helper(format):
+    """Returns the COPY options for an export format, or raises a ValueError
+    if there is no such format."""
+    if format not in COPY_FORMATS:
+        raise ValueError("format must be one of %s" %
+                         ", ".join(sorted(COPY_FORMATS)))
+    return COPY_FORMATS[format]
+
+
+def copy_Out_Helper(query, parameters, output, format):
+    """This is a helper function to exportPlayers and exportMatches that
+    streams the rows of a query into a file with COPY."""
+    options = copy_Options_Helper(format)
+    with get_cursor(read_only=True) as cursor:
+        copy = "COPY (%s) TO STDOUT WITH (%s);" % (
+            cursor.mogrify(query, parameters).decode("utf-8"), options)
+        with compressed_File_Helper(output, format, "wb") as output_file:
+            cursor.copy_expert(copy, output_file)
+
+
+@contextmanager
+def compressed_File_Helper(file, format, mode):
+    """This is a helper function to the export and import functions that
+    compresses or decompresses a file with gzip on the way through, for the
+    .gz formats.  The file itself is left open.
 
     Args:
-      player_id: the player's unique id (assigned by the database)
-      total_record: A list of tuples, each of which contains (player_id,
-                    total_wins, total_matches, total_ties, bye)"""
-    total_wins = 0
-    total_matches = 0
-    with get_cursor() as cursor:
-        # Get a list of all the opponents a player has had
-        query = """
-            SELECT opponent_one
-            FROM matchRegistry
-            WHERE opponent_two = %s
-            UNION
-            SELECT opponent_two
-            FROM matchRegistry
-            WHERE opponent_one = %s;"""
-        cursor.execute(query, (player_id, player_id, ))
-        opponents = cursor.fetchall()
-    # If an opponent isn't even in the matchRegistry yet, just return 0
-    if opponents == []:
-        return 0
-    # If a player hasn't had any opponents, just return 0
-    if opponents[0][0] is None:
-        return 0
-    # Loop through the list of opponents
-    for opponent in opponents:
-        # Find which index position in the total record has the opponent's
-        # record
-        opponent_index_in_record = [
-            i for i, v in enumerate(total_record) if v[0] is opponent[0]]
-        # Grab that opponent's wins and matches, and add them to the total wins
-        # and total matches respectively
-        total_wins += total_record[opponent_index_in_record[0]][1]
-        total_matches += total_record[opponent_index_in_record[0]][2]
-    OMW = round((float(total_wins)/total_matches), 2)
-    return OMW
+      file: the file being exported to or imported from
+      format: the export format
+      mode: "wb" to compress what is written, or "rb" to decompress what is
+            read"""
+    if not format.endswith(".gz"):
+        yield file
+        return
+    compressed = gzip.GzipFile(fileobj=file, mode=mode)
+    try:
+        yield compressed
+    finally:
+        compressed.close()
+
+
+def read_Batches_Helper(connection, query, parameters=None):
+    """Runs a query with a server-side cursor and yields its rows in lists of
+    up to BATCH_SIZE rows, so that only one batch is in memory at a time.
+
+    Args:
+      connection: the connection to run the query on.  It must stay in the
+                  same transaction until every batch has been read"""
+    cursor = open_Cursor_Helper(
+        connection, "tournament_batches_%s" % next(_cursor_numbers))
+    try:
+        cursor.execute(query, parameters)
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
 
 
-def reportMatch(winner, loser, tie=None, bye=None, tournament_id=None):
+@instrumented
+def reportMatch(winner, loser, tie=None, bye=None, tournament_id=None,
+                idempotency_key=None, round_number=None):
     """Records the outcome of a single match between two players. User must pass
-    in values for winner and loser. tie is optional.
+    in values for winner and loser. tie is optional.  Scorekeepers can report
+    matches from many threads or processes at once; each tournament's matches
+    are written one at a time, with a PostgreSQL advisory lock.
 
     Args:
       winner: the id number of the player who won.  If this match is a bye,
@@ -233,114 +2270,391 @@ def reportMatch(winner, loser, tie=None, bye=None, tournament_id=None):
       bye: pass in True if the player in the winner parameter recieved a bye.
       tournament: pass in the id of the tournament which the match is part of.
                   If tournament isn't passed in, the player id's will be looked
-                  up."""
+                  up.
+      idempotency_key: a string naming this result, unique within the
+                       tournament, for example "round-3-table-7".  If a
+                       match between the same players was already reported
+                       with this key, for example by a retry after a dropped
+                       connection, nothing is recorded and no error is
+                       raised.  Using the key for a different pairing raises
+                       a ValueError
+      round_number: pass in the round the match was played in to check it
+                    against the pairings startRound issued for that round.
+                    A ValueError is raised if the players weren't paired
+                    together, or the player wasn't given the bye"""
+    match = validate_Match_Helper(winner, loser, tie, bye)
     # Look up which tournament the players are a part of, using the winner.
     # This assumes the winner and loser are in the same tournament, which they
     # should be
     if not tournament_id:
-        with get_cursor() as cursor:
-            query = """
-                SELECT tournament_id
-                FROM players
-                WHERE player_id = %s;"""
-            cursor.execute(query, (winner, ))
-            tournament_id = cursor.fetchone()[0]
+        tournament_id = _backend.findTournament(winner)
         if not tournament_id:
             raise ValueError("player must be a part of a tournament")
+    if round_number is not None:
+        rejected = check_Round_Helper(tournament_id, round_number,
+                                      [(0, match)])
+        if rejected:
+            raise ValueError(rejected[0][1])
+    _backend.reportMatch(tournament_id, match, idempotency_key)
+    advance_Version_Helper(tournament_id)
+
+
+@instrumented
+def reportMatches(results, tournament_id, abort_on_error=False,
+                  idempotency_keys=None, round_number=None):
+    """Records the outcomes of a whole round of matches in one transaction.
+    Each result is checked the same way reportMatch checks it, and results
+    that would be a rematch, a second bye, or that involve a player from
+    another tournament are rejected before anything is written.
+
+    Args:
+      results: a list of tuples in the same order as the reportMatch
+               parameters, (winner, loser, tie, bye).  tie and bye may be left
+               off.  For example (3, 7) is a win for player 3, (3, 7, True) is
+               a tie and (5, None, None, True) is a bye for player 5.
+      tournament_id: the tournament's unique id (assigned by the database)
+      abort_on_error: pass in True to record nothing if any result is
+                      rejected.  A ValueError listing the rejected results is
+                      raised instead.
+      idempotency_keys: a list with an idempotency key, or None, for each
+                        result.  Look at the docstring of reportMatch for how
+                        keys work.  A result whose key was already used for
+                        the same players isn't recorded again, and gets the
+                        id of the match recorded the first time.
+      round_number: pass in the round the results are from to reject the
+                    results that don't match a pairing startRound issued for
+                    that round.
+
+    Returns:
+      A list with one tuple for each result, in the same order, of the form
+      (match_id, error):
+        match_id: the id of the recorded match, or None if it was rejected
+        error: None, or a message saying why the result was rejected"""
+    if idempotency_keys is not None and \
+            len(idempotency_keys) != len(results):
+        raise ValueError("there must be one idempotency key for each result")
+    report = [(None, None)] * len(results)
+    matches = []
+    for (index, result) in enumerate(results):
+        try:
+            matches.append((index, validate_Match_Helper(*result)))
+        except (TypeError, ValueError) as e:
+            report[index] = (None, str(e))
+    if round_number is not None and matches:
+        for (index, error) in check_Round_Helper(tournament_id, round_number,
+                                                 matches):
+            report[index] = (None, error)
+        matches = [(index, match) for (index, match) in matches
+                   if not report[index][1]]
+    rejected = [(index, error) for (index, (match_id, error))
+                in enumerate(report) if error]
+    if rejected and abort_on_error:
+        raise ValueError("rejected results: %s" % ", ".join(
+            "%s (%s)" % (index, error) for (index, error) in rejected))
+    if not matches:
+        return report
+    keys = None
+    if idempotency_keys is not None:
+        keys = [idempotency_keys[index] for (index, match) in matches]
+    stored = _backend.reportMatches(
+        tournament_id, [match for (index, match) in matches], abort_on_error,
+        keys)
+    advance_Version_Helper(tournament_id)
+    for ((index, match), result) in zip(matches, stored):
+        report[index] = result
+    return report
+
+
+def check_Round_Helper(tournament_id, round_number, matches):
+    """This is a helper function to reportMatch and reportMatches that finds
+    the results that don't match a pairing issued for a round.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      round_number: the round the results are from
+      matches: a list of (index, match) tuples, where match comes from
+               validate_Match_Helper
+
+    Returns:
+      A list of (index, error) tuples for the rejected matches
+
+    Raises:
+      ValueError: if the round hasn't been started"""
+    issued = _backend.loadRound(tournament_id, round_number)
+    if issued is None:
+        raise ValueError("round %s hasn't been started" % round_number)
+    return reject_Unpaired_Helper(round_number, issued[1], matches)
+
+
+def reject_Unpaired_Helper(round_number, pairings, matches):
+    """This is a helper function to check_Round_Helper that finds the results
+    that aren't one of a round's pairings.
+
+    Args:
+      round_number: the round the results are from
+      pairings: the round's pairings, in the form swissPairings returns them
+      matches: a list of (index, match) tuples, where match comes from
+               validate_Match_Helper
+
+    Returns:
+      A list of (index, error) tuples for the rejected matches"""
+    # Stored the same way validate_Match_Helper orders the players
+    paired = set((pairing[0], None) if len(pairing) == 2 else
+                 (min(pairing[0], pairing[2]), max(pairing[0], pairing[2]))
+                 for pairing in pairings)
+    rejected = []
+    for (index, (opponent_one, opponent_two, records)) in matches:
+        if (opponent_one, opponent_two) in paired:
+            continue
+        if opponent_two is None:
+            error = "player %s wasn't given a bye in round %s" % (
+                opponent_one, round_number)
+        else:
+            error = "players %s and %s weren't paired in round %s" % (
+                opponent_one, opponent_two, round_number)
+        rejected.append((index, error))
+    return rejected
+
+
+def validate_Match_Helper(winner, loser=None, tie=None, bye=None):
+    """This is a helper function to reportMatch and reportMatches that runs the
+    sanity checks on a single match result.  Look at the docstring of
+    reportMatch for the meaning of the arguments.
+
+    Returns:
+      A tuple of (opponent_one, opponent_two, records):
+        opponent_one: the smaller player id, or the player receiving a bye
+        opponent_two: the larger player id, or None for a bye
+        records: a list of (player_id, outcome) tuples.  outcome is "win",
+                 "loss", "tie" or "bye", the name of the records column that
+                 gets set to True"""
     # Check for byes first, since this is the only scoring element that only
     # involves the winner parameter, and not the loser parameter
     if winner and bye and not (loser or tie):
-        # First register the match
-        with get_cursor() as cursor:
-            insert = """
-                INSERT INTO matchRegistry (tournament_id, match_id,
-                opponent_one)
-                VALUES (%s, DEFAULT, %s);"""
-            cursor.execute(insert, (tournament_id, winner))
-        # Pull the match ID that was just committed
-        with get_cursor() as cursor:
-            query = """
-                SELECT match_id
-                FROM matchRegistry
-                WHERE opponent_one = %s;"""
-            cursor.execute(query, (winner, ))
-            match_id = cursor.fetchone()[0]
-            # Insert the bye into the records table
-            insert = """
-                INSERT INTO records (tournament_id, match_id, player_id, bye)
-                VALUES (%s, %s, %s, True);"""
-            cursor.execute(insert, (tournament_id, match_id, winner, ))
-            # Stop execution because all interaction with database for bye is
-            # finished and we don't want to continue executing and setting more
-            # unneccary info to database
-            return None
+        return (winner, None, [(winner, "bye")])
     # A couple of sanity checks
-    if not (type(winner) is int and type(loser) is int):
+    if not (type(winner) in INTEGER_TYPES and type(loser) in INTEGER_TYPES):
         raise ValueError("user must pass in integers")
     if tie and (not type(tie) is bool):
         raise ValueError("user must pass in tie as a boolean")
     if winner and loser and bye:
         raise ValueError("if user is trying to submit a bye, only winner"
                          "parameter can be passed in")
-
-    # Register the match.  Always store the smaller player_id in the
-    # opponent_one spot to avoid repeat matches IN the sql index
-    if winner > loser:
-        with get_cursor() as cursor:
-            insert = """
-                INSERT INTO matchRegistry
-                VALUES (%s, DEFAULT, %s, %s);"""
-            cursor.execute(insert, (tournament_id, loser, winner, ))
-        with get_cursor() as cursor:
-            query = """
-                SELECT match_id
-                FROM matchRegistry
-                WHERE (opponent_one = %s AND opponent_two = %s);"""
-            cursor.execute(query, (loser, winner, ))
-            match_id = cursor.fetchone()[0]
-    if loser > winner:
-        with get_cursor() as cursor:
-            insert = """
-                INSERT INTO matchRegistry
-                VALUES (%s, DEFAULT, %s, %s);"""
-            cursor.execute(insert, (tournament_id, winner, loser, ))
-        with get_cursor() as cursor:
-            query = """
-                SELECT match_id
-                FROM matchRegistry
-                WHERE (opponent_one = %s AND opponent_two = %s);"""
-            cursor.execute(query, (winner, loser, ))
-            match_id = cursor.fetchone()[0]
-    # Now log the ties (if applicable)
+    if winner == loser:
+        raise ValueError("a player can't play a match against themselves")
     if tie is True:
-        with get_cursor() as cursor:
-            insert = """
-                INSERT INTO records (tournament_id, match_id, player_id, tie)
-                VALUES (%s, %s, %s, True);"""
-            cursor.execute(insert, (tournament_id, match_id, winner))
-            cursor.execute(insert, (tournament_id, match_id, loser))
-    # Log the regular wins/losses if not ties
+        records = [(winner, "tie"), (loser, "tie")]
     else:
-        with get_cursor() as cursor:
-            insert = """
-                INSERT INTO records (tournament_id, match_id, player_id, win)
-                VALUES (%s, %s, %s, True);"""
-            cursor.execute(insert, (tournament_id, match_id, winner, ))
-            insert = """
-                INSERT INTO records (tournament_id, match_id, player_id, loss)
-                VALUES (%s, %s, %s, True);"""
-            cursor.execute(insert, (tournament_id, match_id, loser, ))
+        records = [(winner, "win"), (loser, "loss")]
+    # Always store the smaller player_id in the opponent_one spot to avoid
+    # repeat matches IN the sql index
+    return (min(winner, loser), max(winner, loser), records)
+
+
+def lock_Tournament_Helper(cursor, tournament_id):
+    """This is a helper function to PostgresBackend that waits for, and then
+    holds until the end of the transaction, the lock on writing a
+    tournament's matches.  Reporters of other tournaments aren't held up.
+    Writing matches one reporter at a time keeps the rematch and bye checks
+    from racing, and keeps the aggregate triggers from deadlocking on the
+    same players' rows."""
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s);",
+                   (REPORT_LOCK, tournament_id, ))
+
+
+# The matches of a tournament reported with any of a list of idempotency keys
+FIND_KEYS_QUERY = """
+    SELECT idempotency_key, match_id, opponent_one, opponent_two
+    FROM matchRegistry
+    WHERE tournament_id = %(tournament_id)s
+        AND idempotency_key = ANY(%(idempotency_keys)s::text[]);"""
+
+
+def find_Keys_Helper(cursor, tournament_id, idempotency_keys):
+    """This is a helper function to PostgresBackend that looks up which
+    idempotency keys have already been used in a tournament.
+
+    Returns:
+      A dictionary mapping each used key to a tuple of (match_id,
+      opponent_one, opponent_two)"""
+    keys = list(set(key for key in idempotency_keys if key is not None))
+    if not keys:
+        return {}
+    cursor.execute(FIND_KEYS_QUERY, {"tournament_id": tournament_id,
+                                     "idempotency_keys": keys})
+    return dict((row[0], tuple(row[1:])) for row in cursor.fetchall())
+
+
+# The players of a tournament among player_ids, and every match any of them
+# has played in it
+CHECK_MATCHES_QUERY = """
+    SELECT player_id, NULL::integer, NULL::integer
+    FROM players
+    WHERE tournament_id = %(tournament_id)s
+        AND player_id = ANY(%(player_ids)s::integer[])
+    UNION ALL
+    SELECT NULL, opponent_one, opponent_two
+    FROM matchRegistry
+    WHERE tournament_id = %(tournament_id)s
+        AND (opponent_one = ANY(%(player_ids)s::integer[])
+             OR opponent_two = ANY(%(player_ids)s::integer[]));"""
+
+
+def check_Matches_Helper(cursor, tournament_id, matches):
+    """This is a helper function to PostgresBackend that finds the results
+    which would break the database's rules, using one query for the whole
+    round.
+
+    Args:
+      cursor: the cursor to run the query with
+      tournament_id: the tournament's unique id (assigned by the database)
+      matches: a list of (index, match) tuples, where match comes from
+               validate_Match_Helper
+
+    Returns:
+      A list of (index, error) tuples for the rejected matches"""
+    if not matches:
+        return []
+    cursor.execute(CHECK_MATCHES_QUERY, {
+        "tournament_id": tournament_id,
+        "player_ids": match_Players_Helper(matches)})
+    return reject_Matches_Helper(tournament_id, matches, cursor.fetchall())
+
+
+def match_Players_Helper(matches):
+    """This is a helper function to check_Matches_Helper that lists every
+    player in a list of (index, match) tuples once, for CHECK_MATCHES_QUERY."""
+    return list(set(
+        player_id for (index, (opponent_one, opponent_two, records)) in matches
+        for (player_id, outcome) in records))
+
+
+def reject_Matches_Helper(tournament_id, matches, rows):
+    """This is a helper function to check_Matches_Helper that finds the
+    rejected matches from the rows of CHECK_MATCHES_QUERY.  Look at the
+    docstring of check_Matches_Helper for the arguments and the return
+    value."""
+    registered = set()
+    # Byes are stored as (player_id, None), the same way they are stored in
+    # the matchRegistry table
+    played = set()
+    for (player_id, opponent_one, opponent_two) in rows:
+        if player_id is not None:
+            registered.add(player_id)
+        else:
+            played.add((opponent_one, opponent_two))
+    rejected = []
+    for (index, (opponent_one, opponent_two, records)) in matches:
+        missing = [player_id for (player_id, outcome) in records
+                   if player_id not in registered]
+        if missing:
+            error = "player %s is not registered in tournament %s" % (
+                missing[0], tournament_id)
+        elif (opponent_one, opponent_two) in played and opponent_two is None:
+            error = "player %s has already received a bye" % opponent_one
+        elif (opponent_one, opponent_two) in played:
+            error = "players %s and %s have already played" % (
+                opponent_one, opponent_two)
+        else:
+            played.add((opponent_one, opponent_two))
+            continue
+        rejected.append((index, error))
+    return rejected
+
+
+# Adds a list of matches to a tournament, passed in as one array per column
+INSERT_MATCHES = """
+    INSERT INTO matchRegistry (tournament_id, opponent_one, opponent_two,
+        idempotency_key)
+    SELECT %(tournament_id)s, opponent_one, opponent_two, idempotency_key
+    FROM unnest(%(opponent_ones)s::integer[], %(opponent_twos)s::integer[],
+                %(idempotency_keys)s::text[])
+        AS matches (opponent_one, opponent_two, idempotency_key)
+    RETURNING match_id, opponent_one, opponent_two;"""
+# Adds the records of a list of matches.  outcome is the name of the column
+# set to true, and the others are left null
+INSERT_RECORDS = """
+    INSERT INTO records (tournament_id, match_id, player_id, win, loss, tie,
+        bye)
+    SELECT %(tournament_id)s, match_id, player_id,
+        nullif(outcome = 'win', false), nullif(outcome = 'loss', false),
+        nullif(outcome = 'tie', false), nullif(outcome = 'bye', false)
+    FROM unnest(%(match_ids)s::integer[], %(player_ids)s::integer[],
+                %(outcomes)s::text[])
+        AS records (match_id, player_id, outcome);"""
+
+
+def insert_Matches_Helper(cursor, tournament_id, matches,
+                          idempotency_keys=None):
+    """This is a helper function to PostgresBackend that writes matches to the
+    matchRegistry and records tables with one INSERT each.
+
+    Args:
+      cursor: the cursor to run the inserts with
+      tournament_id: the tournament's unique id (assigned by the database)
+      matches: a list of matches from validate_Match_Helper
+      idempotency_keys: a list with the key or None of each match.  If not
+                        provided, the matches have no keys
+
+    Returns:
+      A list of the new match ids, in the same order as matches"""
+    if not matches:
+        return []
+    cursor.execute(INSERT_MATCHES, insert_Matches_Parameters_Helper(
+        tournament_id, matches, idempotency_keys))
+    match_ids = match_Ids_Helper(matches, cursor.fetchall())
+    cursor.execute(INSERT_RECORDS, insert_Records_Parameters_Helper(
+        tournament_id, matches, match_ids))
+    return match_ids
+
+
+def insert_Matches_Parameters_Helper(tournament_id, matches,
+                                     idempotency_keys=None):
+    """This is a helper function to insert_Matches_Helper that puts the
+    matches into the arrays INSERT_MATCHES takes."""
+    if idempotency_keys is None:
+        idempotency_keys = [None] * len(matches)
+    return {"tournament_id": tournament_id,
+            "opponent_ones": [match[0] for match in matches],
+            "opponent_twos": [match[1] for match in matches],
+            "idempotency_keys": list(idempotency_keys)}
+
+
+def match_Ids_Helper(matches, rows):
+    """This is a helper function to insert_Matches_Helper that lines up the
+    rows INSERT_MATCHES returns with the matches.  Each pairing (and each
+    bye) can only appear once, so it identifies the new match_id without
+    relying on the order rows come back in."""
+    match_ids = dict(((opponent_one, opponent_two), match_id)
+                     for (match_id, opponent_one, opponent_two) in rows)
+    return [match_ids[(opponent_one, opponent_two)]
+            for (opponent_one, opponent_two, records) in matches]
+
 
+def insert_Records_Parameters_Helper(tournament_id, matches, match_ids):
+    """This is a helper function to insert_Matches_Helper that puts every
+    player's record of the matches into the arrays INSERT_RECORDS takes."""
+    records = [(match_id, player_id, outcome)
+               for (match_id, (opponent_one, opponent_two, match_records))
+               in zip(match_ids, matches)
+               for (player_id, outcome) in match_records]
+    return {"tournament_id": tournament_id,
+            "match_ids": [record[0] for record in records],
+            "player_ids": [record[1] for record in records],
+            "outcomes": [record[2] for record in records]}
 
+
+@instrumented
 def swissPairings(tournament_id=1):
     """Returns a list of pairs of players for the next round of a match.
     Each player is paired with another player with an equal or nearly-equal win
-    record, that is, a player adjacent to him or her in the standings.
+    record, that is, the nearest player below him or her in the standings that
+    he or she hasn't played yet.  Players that can't be paired within their
+    own score group float down to the next one.
 
     If there are an odd number of players, the last player returned will be the
     one which receives a bye.  This player will be the one with the lowest
-    standing, and will not have been assigned a bye before (only one bye per
-    player)
+    standing who has not been assigned a bye before (only one bye per player)
 
     Args:
       tournament_id: the tournament's unique id (assigned by the database)
@@ -355,47 +2669,267 @@ def swissPairings(tournament_id=1):
       In the case of an odd number of players, the last tuple will have this
       form
         id: the player's id receiving a bye
-        name: the player's name receiving a bye"""
-    player_standings = playerStandings(tournament_id)
+        name: the player's name receiving a bye
+
+    Raises:
+      ValueError: if every way of pairing the players would repeat a match, or
+                  if there are an odd number of players and every one of them
+                  has already received a bye
+      PairingSearchError: if the search gave up before finding out whether
+                          the players can be paired without a rematch"""
+    entry = cached_Standings_Helper(tournament_id, with_opponents=True)
+    return pair_Standings_Helper(entry["standings"], entry["opponents"])
+
+
+@instrumented
+def startRound(tournament_id=1):
+    """Starts the next round of a tournament.  The players are paired the
+    same way swissPairings pairs them, and the pairings are stored, so that
+    they can be read back with roundPairings and results can be checked
+    against them by passing round_number to reportMatch or reportMatches.
+    The standings at the end of the previous round are stored first, for
+    roundStandings, and each player's score is saved to the player_standing
+    column of the players table.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Returns:
+      A tuple of (round_number, pairings).  Rounds are numbered from 1, and
+      pairings is in the same form swissPairings returns
+
+    Raises:
+      ValueError: if the previous round still has results to report, if
+                  another scorekeeper started the round first, or for the
+                  reasons swissPairings raises it"""
+    entry = cached_Standings_Helper(tournament_id, with_opponents=True)
+    current = _backend.loadRound(tournament_id)
+    round_number = 1
+    if current is not None:
+        standings = finished_Standings_Helper(entry, current)
+        round_number = current[0] + 1
+    pairings = pair_Standings_Helper(entry["standings"], entry["opponents"])
+    # A scorekeeper who loses the race to start the round writes nothing
+    with _backend.transaction():
+        _backend.saveRound(tournament_id, round_number, pairings)
+        if current is not None:
+            _backend.saveRoundStandings(tournament_id, current[0], standings)
+        _backend.saveStandings(entry["standings"])
+    return (round_number, pairings)
+
+
+@instrumented
+def roundPairings(tournament_id=1, round_number=None):
+    """Returns the pairings startRound issued for a round.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      round_number: the round to look up.  If not provided, the latest round
+                    is returned
+
+    Returns:
+      A list of tuples in the same form swissPairings returns
+
+    Raises:
+      ValueError: if the round hasn't been started"""
+    issued = _backend.loadRound(tournament_id, round_number)
+    if issued is None:
+        raise ValueError("round %s hasn't been started" % (
+            round_number or 1))
+    return issued[1]
+
+
+@instrumented
+def roundStandings(tournament_id=1, round_number=None):
+    """Returns the standings at the end of a round, in the same form as
+    playerStandings.  The standings of a round are stored once all its
+    results are in, by startRound or the first time they are asked for, so
+    the standings after earlier rounds are looked up instead of recalculated.
+
+    Args:
+      tournament_id: the tournament's unique id (assigned by the database)
+      round_number: the round to look up.  If not provided, the latest round
+                    is returned
+
+    Raises:
+      ValueError: if the round hasn't been started, or still has results to
+                  report"""
+    current = _backend.loadRound(tournament_id)
+    if current is None or (round_number or 1) > current[0] or \
+            (round_number or 1) < 1:
+        raise ValueError("round %s hasn't been started" % (
+            round_number or 1))
+    if round_number is None:
+        round_number = current[0]
+    standings = _backend.loadRoundStandings(tournament_id, round_number)
+    if not standings and round_number == current[0]:
+        standings = finished_Standings_Helper(
+            cached_Standings_Helper(tournament_id, with_opponents=True),
+            current)
+        _backend.saveRoundStandings(tournament_id, round_number, standings)
+    return [row[:4] for row in standings]
+
+
+def finished_Standings_Helper(entry, issued):
+    """This is a helper function to startRound and roundStandings that checks
+    that every pairing of a round has been reported.
+
+    Args:
+      entry: a dictionary from cached_Standings_Helper with opponents
+      issued: a tuple of (round_number, pairings) from a backend's loadRound
+
+    Returns:
+      The standings from entry, which are the standings at the end of the
+      round
+
+    Raises:
+      ValueError: if a pairing of the round hasn't been reported"""
+    (round_number, pairings) = issued
+    byes = dict((row[0], row[5]) for row in entry["standings"])
+    opponents = entry["opponents"]
+    for pairing in pairings:
+        if (len(pairing) == 2 and not byes.get(pairing[0])) or (
+                len(pairing) == 4 and
+                pairing[2] not in opponents.get(pairing[0], ())):
+            raise ValueError("round %s still has results to report" %
+                             round_number)
+    return entry["standings"]
+
+
+def pair_Standings_Helper(standings, opponents):
+    """This is a helper function to swissPairings that picks the bye, if one is
+    needed, and pairs up the rest of the players.  Look at the docstring of
+    swissPairings for the return value and the errors raised.
+
+    Args:
+      standings: a list of tuples from calculate_Standings_Helper
+      opponents: a dictionary mapping player ids to the set of player ids they
+                 have played against"""
+    player_standings = [row[:4] for row in standings]
     number_of_players = len(player_standings)
-    # First handle the situation where there are an odd number of players
-    if number_of_players % 2 == 1:
-        # To give the lowest ranking players byes, first reverse the player
-        # standings. Then loop over player standings in the reverse order.
-        reverse_player_standings = sorted(player_standings, reverse=True)
-        for (place, player_record) in enumerate(reverse_player_standings):
-            player_id = player_record[0]
-            with get_cursor() as cursor:
-                # Check if this player has received a bye before
-                query = """
-                    SELECT count(bye)
-                    FROM records
-                    WHERE (tournament_id = %s AND player_id = %s)
-                    GROUP BY player_id;"""
-                cursor.execute(query, (tournament_id, player_id, ))
-                bye = cursor.fetchone()
-            # If this player hasn't had a bye before, short circuit the loop,
-            # create the swiss pairings tuples and return them
-            if bye == 0:
-                # Calculate the index position of this player in the
-                # player_standings list of tuples
-                index_position = number_of_players - place
-                # Remove the tuple of the player getting the bye from the
-                # player_standings list
-                even_player_standings = player_standings[0:index_position] + \
-                                        player_standings[index_position + 1:]
-                # Grab the tuple getting the bye from the player_standings list
-                bye = player_standings[index_position:index_position + 1]
-                swissPairings = swissPairingsHelper(even_player_standings, bye)
-                return swissPairings
     # If there are an even number of players, it's just a matter of calling
     # swissPairingsHelper
-    else:
-        swissPairings = swissPairingsHelper(player_standings)
+    if number_of_players % 2 == 0:
+        swissPairings = swissPairingsHelper(player_standings,
+                                            opponents=opponents)
+        return swissPairings
+    # To give the lowest ranking players byes, walk up the standings from the
+    # bottom, skipping the players who have had a bye before.  The standings
+    # already hold every player's bye count, so no more queries are needed
+    eligible_places = [place for place in reversed(range(number_of_players))
+                       if standings[place][5] == 0]
+    if not eligible_places:
+        raise ValueError("every player has already received a bye")
+    for place in eligible_places:
+        # Remove the tuple of the player getting the bye from the
+        # player_standings list
+        even_player_standings = player_standings[0:place] + \
+                                player_standings[place + 1:]
+        try:
+            swissPairings = swissPairingsHelper(
+                even_player_standings, player_standings[place], opponents)
+        except ValueError:
+            # The rest of the players can't be paired without a rematch, so
+            # give the bye to the next player up instead
+            continue
         return swissPairings
+    raise ValueError("no pairing without rematches exists")
+
+
+# Every match between two players in a tournament
+OPPONENTS_QUERY = """
+    SELECT opponent_one, opponent_two
+    FROM matchRegistry
+    WHERE tournament_id = %(tournament_id)s AND opponent_two IS NOT NULL;"""
+
+
+def load_Opponents_Helper(cursor, tournament_id):
+    """This is a helper function to PostgresBackend that loads everyone each
+    player has played against with a single query.
+
+    Args:
+      cursor: the cursor to run the query with
+      tournament_id: the tournament's unique id (assigned by the database)
+
+    Returns:
+      A dictionary mapping each player id that has played a match to the set
+      of player ids he or she has played against"""
+    cursor.execute(OPPONENTS_QUERY, {"tournament_id": tournament_id})
+    return collect_Opponents_Helper(cursor.fetchall())
+
+
+def collect_Opponents_Helper(pairings):
+    """This is a helper function to load_Opponents_Helper that turns the rows
+    of OPPONENTS_QUERY into a dictionary mapping each player id to the set of
+    player ids he or she has played against."""
+    opponents = {}
+    for (opponent_one, opponent_two) in pairings:
+        opponents.setdefault(opponent_one, set()).add(opponent_two)
+        opponents.setdefault(opponent_two, set()).add(opponent_one)
+    return opponents
+
+
+def pair_Players_Helper(player_ids, opponents):
+    """This is a helper function to swissPairings that pairs up players without
+    repeating a match.  Going down the standings, each player is paired with the
+    nearest player below him or her that he or she hasn't played.  If that
+    leaves players at the bottom who can only be paired with each other by
+    repeating a match, the pairings above them are undone one at a time and the
+    next nearest player is tried instead.
+
+    Args:
+      player_ids: a list of player ids sorted from highest standing to lowest.
+                  Must have an even number of players
+      opponents: a dictionary mapping player ids to the set of player ids they
+                 have played against
+
+    Returns:
+      A list of (player_id, player_id) tuples, with the higher standing player
+      first
+
+    Raises:
+      ValueError: if every way of pairing the players would repeat a match
+      PairingSearchError: if PAIRING_STEPS ran out before finding out"""
+    number_of_players = len(player_ids)
+    no_opponents = frozenset()
+    paired = [False] * number_of_players
+    # Each entry is (place, partner_place) for a pairing that has been made
+    pairings = []
+    place = 0
+    next_candidate = 1
+    # Give up rather than search forever when no pairing exists
+    steps = PAIRING_STEPS * (number_of_players + 100)
+    steps_left = steps
+    while place < number_of_players:
+        played = opponents.get(player_ids[place], no_opponents)
+        candidate = next_candidate
+        while candidate < number_of_players and (
+                paired[candidate] or player_ids[candidate] in played):
+            candidate += 1
+        steps_left -= candidate - next_candidate + 1
+        if steps_left < 0:
+            raise PairingSearchError(
+                "gave up looking for a pairing without rematches after %s "
+                "steps" % steps)
+        if candidate < number_of_players:
+            paired[place] = paired[candidate] = True
+            pairings.append((place, candidate))
+            # Move on to the highest standing player still unpaired
+            while place < number_of_players and paired[place]:
+                place += 1
+            next_candidate = place + 1
+        elif pairings:
+            # Undo the last pairing and try the next candidate in its place
+            (place, partner_place) = pairings.pop()
+            paired[place] = paired[partner_place] = False
+            next_candidate = partner_place + 1
+        else:
+            raise ValueError("no pairing without rematches exists")
+    return [(player_ids[place], player_ids[partner_place])
+            for (place, partner_place) in pairings]
 
 
-def swissPairingsHelper(even_player_standings, bye=False):
+def swissPairingsHelper(even_player_standings, bye=False, opponents=None):
     """Does the actual work of swissPairings. Look at the docstring of that
     function to see the expected return of this function.
 
@@ -404,16 +2938,18 @@ def swissPairingsHelper(even_player_standings, bye=False):
                              have an even number of players
       bye: pass in a single player tuple from a player_standings list.  This
            player will receive a bye and will be placed at the end of the
-           resulting swissPairings list"""
-    swissPairings = []
-    # This for loop creates the swissPairings for an even amount of players
-    for (place, player_record) in enumerate(even_player_standings):
-        player_id = player_record[0]
-        player_name = player_record[1]
-        if place % 2 == 0:
-            first_player = (player_id, player_name)
-        if place % 2 == 1:
-            swissPairings.append(first_player + (player_id, player_name, ))
+           resulting swissPairings list
+      opponents: a dictionary mapping player ids to the set of player ids they
+                 have played against.  If not provided, no player has played
+                 anyone yet"""
+    player_names = dict((player_record[0], player_record[1])
+                        for player_record in even_player_standings)
+    pairings = pair_Players_Helper(
+        [player_record[0] for player_record in even_player_standings],
+        opponents or {})
+    swissPairings = [(first_id, player_names[first_id], second_id,
+                      player_names[second_id])
+                     for (first_id, second_id) in pairings]
     # If a player receives a bye, that player's tuple is inserted at the end of
     # the swissPairings here
     if bye:
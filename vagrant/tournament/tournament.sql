@@ -72,3 +72,12 @@ SELECT
 FROM players LEFT JOIN counts
 ON players.player_id = counts.player_id
 ORDER BY player_standing DESC;
+
+-- Every change to these tables since is a migration in the migrations directory, and the schemaMigrations table lists the migrations that have been applied to this database.  A new database gets all of them, below.  To bring an existing database up to date without losing its tournaments, call migrateDatabase() in tournament.py instead of reloading this file.
+\ir migrations/000_player_aggregates.sql
+\ir migrations/001_partition_by_tournament.sql
+\ir migrations/002_idempotency_keys.sql
+\ir migrations/003_rounds.sql
+\ir migrations/004_change_feed.sql
+\ir migrations/005_bulk_lifecycle.sql
+\ir migrations/006_partition_batches.sql
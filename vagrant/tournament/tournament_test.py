@@ -1,9 +1,24 @@
 #!/usr/bin/env python
 #
 # Test cases for tournament.py
+#
+# Run with --memory to test against the in-memory backend instead of the
+# tournament database.  Run with --replica DSN to also test reading from a
+# streaming replica of the tournament database, for example
+# --replica "dbname=tournament port=5433"
 
+import os
+import sys
+import tempfile
+import threading
+import time
+import tournament
 from tournament import *
 
+# The connection string of a replica to test with, if one was given
+REPLICA_DSN = None
+
+
 def testDeleteMatches():
     deleteMatches()
     print "1. Old matches can be deleted."
@@ -124,13 +139,734 @@ def testPairings():
             "After one match, players with one win should be paired.")
     print "8. After one match, players with one win are paired."
 
+
+def testTransaction():
+    deleteMatches()
+    deletePlayers()
+    with transaction():
+        registerPlayer("Ada Lovelace")
+        registerPlayer("Charles Babbage")
+        if countPlayers() != 2:
+            raise ValueError(
+                "Players registered in a transaction should be visible in it.")
+    try:
+        with transaction():
+            registerPlayer("Grace Hopper")
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    if countPlayers() != 2:
+        raise ValueError(
+            "A transaction that raised should not register any players.")
+    print "9. Calls in a transaction share a connection and commit together."
+
+
+def testStandingsScores():
+    deleteMatches()
+    deletePlayers()
+    registerPlayer("Bruno Walton")
+    registerPlayer("Boots O'Neal")
+    registerPlayer("Cathy Burton")
+    registerPlayer("Diane Grant")
+    standings = playerStandings()
+    [id1, id2, id3, id4] = [row[0] for row in standings]
+    reportMatch(id1, id2)
+    reportMatch(id3, id4, tie=True)
+    standings = playerStandings()
+    if standings[0][0] != id1:
+        raise ValueError("The only match winner should be ranked first.")
+    scores = dict((row[0], row[7]) for row in calculate_Standings_Helper(
+        getBackend().loadStandings(1)))
+    if scores != {id1: 3, id2: 1.0, id3: 1, id4: 1}:
+        raise ValueError("Scores should be 3 per win, 1 per tie plus OMW.")
+    print "10. Standings are scored by wins, ties and OMW."
+
+
+def testReportRound():
+    deleteMatches()
+    deletePlayers()
+    registerPlayer("Bruno Walton")
+    registerPlayer("Boots O'Neal")
+    registerPlayer("Cathy Burton")
+    registerPlayer("Diane Grant")
+    registerPlayer("Ellen Ripley")
+    standings = playerStandings()
+    [id1, id2, id3, id4, id5] = [row[0] for row in standings]
+    report = reportMatches([(id1, id2), (id3, id4, True), (id5, None, None, True),
+                            (id2, id1)], 1)
+    if [error is None for (match_id, error) in report] != [True, True, True,
+                                                           False]:
+        raise ValueError("Only the rematch should be rejected.")
+    standings = dict((row[0], row[2:]) for row in playerStandings())
+    if standings != {id1: (1, 1), id2: (0, 1), id3: (0, 1), id4: (0, 1),
+                     id5: (0, 0)}:
+        raise ValueError("Every accepted result should be recorded.")
+    try:
+        reportMatches([(id1, id3), (id5, None, None, True)], 1,
+                      abort_on_error=True)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("A second bye should abort the round when asked to.")
+    if playerStandings()[0][2:] != (1, 1):
+        raise ValueError("An aborted round should record nothing.")
+    print "11. A whole round can be reported at once."
+
+
+def testRegisterPlayers():
+    deleteMatches()
+    deletePlayers()
+    names = ["Player %s" % number for number in range(100)]
+    player_ids = registerPlayers(names)
+    if countPlayers() != 100:
+        raise ValueError(
+            "After registering 100 players, countPlayers should be 100.")
+    standings = dict((row[0], row[1]) for row in playerStandings())
+    if [standings[player_id] for player_id in player_ids] != names:
+        raise ValueError(
+            "registerPlayers should return the ids in the order of the names.")
+    print "12. A whole field of players can be registered at once."
+
+
+def testAggregates():
+    deleteMatches()
+    deletePlayers()
+    [id1, id2, id3, id4, id5] = registerPlayers(
+        ["Bruno Walton", "Boots O'Neal", "Cathy Burton", "Diane Grant",
+         "Ellen Ripley"])
+    reportMatches([(id1, id2), (id3, id4, True), (id5, None, None, True)], 1)
+    reportMatches([(id1, id3), (id2, id5)], 1)
+    if checkAggregates(1) != []:
+        raise ValueError("Running totals should match the records.")
+    with get_cursor() as cursor:
+        cursor.execute("UPDATE playerAggregates SET wins = 7 "
+                       "WHERE player_id = %s;", (id4, ))
+    if checkAggregates(1) != [id4]:
+        raise ValueError("checkAggregates should find wrong running totals.")
+    if rebuildAggregates(1) != 1 or checkAggregates() != []:
+        raise ValueError("rebuildAggregates should fix wrong running totals.")
+    [id6] = registerPlayers(["Frank Castle"])
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM playerAggregates "
+                       "WHERE player_id IN %s;", ((id1, id6), ))
+    if rebuildAggregates(1) != 2 or checkAggregates() != []:
+        raise ValueError("rebuildAggregates should count missing running "
+                         "totals as fixed.")
+    deleteMatches()
+    if checkAggregates(1) != [] or playerStandings()[0][2:] != (0, 0):
+        raise ValueError("Deleting matches should reset the running totals.")
+    print "13. Running totals are kept up to date and can be rebuilt."
+
+
+def testPairingsAvoidRematches():
+    deleteMatches()
+    deletePlayers()
+    [id1, id2, id3, id4] = registerPlayers(
+        ["Twilight Sparkle", "Fluttershy", "Applejack", "Pinkie Pie"])
+    reportMatches([(id1, id2), (id3, id4)], 1)
+    reportMatches([(id1, id3), (id2, id4)], 1)
+    pairings = swissPairings()
+    actual_pairs = set([frozenset([pid1, pid2])
+                        for (pid1, pname1, pid2, pname2) in pairings])
+    if actual_pairs != set([frozenset([id1, id4]), frozenset([id2, id3])]):
+        raise ValueError(
+            "Players who have already played should not be paired again.")
+    print "14. Players are never paired for a rematch."
+
+
+def testPairingsWithByes():
+    deleteMatches()
+    deletePlayers()
+    [id1, id2, id3] = registerPlayers(["Ann", "Bob", "Cat"])
+    reportMatches([(id1, id2), (id3, None, None, True)], 1)
+    pairings = swissPairings()
+    if len(pairings) != 2 or pairings[-1][0] != id2:
+        raise ValueError("The lowest ranked player without a bye should get "
+                         "the bye.")
+    if set(pairings[0][0::2]) != set([id1, id3]):
+        raise ValueError("The other players should be paired.")
+    reportMatches([(id1, id3), (id2, None, None, True)], 1)
+    pairings = swissPairings()
+    if pairings[-1][0] != id1:
+        raise ValueError("Players who have had a bye should not get another.")
+    reportMatches([(id2, id3), (id1, None, None, True)], 1)
+    try:
+        swissPairings()
+    except ValueError:
+        pass
+    else:
+        raise ValueError(
+            "swissPairings should raise when every player has had a bye.")
+    print "15. Byes go to the lowest ranked player without one."
+
+
+def playTournament(names, rounds):
+    """Plays a small tournament in tournament 1 of the current backend, where
+    the higher ranked player of each pairing wins, and returns the names from
+    the pairings of each round and the final standings."""
+    deleteMatches()
+    deletePlayers()
+    registerPlayers(names)
+    history = []
+    for round_number in range(rounds):
+        pairings = swissPairings()
+        history.append([pairing[1::2] for pairing in pairings])
+        reportMatches([(pairing[0], pairing[2]) if len(pairing) == 4 else
+                       (pairing[0], None, None, True)
+                       for pairing in pairings], 1)
+    history.append([row[1:] for row in playerStandings()])
+    return history
+
+
+def testMemoryBackend():
+    names = ["Ann", "Bob", "Cat", "Dan", "Eve", "Fay", "Gus"]
+    backend = getBackend()
+    expected = playTournament(names, 4)
+    setBackend(MemoryBackend())
+    try:
+        actual = playTournament(names, 4)
+    finally:
+        setBackend(backend)
+    if actual != expected:
+        raise ValueError("The in-memory backend should pair and score "
+                         "players the same way as the database.")
+    print "16. The in-memory backend behaves the same as the database."
+
+
+def testInstrumentation():
+    deleteMatches()
+    deletePlayers()
+    registerPlayers(["Ann", "Bob"])
+    enableInstrumentation()
+    try:
+        countPlayers()
+        countPlayers()
+        stats = instrumentationStats(reset=True)["countPlayers"]
+        if (stats["calls"], stats["connections"], stats["statements"],
+                stats["rows"]) != (2, 2, 2, 2):
+            raise ValueError("Instrumentation should count the calls, "
+                             "connections, statements and rows of each "
+                             "function.")
+        registerPlayer("Cat")
+        if list(instrumentationStats().keys()) != ["registerPlayer"]:
+            raise ValueError("Nested calls should count against the outer "
+                             "function.")
+    finally:
+        disableInstrumentation()
+    countPlayers()
+    if instrumentationStats() != {}:
+        raise ValueError("Nothing should be counted while instrumentation is "
+                         "disabled.")
+    print "17. Database use is counted for each function."
+
+
+def testStandingsCache():
+    deleteMatches()
+    deletePlayers()
+    [ann, bob] = registerPlayers(["Ann", "Bob"])
+    standingsCacheStats(reset=True)
+    first = playerStandings()
+    if playerStandings() != first or standingsCacheStats()["hits"] != 1:
+        raise ValueError("Standings should come from the cache until the "
+                         "tournament changes.")
+    reportMatch(ann, bob)
+    standings = playerStandings()
+    if standings == first or standings[0][0] != ann:
+        raise ValueError("Reporting a match should update the cached "
+                         "standings.")
+    configureStandingsCache(1)
+    try:
+        other_tournament = registerTournament("Other")
+        playerStandings(other_tournament)
+        playerStandings()
+        standingsCacheStats(reset=True)
+        playerStandings(other_tournament)
+        stats = standingsCacheStats()
+        if (stats["tournaments"], stats["misses"]) != (1, 1):
+            raise ValueError("The least recently used tournament should be "
+                             "evicted from the cache.")
+        deleteTournament(other_tournament)
+    finally:
+        configureStandingsCache(128)
+    print "18. Standings are cached until the tournament changes."
+
+
+def testArrayStandings():
+    if numpy is None:
+        print "19. Skipped the NumPy standings, NumPy isn't installed."
+        return
+    playTournament(["Ann", "Bob", "Cat", "Dan", "Eve", "Fay", "Gus"], 3)
+    pairing = swissPairings()[0]
+    reportMatch(pairing[0], pairing[2], True)
+    backend = getBackend()
+    if calculate_Standings_Array_Helper(*backend.loadRecords(1)) != \
+            calculate_Standings_Helper(backend.loadStandings(1)):
+        raise ValueError("The NumPy standings should match the standings "
+                         "calculated in Python.")
+    print "19. NumPy calculates the same standings as Python."
+
+
+def testSimulation():
+    from simulation import EloModel, simulateTournament
+    names = ["Ann", "Bob", "Cat", "Dan", "Eve"]
+    model = EloModel([2400, 1600, 1500, 1400, 1300])
+    results = simulateTournament(names, model, rounds=3, events=30,
+                                 prizes=2, processes=1, seed=7)
+    if results != simulateTournament(names, model, rounds=3, events=30,
+                                     prizes=2, processes=1, seed=7):
+        raise ValueError("Simulations with the same seed should match.")
+    for player in results["players"]:
+        if sum(player["places"].values()) != 30:
+            raise ValueError("Every player should finish every event.")
+    if results["players"][0]["win_chance"] < 0.9:
+        raise ValueError("A much stronger player should nearly always win.")
+    print "20. Swiss tournaments can be simulated in memory."
+
+
+def testMigrations():
+    if migrateDatabase() != []:
+        raise ValueError("A new database should already have every migration.")
+    partitions = """
+        SELECT count(*)
+        FROM pg_inherits
+        WHERE inhparent = 'matchregistry'::regclass;"""
+    # Move the tournament ids past every partition made so far, so that the
+    # next tournament starts a new batch.  resetDatabase starts the ids over
+    # but keeps the partitions
+    with get_cursor() as cursor:
+        cursor.execute("""
+            SELECT setval('tournaments_tournament_id_seq', greatest(
+                nextval('tournaments_tournament_id_seq'),
+                max(substring(inhrelid::regclass::text
+                              from '[0-9]+$')::integer)))
+            FROM pg_inherits
+            WHERE inhparent = 'matchregistry'::regclass;""")
+        cursor.execute(partitions)
+        before = cursor.fetchone()[0]
+    first = registerTournament("Partitioned")
+    second = registerTournament("Also Partitioned")
+    with get_cursor() as cursor:
+        cursor.execute(partitions)
+        if cursor.fetchone()[0] != before + 64:
+            raise ValueError("Partitions should be made 64 tournaments at a "
+                             "time.")
+    [id1, id2] = registerPlayers(["Ann", "Bob"], first)
+    reportMatch(id1, id2)
+    with get_cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM records_%d;" % first)
+        if cursor.fetchone()[0] != 2:
+            raise ValueError("Each tournament should get its own partitions.")
+    deleteTournament(first)
+    deleteTournament(second)
+    with get_cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s), to_regclass(%s);",
+                       ("records_%s" % first, "matchregistry_%s" % second))
+        if cursor.fetchone() != (None, None):
+            raise ValueError("Deleting a tournament should drop its "
+                             "partitions.")
+    # Build the original schema, from the start of tournament.sql, in a schema
+    # of its own, and bring it up to date
+    with open(os.path.join(os.path.dirname(MIGRATIONS_DIRECTORY),
+                           "tournament.sql")) as sql:
+        baseline = sql.read().split("\\c tournament", 1)[1]
+    baseline = baseline.split("\\ir", 1)[0]
+    with get_cursor() as cursor:
+        cursor.execute("DROP SCHEMA IF EXISTS migrationTest CASCADE;"
+                       "CREATE SCHEMA migrationTest;")
+    settings = dict(DATABASE_SETTINGS)
+    configureDatabase(dsn=settings["dsn"] +
+                      " options='-c search_path=migrationtest'",
+                      replica_dsns=[])
+    try:
+        with get_cursor() as cursor:
+            cursor.execute(baseline)
+            cursor.execute("""
+                INSERT INTO tournaments VALUES (1, 'Baseline');
+                INSERT INTO players VALUES (1, 1, 'Ann'), (1, 2, 'Bob'),
+                                           (1, 3, 'Cat');
+                INSERT INTO matchRegistry VALUES (1, 1, 1, 2), (1, 2, 3, null);
+                INSERT INTO records VALUES
+                    (1, 1, 1, true, null, null, null),
+                    (1, 1, 2, null, true, null, null),
+                    (1, 2, 3, null, null, null, true);
+                SELECT setval('players_player_id_seq', 3);
+                SELECT setval('matchregistry_match_id_seq', 2);""")
+        applied = migrateDatabase()
+        if len(applied) != len(os.listdir(MIGRATIONS_DIRECTORY)):
+            raise ValueError("An old database should get every migration.")
+        reportMatch(3, 1)
+        if checkAggregates() != []:
+            raise ValueError("A migrated database should count the matches "
+                             "played before and after migrating.")
+    finally:
+        configureDatabase(dsn=settings["dsn"],
+                          replica_dsns=settings["replica_dsns"])
+        with get_cursor() as cursor:
+            cursor.execute("DROP SCHEMA migrationTest CASCADE;")
+    print "21. Old databases can be migrated, and tournaments get partitions."
+
+
+def testExportImport():
+    tournament_id = registerTournament("Exported")
+    [id1, id2, id3] = registerPlayers(["Ann", "Bob", "Cat"], tournament_id)
+    reportMatches([(id1, id2), (id3, None, None, True)], tournament_id)
+    reportMatches([(id3, id1, True), (id2, None, None, True)], tournament_id)
+    # Read the matches three at a time, so that they come in two batches
+    tournament.BATCH_SIZE = 3
+    try:
+        history = list(matchHistory(tournament_id))
+    finally:
+        tournament.BATCH_SIZE = 1000
+    if [match[1:] for match in history] != [
+            (id1, id2, False, False), (id3, None, False, True),
+            (id1, id3, True, False), (id2, None, False, True)]:
+        raise ValueError("matchHistory() should return every match in the "
+                         "order it was reported.")
+    for format in ["csv", "binary", "csv.gz", "binary.gz"]:
+        players = tempfile.TemporaryFile()
+        matches = tempfile.TemporaryFile()
+        exportPlayers(tournament_id, players, format)
+        exportMatches(tournament_id, matches, format)
+        players.seek(0)
+        matches.seek(0)
+        if format.endswith(".gz") and matches.read(2) != b"\x1f\x8b":
+            raise ValueError("A .gz export should be compressed with gzip.")
+        matches.seek(0)
+        imported_id = importTournament(players, matches, "Imported", format)
+        if [row[1:] for row in playerStandings(imported_id)] != \
+                [row[1:] for row in playerStandings(tournament_id)]:
+            raise ValueError("An imported tournament should have the same "
+                             "standings as the exported one.")
+        deleteTournament(imported_id)
+    deleteTournament(tournament_id)
+    print "22. Tournaments can be exported and imported."
+
+
+def testConcurrentReporting():
+    tournament_id = registerTournament("Concurrent")
+    registerPlayers(["Player %s" % number for number in range(16)],
+                    tournament_id)
+    results = [(pairing[0], pairing[2])
+               for pairing in swissPairings(tournament_id)]
+    keys = ["round-1-table-%s" % table for table in range(len(results))]
+    reports = []
+    errors = []
+
+    def scorekeeper(order, whole_round=True):
+        try:
+            for index in order:
+                reportMatch(results[index][0], results[index][1],
+                            tournament_id=tournament_id,
+                            idempotency_key=keys[index])
+            if whole_round:
+                reports.append(reportMatches(results, tournament_id,
+                                             idempotency_keys=keys))
+        except Exception as e:
+            errors.append(e)
+    # Every scorekeeper reports the whole round, half of them back to front
+    tables = list(range(len(results)))
+    threads = [threading.Thread(target=scorekeeper,
+                                args=(tables[::1 - 2 * (number % 2)], ))
+               for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors or len(set(map(tuple, reports))) != 1 or \
+            [error for (match_id, error) in reports[0] if error]:
+        raise ValueError("Retried results with the same idempotency keys "
+                         "should all get back the same matches.")
+    # Then every scorekeeper reports a different match of the next round,
+    # without keys
+    results = [(pairing[0], pairing[2])
+               for pairing in swissPairings(tournament_id)]
+    keys = [None] * len(results)
+    threads = [threading.Thread(target=scorekeeper, args=([index], False))
+               for index in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    standings = playerStandings(tournament_id)
+    if errors or [row[3] for row in standings] != [2] * 16 or \
+            sum(row[2] for row in standings) != 16:
+        raise ValueError("Each match reported at the same time should be "
+                         "recorded exactly once.")
+    deleteTournament(tournament_id)
+    print "23. Scorekeepers can report matches at the same time."
+
+
+def testRounds():
+    tournament_id = registerTournament("Rounds")
+    registerPlayers(["Ann", "Bob", "Cat", "Dan", "Eve"], tournament_id)
+    (round_number, pairings) = startRound(tournament_id)
+    if round_number != 1 or roundPairings(tournament_id) != pairings or \
+            roundPairings(tournament_id, 1) != pairings:
+        raise ValueError("startRound() should store the round's pairings.")
+    results = [(pairing[0], pairing[2]) if len(pairing) == 4 else
+               (pairing[0], None, None, True) for pairing in pairings]
+    wrong = (pairings[0][0], pairings[1][0])
+    for report in [lambda: startRound(tournament_id),
+                   lambda: reportMatch(*wrong, tournament_id=tournament_id,
+                                       round_number=1),
+                   lambda: roundStandings(tournament_id, 1)]:
+        try:
+            report()
+        except ValueError:
+            continue
+        raise ValueError("Unfinished rounds and results that weren't "
+                         "paired should be rejected.")
+    reportMatches(results, tournament_id, abort_on_error=True,
+                  round_number=1)
+    first_standings = playerStandings(tournament_id)
+    (round_number, pairings) = startRound(tournament_id)
+    reportMatches([(pairing[0], pairing[2]) if len(pairing) == 4 else
+                   (pairing[0], None, None, True) for pairing in pairings],
+                  tournament_id, round_number=2)
+    if round_number != 2 or \
+            roundStandings(tournament_id, 1) != first_standings or \
+            roundStandings(tournament_id) != playerStandings(tournament_id):
+        raise ValueError("roundStandings() should return the standings at "
+                         "the end of each round.")
+    # A startRound() that fails part way through, like one that loses the
+    # race to start the round, leaves the tournament as it was
+    backend = getBackend()
+    def fail(standings):
+        raise ValueError("round 3 has already been started")
+    backend.saveStandings = fail
+    try:
+        startRound(tournament_id)
+    except ValueError:
+        pass
+    finally:
+        del backend.saveStandings
+    if roundPairings(tournament_id) != pairings:
+        raise ValueError("A rejected startRound() should write nothing.")
+    deleteTournament(tournament_id)
+    print "24. Rounds store their pairings and standings."
+
+
+def testWatchStandings():
+    tournament_id = registerTournament("Watched")
+    [id1, id2] = registerPlayers(["Ann", "Bob"], tournament_id)
+    watcher = watchStandings([tournament_id], deltas=True, timeout=5)
+    try:
+        (watched_id, version, rows) = next(watcher)
+        if watched_id != tournament_id or \
+                [row[1:] for row in rows] != playerStandings(tournament_id):
+            raise ValueError("watchStandings() should start with the current "
+                             "standings.")
+        reportMatch(id1, id2, tournament_id=tournament_id)
+        (watched_id, new_version, rows) = next(watcher)
+        if new_version <= version or \
+                sorted(row[1:4] for row in rows) != [(id1, "Ann", 1),
+                                                     (id2, "Bob", 0)]:
+            raise ValueError("watchStandings() should deliver the rows that "
+                             "changed when a result is reported.")
+    finally:
+        watcher.close()
+    watcher = watchStandings([tournament_id], timeout=0.1)
+    try:
+        next(watcher)
+        if next(watcher) is not None:
+            raise ValueError("watchStandings() should yield None when "
+                             "nothing changes.")
+    finally:
+        watcher.close()
+    deleteTournament(tournament_id)
+    print "25. Standings changes are pushed to watchers."
+
+
+def testReplicas():
+    configureDatabase(replica_dsns=[REPLICA_DSN])
+    try:
+        tournament_id = registerTournament("Replicated")
+        registerPlayers(["Ann", "Bob"], tournament_id)
+        if countPlayers(tournament_id) != 2:
+            raise ValueError("Reads should see the writes made before them.")
+        configureDatabase(read_your_writes=False)
+        with get_cursor(read_only=True) as cursor:
+            cursor.execute("SELECT pg_is_in_recovery();")
+            if not cursor.fetchone()[0]:
+                raise ValueError("Reads should be sent to the replica.")
+        with get_cursor() as cursor:
+            cursor.execute("SELECT pg_is_in_recovery();")
+            if cursor.fetchone()[0]:
+                raise ValueError("Writes should be sent to the primary.")
+        # Wait for the replica to catch up, then check that working out the
+        # standings and pairings never touches the primary
+        for attempt in range(100):
+            if countPlayers(tournament_id) == 2:
+                break
+            time.sleep(0.1)
+        get_pool = tournament.get_pool
+        def primary():
+            raise ValueError("playerStandings() and swissPairings() should "
+                             "only read from the replica.")
+        tournament.get_pool = primary
+        try:
+            playerStandings(tournament_id)
+            swissPairings(tournament_id)
+        finally:
+            tournament.get_pool = get_pool
+        deleteTournament(tournament_id)
+    finally:
+        configureDatabase(replica_dsns=[], read_your_writes=True)
+    print "26. Reads can be sent to a replica."
+
+
+def testTiebreakers():
+    tournament_id = registerTournament("Tiebreakers")
+    [ann, bob, cat, dan] = registerPlayers(["Ann", "Bob", "Cat", "Dan"],
+                                           tournament_id)
+    reportMatches([(bob, ann), (cat, dan), (ann, dan), (cat, bob)],
+                  tournament_id)
+    try:
+        if [row[0] for row in playerStandings(tournament_id)] != \
+                [cat, bob, ann, dan]:
+            raise ValueError("Players with the same points should be "
+                             "ordered by OMW.")
+        configureTiebreakers(["OOW", "head_to_head"])
+        if [row[0] for row in playerStandings(tournament_id)] != \
+                [cat, ann, bob, dan]:
+            raise ValueError("Players with the same points should be "
+                             "ordered by the configured tiebreakers.")
+        configureTiebreakers(TIEBREAKERS)
+        values = dict((row[0], row[3])
+                      for row in playerTiebreakers(tournament_id))
+        if values[bob] != {"OMW": 0.75, "OOW": 0.25, "buchholz": 9,
+                           "sonneborn_berger": 3, "head_to_head": 0} or \
+                values[ann]["OOW"] != 0.75:
+            raise ValueError("Every tiebreaker should be worked out from "
+                             "the results.")
+        configureTiebreakers(["head_to_head"])
+        if [row[0] for row in playerStandings(tournament_id)] != \
+                [cat, bob, ann, dan]:
+            raise ValueError("head_to_head should put the winner of a "
+                             "match between tied players first.")
+    finally:
+        configureTiebreakers(["OMW"])
+    deleteTournament(tournament_id)
+    print "27. Tied players are ordered by the configured tiebreakers."
+
+
+def testArchive():
+    tournament_id = registerTournament("Archived")
+    registerPlayers(["Ann", "Bob", "Cat"], tournament_id)
+    (round_number, pairings) = startRound(tournament_id)
+    try:
+        archiveTournament(tournament_id)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("Tournaments with results to report shouldn't be "
+                         "archived.")
+    reportMatches([(pairing[0], pairing[2]) if len(pairing) == 4 else
+                   (pairing[0], None, None, True) for pairing in pairings],
+                  tournament_id, round_number=round_number)
+    standings = playerStandings(tournament_id)
+    archiveTournament(tournament_id)
+    if countPlayers(tournament_id) != 0:
+        raise ValueError("Archived tournaments should leave the active "
+                         "tables.")
+    matches = archivedMatches(tournament_id)
+    if archivedStandings(tournament_id) != standings or \
+            sorted(match[4] for match in matches) != [False, True]:
+        raise ValueError("Archived tournaments should keep their standings "
+                         "and matches.")
+    resetDatabase()
+    try:
+        archivedStandings(tournament_id)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("resetDatabase() should remove archived "
+                         "tournaments too.")
+    if registerTournament("Test Tournament") != 1:
+        raise ValueError("resetDatabase() should start the ids from 1.")
+    print "28. Finished tournaments can be archived, and everything reset."
+
+
+def testPairingSearchLimit():
+    # Eight players who have played everyone but one opponent each, the
+    # furthest apart in the standings, so every nearer pairing has to be
+    # undone first
+    player_ids = list(range(1, 9))
+    opponents = dict((player_id, set(player_ids) -
+                      set([player_id, 9 - player_id]))
+                     for player_id in player_ids)
+    if pair_Players_Helper(player_ids, opponents) != [(1, 8), (2, 7), (3, 6),
+                                                      (4, 5)]:
+        raise ValueError("The only pairing without rematches should be found.")
+    opponents[4].add(5)
+    opponents[5].add(4)
+    try:
+        pair_Players_Helper(player_ids, opponents)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("pair_Players_Helper should raise when every pairing "
+                         "is a rematch.")
+    # The top 29 players have played every one of the bottom 32, so whoever
+    # gets the bye from the bottom leaves two groups of an odd number of
+    # players, and finding that out means trying every way of pairing them
+    standings = [(player_id, "Player %s" % player_id, 0, 0, 0, 0, 0, 0)
+                 for player_id in range(1, 62)]
+    opponents = dict((player_id, set(range(30, 62)) if player_id < 30 else
+                      set(range(1, 30))) for player_id in range(1, 62))
+    try:
+        pair_Standings_Helper(standings, opponents)
+    except PairingSearchError:
+        pass
+    else:
+        raise ValueError("Running out of pairing steps should raise "
+                         "PairingSearchError, not move on to the next bye.")
+    print "29. Pairing searches that run out of steps say so."
+
+
+def testBackendErrors():
+    tournament_id = registerTournament("Errors")
+    [id1, id2] = registerPlayers(["Ann", "Bob"], tournament_id)
+    reportMatch(id1, id2)
+    with transaction():
+        for (write, args) in [(registerPlayers, (["Cat"], tournament_id + 1)),
+                              (deletePlayers, (tournament_id, )),
+                              (reportMatch, (id2, id1))]:
+            try:
+                write(*args)
+            except ValueError:
+                pass
+            else:
+                raise ValueError("%s should raise a ValueError." %
+                                 write.__name__)
+        # Nothing was written, so the transaction can carry on
+        if countPlayers(tournament_id) != 2:
+            raise ValueError("Rejected writes should change nothing.")
+    deleteTournament(tournament_id)
+    print "30. Every backend rejects bad writes with a ValueError."
+
 if __name__ == '__main__':
-    testDeleteMatches()
-    testDelete()
-    testCount()
-    testRegister()
-    testRegisterCountDelete()
-    testStandingsBeforeMatches()
-    testReportMatches()
-    testPairings()
+    database_only = [testAggregates, testMemoryBackend, testInstrumentation,
+                     testMigrations, testExportImport, testWatchStandings,
+                     testReplicas]
+    if "--memory" in sys.argv:
+        setBackend(MemoryBackend())
+    if "--replica" in sys.argv:
+        REPLICA_DSN = sys.argv[sys.argv.index("--replica") + 1]
+    for test in [testDeleteMatches, testDelete, testCount, testRegister,
+                 testRegisterCountDelete, testStandingsBeforeMatches,
+                 testReportMatches, testPairings, testTransaction,
+                 testStandingsScores, testReportRound, testRegisterPlayers,
+                 testAggregates, testPairingsAvoidRematches,
+                 testPairingsWithByes, testMemoryBackend,
+                 testInstrumentation, testStandingsCache,
+                 testArrayStandings, testSimulation, testMigrations,
+                 testExportImport, testConcurrentReporting, testRounds,
+                 testWatchStandings, testReplicas, testTiebreakers,
+                 testArchive, testPairingSearchLimit, testBackendErrors]:
+        if isinstance(getBackend(), MemoryBackend) and test in database_only:
+            continue
+        if test is testReplicas and not REPLICA_DSN:
+            continue
+        test()
     print "Success!  All tests pass!"